@@ -0,0 +1,642 @@
+"""Замер накладных расходов приложения без обращения к настоящим API
+
+Поднимает локальную заглушку, отвечающую по протоколам OpenAI-совместимых
+API (OpenAI, Groq, OpenRouter, DeepSeek, Mistral AI), Anthropic, Batch API OpenAI и Anthropic,
+Hugging Face Inference, GenAPI и Telegram sendDocument, и прогоняет через
+нее обычные пути запроса и сохранения ответов (NeuralNetworkCore.process_question).
+
+Примеры:
+    python benchmark.py --questions 100
+    python benchmark.py --questions 10000 --latency 0.05 --files-parallel 16 --max-requests 64
+    python benchmark.py --questions 500 --error-rate 0.05 --rate-limit-rate 0.1 --stream
+    python benchmark.py --questions 1000 --networks "OpenAI GPT,Anthropic Claude,Groq" --batch-api
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from main_app import (PROVIDERS, NeuralNetworkCore, TimedHTTPAdapter, collect_batch_results, percentile,
+                      prepare_console)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Хосты настоящих API, запросы к которым перенаправляются в заглушку
+REAL_HOSTS = (
+    "https://api.groq.com",
+    "https://openrouter.ai",
+    "https://api-inference.huggingface.co",
+    "https://huggingface.co",
+    "https://api.gen-api.ru",
+    "https://api.telegram.org",
+    "https://api.openai.com",
+    "https://api.anthropic.com",
+)
+
+# Нейросети, работающие через HTTP без SDK (по умолчанию)
+HTTP_NETWORKS = ["Groq", "OpenRouter", "Hugging Face", "GenAPI"]
+
+# Нейросети, которые заглушка не обслуживает (запросы ушли бы в настоящий API)
+UNSUPPORTED_NETWORKS = {"GigaChat": "SDK получает токен OAuth на сервере Сбера, в заглушке его нет"}
+# Обычные запросы этих нейросетей идут через SDK, адрес которого не перенаправить
+# на заглушку; в пакетном режиме (Batch API) они идут через requests и поддерживаются
+BATCH_ONLY_NETWORKS = {"OpenAI GPT": "SDK OpenAI 1.x не берет адрес API из openai.api_base"}
+
+ANSWER_WORDS = ("ответ", "заглушки", "для", "замера", "скорости", "обработки", "вопроса")
+
+
+class MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Проигравшие попытки гонки моделей закрывают соединение, не дочитав ответ
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockProviderServer:
+    """Локальная заглушка API нейросетей и Telegram
+
+    latency/jitter - задержка ответа в секундах (нормальное распределение),
+    error_rate - доля ответов 500, rate_limit_rate - доля ответов 429 с
+    заголовком Retry-After, genapi_polls - сколько опросов задача GenAPI
+    остается в обработке, batch_polls - то же для пакетов Batch API.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, retry_after=1,
+                 stream_chunks=20, answer_words=60, genapi_polls=2, batch_polls=2, models=()):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self.answer_words = answer_words
+        self.genapi_polls = genapi_polls
+        self.batch_polls = batch_polls
+        self.models = sorted(set(models))
+        self.stats = Counter()
+        self._genapi_tasks = {}
+        self._files = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self.httpd = MockHTTPServer(("127.0.0.1", 0), MockRequestHandler)
+        self.httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def fault(self):
+        """Случайная ошибка для очередного запроса: 429, 500 или None"""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def delay(self):
+        with self._lock:
+            value = self._random.gauss(self.latency, self.jitter) if self.jitter else self.latency
+        time.sleep(max(0.0, value))
+
+    def answer_text(self):
+        return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.answer_words))
+
+    def genapi_submit(self):
+        with self._lock:
+            request_id = len(self._genapi_tasks) + 1
+            self._genapi_tasks[request_id] = 0
+        return request_id
+
+    def genapi_poll(self, request_id):
+        """Статус задачи GenAPI: processing, пока не пройдет genapi_polls опросов"""
+        with self._lock:
+            if request_id not in self._genapi_tasks:
+                return None
+            self._genapi_tasks[request_id] += 1
+            polls = self._genapi_tasks[request_id]
+        return "success" if polls > self.genapi_polls else "processing"
+
+    def add_file(self, content):
+        with self._lock:
+            file_id = f"file-{len(self._files) + 1}"
+            self._files[file_id] = content
+        return file_id
+
+    def get_file(self, file_id):
+        with self._lock:
+            return self._files.get(file_id)
+
+    def batch_submit(self, custom_ids):
+        with self._lock:
+            batch_id = f"batch_{len(self._batches) + 1}"
+            self._batches[batch_id] = {"ids": list(custom_ids), "polls": 0, "output": None}
+        return batch_id
+
+    def batch_poll(self, batch_id, render_line):
+        """Результаты пакета (bytes JSONL) после batch_polls опросов, до этого None; KeyError - нет пакета"""
+        with self._lock:
+            batch = self._batches[batch_id]
+            batch["polls"] += 1
+            if batch["polls"] <= self.batch_polls:
+                return None
+            if batch["output"] is None:
+                lines = [json.dumps(render_line(custom_id), ensure_ascii=False) for custom_id in batch["ids"]]
+                batch["output"] = "\n".join(lines).encode('utf-8')
+            return batch["output"]
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            try:
+                return json.loads(raw)
+            except ValueError:
+                return {}
+        if content_type.startswith("multipart/form-data"):
+            # Поля формы: имя -> содержимое в байтах
+            message = BytesParser(policy=policy.default).parsebytes(
+                f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + raw)
+            return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                    for part in message.iter_parts()}
+        return {}
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, status, body, content_type="application/jsonl"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_fault(self, status):
+        self.mock.count(f"ответ {status}")
+        if status == 429:
+            self.send_json(429, {"error": {"message": "Rate limit reached"}},
+                           {"Retry-After": str(self.mock.retry_after)})
+        else:
+            self.send_json(500, {"error": {"message": "Internal server error"}})
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.endswith("/models"):
+            self.mock.count("список моделей")
+            self.send_json(200, {"data": [{"id": model} for model in self.mock.models]})
+        elif path.startswith("/api/models/"):
+            self.mock.count("модель Hugging Face")
+            self.send_json(200, {"id": path[len("/api/models/"):]})
+        elif path.startswith("/api/v1/request/get/"):
+            self.mock.count("опрос GenAPI")
+            try:
+                request_id = int(path.rsplit("/", 1)[1])
+            except ValueError:
+                request_id = None
+            status = self.mock.genapi_poll(request_id)
+            if status is None:
+                self.send_json(404, {"error": "not found"})
+            elif status == "success":
+                self.send_json(200, {"status": "success", "output": self.mock.answer_text()})
+            else:
+                self.send_json(200, {"status": "processing"})
+        elif re.match(r"^/v1/files/[^/]+/content$", path):
+            self.mock.count("файл результатов OpenAI")
+            content = self.mock.get_file(path.split("/")[3])
+            if content is None:
+                self.send_json(404, {"error": {"message": "No such file"}})
+            else:
+                self.send_bytes(200, content)
+        elif path.startswith("/v1/batches/"):
+            self.mock.count("опрос пакета OpenAI")
+            self.openai_batch_status(path[len("/v1/batches/"):])
+        elif re.match(r"^/v1/messages/batches/[^/]+/results$", path):
+            self.mock.count("результаты пакета Anthropic")
+            self.anthropic_batch_results(path.split("/")[4])
+        elif path.startswith("/v1/messages/batches/"):
+            self.mock.count("опрос пакета Anthropic")
+            self.anthropic_batch_status(path[len("/v1/messages/batches/"):])
+        else:
+            self.send_json(404, {"error": f"unknown path {path}"})
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        body = self.read_body()
+
+        if re.match(r"^/bot[^/]+/sendDocument$", path):
+            self.mock.count("Telegram sendDocument")
+            self.send_json(200, {"ok": True, "result": {"message_id": 1}})
+            return
+
+        fault = self.mock.fault()
+        if fault:
+            self.send_fault(fault)
+            return
+        self.mock.delay()
+
+        if path.endswith("/chat/completions"):
+            self.mock.count("OpenAI-совместимый чат")
+            self.openai_chat(body)
+        elif path == "/anthropic/v1/messages":
+            self.mock.count("Anthropic messages")
+            self.send_json(200, {
+                "id": "msg_bench", "type": "message", "role": "assistant", "model": body.get("model"),
+                "content": [{"type": "text", "text": self.mock.answer_text()}],
+                "stop_reason": "end_turn",
+                "usage": {"input_tokens": 20, "output_tokens": self.mock.answer_words}
+            })
+        elif path.startswith("/models/"):
+            self.mock.count("Hugging Face inference")
+            self.send_json(200, [{"generated_text": self.mock.answer_text()}])
+        elif path.startswith("/api/v1/networks/"):
+            self.mock.count("задача GenAPI")
+            self.send_json(200, {"request_id": self.mock.genapi_submit(), "status": "starting"})
+        elif path == "/v1/files":
+            self.mock.count("файл пакета OpenAI")
+            self.send_json(200, {"id": self.mock.add_file(body.get("file") or b""), "object": "file",
+                                 "purpose": "batch"})
+        elif path == "/v1/batches":
+            self.mock.count("пакет OpenAI")
+            content = self.mock.get_file(body.get("input_file_id"))
+            if content is None:
+                self.send_json(400, {"error": {"message": "No such file"}})
+                return
+            custom_ids = [json.loads(line)["custom_id"] for line in content.decode('utf-8').splitlines() if line]
+            self.send_json(200, {"id": self.mock.batch_submit(custom_ids), "object": "batch",
+                                 "status": "validating"})
+        elif path == "/v1/messages/batches":
+            self.mock.count("пакет Anthropic")
+            custom_ids = [item["custom_id"] for item in body.get("requests", [])]
+            self.send_json(200, {"id": self.mock.batch_submit(custom_ids), "type": "message_batch",
+                                 "processing_status": "in_progress"})
+        else:
+            self.send_json(404, {"error": f"unknown path {path}"})
+
+    def openai_batch_status(self, batch_id):
+        def render_line(custom_id):
+            return {"id": f"batch_req_{custom_id}", "custom_id": custom_id, "error": None, "response": {
+                "status_code": 200,
+                "body": {"id": "chatcmpl-bench", "object": "chat.completion",
+                         "choices": [{"index": 0, "message": {"role": "assistant", "content": self.mock.answer_text()},
+                                      "finish_reason": "stop"}]}
+            }}
+
+        try:
+            output = self.mock.batch_poll(batch_id, render_line)
+        except KeyError:
+            self.send_json(404, {"error": {"message": "No such batch"}})
+            return
+        if output is None:
+            self.send_json(200, {"id": batch_id, "object": "batch", "status": "in_progress"})
+            return
+        self.send_json(200, {"id": batch_id, "object": "batch", "status": "completed",
+                             "output_file_id": self.mock.add_file(output), "error_file_id": None})
+
+    def anthropic_batch_status(self, batch_id):
+        def render_line(custom_id):
+            return {"custom_id": custom_id, "result": {"type": "succeeded", "message": {
+                "id": "msg_bench", "type": "message", "role": "assistant",
+                "content": [{"type": "text", "text": self.mock.answer_text()}]
+            }}}
+
+        try:
+            output = self.mock.batch_poll(batch_id, render_line)
+        except KeyError:
+            self.send_json(404, {"error": {"type": "not_found_error", "message": "No such batch"}})
+            return
+        payload = {"id": batch_id, "type": "message_batch",
+                   "processing_status": "in_progress" if output is None else "ended"}
+        if output is not None:
+            payload["results_url"] = f"https://api.anthropic.com/v1/messages/batches/{batch_id}/results"
+        self.send_json(200, payload)
+
+    def anthropic_batch_results(self, batch_id):
+        try:
+            output = self.mock.batch_poll(batch_id, lambda custom_id: None)
+        except KeyError:
+            output = None
+        if output is None:
+            self.send_json(404, {"error": {"type": "not_found_error", "message": "Results not ready"}})
+        else:
+            self.send_bytes(200, output)
+
+    def openai_chat(self, body):
+        text = self.mock.answer_text()
+        usage = {"prompt_tokens": 20, "completion_tokens": self.mock.answer_words,
+                 "total_tokens": 20 + self.mock.answer_words}
+        if not body.get("stream"):
+            self.send_json(200, {
+                "id": "chatcmpl-bench", "object": "chat.completion", "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            })
+            return
+
+        # Потоковый ответ: фрагменты SSE с паузами, конец - data: [DONE]
+        words = text.split(" ")
+        step = max(1, len(words) // max(1, self.mock.stream_chunks))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(words), step):
+            piece = " ".join(words[start:start + step]) + " "
+            chunk = {"choices": [{"index": 0, "delta": {"content": piece}}]}
+            self.write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            time.sleep(self.mock.latency / max(1, self.mock.stream_chunks))
+        self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class RedirectAdapter(TimedHTTPAdapter):
+    """Адаптер requests, отправляющий запросы к настоящему API в заглушку"""
+
+    def __init__(self, target, **kwargs):
+        super().__init__(**kwargs)
+        self.target = target
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = self.target + parts.path + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+class BenchmarkCore(NeuralNetworkCore):
+    """Ядро приложения, работающее с заглушкой вместо настоящих API"""
+
+    def __init__(self, config_file, mock_url, verbose=False):
+        self.mock_url = mock_url
+        self.verbose = verbose
+        super().__init__(config_file)
+
+    def log_message(self, message):
+        # Вывод каждого сообщения в консоль исказил бы замеры
+        if self.verbose:
+            super().log_message(message)
+        else:
+            self.write_log_file(message)
+
+    def check_internet_connection(self):
+        return True
+
+    def get_session(self, network, api_key):
+        session = super().get_session(network, api_key)
+        if not getattr(session, "benchmark_redirect", False):
+            pool_config = self.config["connection_pool"]
+            adapter = RedirectAdapter(self.mock_url, pool_connections=pool_config["pool_connections"],
+                                      pool_maxsize=pool_config["pool_maxsize"])
+            for host in REAL_HOSTS:
+                session.mount(host, adapter)
+            session.benchmark_redirect = True
+        return session
+
+    def create_anthropic_client(self, api_key):
+        return self.load_sdk("anthropic").Anthropic(api_key=api_key, base_url=f"{self.mock_url}/anthropic")
+
+    def create_mistral_client(self, api_key):
+        return self.load_sdk("mistralai").Mistral(api_key=api_key, server_url=self.mock_url)
+
+    def create_deepseek_client(self, api_key):
+        return self.load_sdk("openai").OpenAI(api_key=api_key, base_url=f"{self.mock_url}/deepseek")
+
+
+def write_config(path, networks, args):
+    """Конфигурация для замера: ключи-заглушки, без ограничений частоты (если не задано иное)"""
+    config = {
+        "api_keys": {spec.key_name: "bench" for spec in PROVIDERS.values()},
+        "telegram": {"bot_token": "bench", "chat_id": "1"} if args.telegram else {"bot_token": "", "chat_id": ""},
+        "dispatch": {"max_workers": len(networks), "run_deadline": 600},
+        "genapi": {"tasks_filename": "genapi_tasks.sqlite3", "first_poll": args.genapi_poll,
+                   "max_poll_interval": max(args.genapi_poll, 1), "max_wait": 300},
+        "batch_api": {"first_poll": args.genapi_poll, "max_poll_interval": max(args.genapi_poll, 1)},
+        "connection_pool": {"pool_connections": 4, "pool_maxsize": max(10, args.max_requests or 10)},
+        "response_cache": {"enabled": not args.no_cache},
+    }
+    if not args.keep_rate_limits:
+        config["rate_limits"] = {
+            "requests_per_minute": {PROVIDERS[name].key_name: 10 ** 6 for name in networks},
+            "burst": 10 ** 6
+        }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+
+def peak_rss_mb():
+    """Пиковый объем памяти процесса, МБ (None, если недоступен)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_benchmark(args):
+    networks = [name.strip() for name in args.networks.split(",") if name.strip()]
+    unknown = [name for name in networks if name not in PROVIDERS]
+    if unknown:
+        print(f"Неизвестные нейросети: {', '.join(unknown)}. Доступны: {', '.join(PROVIDERS)}")
+        return 2
+    unsupported = [name for name in networks if name in UNSUPPORTED_NETWORKS]
+    if unsupported:
+        for name in unsupported:
+            print(f"{name} не поддерживается заглушкой: {UNSUPPORTED_NETWORKS[name]}")
+        return 2
+    batch_only = [name for name in networks if name in BATCH_ONLY_NETWORKS and not args.batch_api]
+    if batch_only:
+        for name in batch_only:
+            print(f"{name} замеряется только с --batch-api: {BATCH_ONLY_NETWORKS[name]}")
+        return 2
+
+    models = [model for name in networks for model in PROVIDERS[name].fallback_models]
+    server = MockProviderServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after,
+                                answer_words=args.answer_words, genapi_polls=args.genapi_polls,
+                                batch_polls=args.batch_polls, models=models)
+    server.start()
+
+    work_dir = tempfile.mkdtemp(prefix="preconcil_bench_")
+    save_dir = os.path.join(work_dir, "answers")
+    question_dir = os.path.join(work_dir, "questions")
+    os.makedirs(save_dir)
+    os.makedirs(question_dir)
+
+    try:
+        config_path = os.path.join(work_dir, "config.json")
+        write_config(config_path, networks, args)
+        core = BenchmarkCore(config_path, server.base_url, verbose=args.verbose)
+        api_keys = {name: core.get_api_key(name) for name in PROVIDERS}
+
+        question_files = []
+        for number in range(args.questions):
+            path = os.path.join(question_dir, f"question_{number:05d}.txt")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"Вопрос номер {number} для замера производительности")
+            question_files.append(path)
+
+        slots = threading.Semaphore(args.max_requests) if args.max_requests > 0 else None
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        def process_file(path):
+            started = time.perf_counter()
+            question = core.read_question_file(path)
+            responses, failed, saved_file = core.process_question(
+                question, networks, api_keys, save_dir, path, streaming=args.stream, slots=slots,
+                send_telegram=args.telegram, batch_results=batch_results.get(path))
+            return time.perf_counter() - started, len(responses), len(failed), saved_file is not None
+
+        print(f"Заглушка: {server.base_url}, нейросети: {', '.join(networks)}, вопросов: {args.questions}")
+        started = time.perf_counter()
+
+        batch_results = {}
+        if args.batch_api:
+            batch_results = collect_batch_results(core, question_files, networks, api_keys, save_dir, args.no_cache)
+            print(f"Пакеты Batch API получены за {time.perf_counter() - started:.2f} с")
+        latencies = []
+        answers = errors = saved = 0
+        with ThreadPoolExecutor(max_workers=max(1, args.files_parallel)) as executor:
+            futures = [executor.submit(process_file, path) for path in question_files]
+            for future in as_completed(futures):
+                elapsed, answered, failed, was_saved = future.result()
+                latencies.append(elapsed)
+                answers += answered
+                errors += failed
+                saved += was_saved
+        total = time.perf_counter() - started
+
+        heap_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024) if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+
+        print()
+        print(f"Время: {total:.2f} с, вопросов в секунду: {args.questions / total:.2f}, "
+              f"ответов в секунду: {answers / total:.2f}")
+        print(f"Задержка вопроса: p50 {percentile(latencies, 0.5):.3f} с, p95 {percentile(latencies, 0.95):.3f} с, "
+              f"p99 {percentile(latencies, 0.99):.3f} с, макс. {max(latencies):.3f} с")
+        print(f"Ответов: {answers}, ошибок: {errors}, сохранено файлов: {saved}")
+        rss = peak_rss_mb()
+        if rss is not None:
+            print(f"Пиковая память процесса: {rss:.1f} МБ")
+        if heap_peak is not None:
+            print(f"Пиковая память Python (tracemalloc): {heap_peak:.1f} МБ")
+
+        if core.metrics is not None:
+            print()
+            print("Метрики по нейросетям (задержка вызова):")
+            for network, stats in core.metrics.summary("query").items():
+                latency = stats["latency"]
+                if latency[0.5] is None:
+                    print(f"  {network}: вызовов {stats['count']}, ошибок {stats['errors']}")
+                    continue
+                print(f"  {network}: вызовов {stats['count']}, ошибок {stats['errors']}, повторов {stats['retries']}, "
+                      f"p50 {latency[0.5]:.3f} с, p95 {latency[0.95]:.3f} с, p99 {latency[0.99]:.3f} с")
+
+        print()
+        print("Запросы к заглушке:")
+        for name, count in sorted(server.stats.items()):
+            print(f"  {name}: {count}")
+        return 0
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"\nФайлы замера: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Замер накладных расходов приложения на локальной заглушке API")
+    parser.add_argument("--questions", type=int, default=100, help="число вопросов (по умолчанию 100)")
+    parser.add_argument("--networks", default=",".join(HTTP_NETWORKS),
+                        help="нейросети через запятую (по умолчанию HTTP-нейросети без SDK: "
+                             f"{', '.join(HTTP_NETWORKS)})")
+    parser.add_argument("--files-parallel", type=int, default=4, help="сколько вопросов обрабатывать одновременно")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="общий лимит одновременных запросов к нейросетям (0 - без лимита)")
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа заглушки, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="разброс задержки (стандартное отклонение), с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="значение Retry-After для ответов 429, с")
+    parser.add_argument("--answer-words", type=int, default=60, help="длина ответа заглушки в словах")
+    parser.add_argument("--genapi-polls", type=int, default=2, help="сколько опросов задача GenAPI в обработке")
+    parser.add_argument("--genapi-poll", type=float, default=0.2,
+                        help="первый интервал опроса GenAPI и пакетов Batch API, с")
+    parser.add_argument("--batch-polls", type=int, default=2, help="сколько опросов пакет Batch API в обработке")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="отправлять вопросы в OpenAI и Anthropic пакетами через Batch API")
+    parser.add_argument("--stream", action="store_true",
+                        help="потоковый вывод для нейросетей, которые его поддерживают")
+    parser.add_argument("--telegram", action="store_true", help="отправлять файлы ответов в Telegram (заглушку)")
+    parser.add_argument("--no-cache", action="store_true", help="отключить кэш ответов")
+    parser.add_argument("--keep-rate-limits", action="store_true",
+                        help="не снимать ограничения частоты запросов из настроек по умолчанию")
+    parser.add_argument("--tracemalloc", action="store_true", help="замерять пиковую память Python (медленнее)")
+    parser.add_argument("--verbose", action="store_true", help="выводить лог приложения")
+    parser.add_argument("--keep", action="store_true", help="не удалять папку с ответами и метриками")
+    return parser
+
+
+if __name__ == "__main__":
+    prepare_console()
+    sys.exit(run_benchmark(build_arg_parser().parse_args()))
@@ -11,10 +11,16 @@ a = Analysis(
         ('config.json', '.'),
         ('README.md', '.')
     ],
+    # SDK нейросетей импортируются в main_app.py лениво (importlib),
+    # поэтому PyInstaller не находит их сам - перечисляем явно
     hiddenimports=[
         'tkinter',
         'openai',
         'anthropic',
+        'mistralai',
+        'gigachat',
+        'watchdog.observers',
+        'watchdog.events',
         'requests',
         'json',
         'os',
@@ -1,83 +1,2292 @@
+import time
+
+# Момент старта процесса для отчета о времени запуска
+_STARTUP_STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
 import os
+import sys
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 import socket
-import time
+import queue
+import importlib
+import argparse
+import glob
+import re
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import hashlib
+import sqlite3
+import random
+import heapq
+import itertools
+import math
+import contextlib
+import uuid
+import logging
+from logging.handlers import RotatingFileHandler
+from email.utils import parsedate_to_datetime
 from datetime import datetime
-import openai
-from anthropic import Anthropic
-from openai import OpenAI as DeepSeekClient
-from mistralai import Mistral as MistralClient
-from gigachat import GigaChat
 
+# SDK нейросетей (openai, anthropic, mistralai, gigachat) импортируются лениво,
+# при первом запросе или проверке соединения - см. NeuralNetworkApp.load_sdk
 
-class NeuralNetworkApp:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Менеджер нейросетей v7.0")
-        self.root.geometry("950x750")
 
-        # Конфигурация
-        self.config_file = "config.json"
-        self.load_config()
+class StartupTimer:
+    """Замер этапов запуска приложения (аналог -X importtime для лога)"""
 
-        # Переменные для хранения статусов соединения
-        self.connection_status = {
-            "OpenAI GPT": False,
-            "Anthropic Claude": False,
-            "DeepSeek": False,
-            "Groq": False,
-            "OpenRouter": False,
-            "Hugging Face": False,
-            "Mistral AI": False,
-            "GigaChat": False,
-            "GenAPI": False
-        }
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.stages = []
 
-        # Создаем вкладки
-        self.notebook = ttk.Notebook(root)
-        self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+    def mark(self, stage):
+        """Фиксация завершения этапа запуска"""
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
 
-        # Вкладка 1: Основные настройки
-        self.setup_main_tab()
+    def total(self):
+        """Время от старта процесса до последнего этапа"""
+        return self.last - self.started
 
-        # Вкладка 2: Настройки API
-        self.setup_api_tab()
+    def report(self):
+        """Строки отчета для лога"""
+        lines = [f"⏱ Запуск: окно готово через {self.total():.3f} с "
+                 f"(модулей загружено: {len(sys.modules)})"]
+        for stage, duration in self.stages:
+            lines.append(f"   • {stage}: {duration:.3f} с")
+        return lines
 
-        # Вкладка 3: История запросов
-        self.setup_history_tab()
 
-        # Вкладка 4: Статус соединения
-        self.setup_status_tab()
+# Время установки новых соединений в текущем потоке (см. TimedHTTPAdapter)
+_connect_timing = threading.local()
 
-        # Загружаем конфигурацию
-        self.load_config_to_ui()
 
-        # Проверяем соединение при запуске (в фоне)
-        self.root.after(1000, self.check_all_connections_background)
+def take_connect_time():
+    """Время установки соединений в текущем потоке с прошлого вызова (с обнулением)"""
+    seconds = getattr(_connect_timing, "seconds", 0.0)
+    _connect_timing.seconds = 0.0
+    return seconds
+
+
+def _timed_connection(conn):
+    connect = conn.connect
+
+    def timed_connect():
+        started = time.perf_counter()
+        try:
+            connect()
+        finally:
+            _connect_timing.seconds = getattr(_connect_timing, "seconds", 0.0) + time.perf_counter() - started
+
+    conn.connect = timed_connect
+    return conn
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        return _timed_connection(super()._new_conn())
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        return _timed_connection(super()._new_conn())
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter, замеряющий время установки новых соединений (см. take_connect_time)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                   "https": TimedHTTPSConnectionPool}
+
+
+class ConnectionPool:
+    """Переиспользуемые keep-alive сессии HTTP и клиенты SDK по нейросети и ключу
+
+    Клиенты SDK (в том числе GigaChat) создаются один раз на пару
+    (нейросеть, ключ) и хранят полученный токен доступа до его истечения.
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=10):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, provider, api_key=""):
+        """Сессия requests с пулом соединений для нейросети и ключа"""
+        key = (provider, api_key)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = TimedHTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[key] = session
+            return session
+
+    def get_client(self, provider, api_key, factory):
+        """Клиент SDK для нейросети и ключа; создается factory() при первом обращении"""
+        key = (provider, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        # Создаем вне блокировки: конструктор SDK может работать долго
+        client = factory()
+        with self._lock:
+            existing = self._clients.setdefault(key, client)
+        if existing is not client:
+            self._close(client)
+        return existing
+
+    def invalidate(self, provider):
+        """Закрытие всех соединений нейросети (например, после смены ключа)"""
+        with self._lock:
+            stale = [self._sessions.pop(key) for key in list(self._sessions) if key[0] == provider]
+            stale += [self._clients.pop(key) for key in list(self._clients) if key[0] == provider]
+        for item in stale:
+            self._close(item)
+
+    def close_all(self):
+        """Закрытие всех сессий и клиентов"""
+        with self._lock:
+            stale = list(self._sessions.values()) + list(self._clients.values())
+            self._sessions.clear()
+            self._clients.clear()
+        for item in stale:
+            self._close(item)
+
+    @staticmethod
+    def _close(item):
+        close = getattr(item, "close", None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+class ConnectivityMonitor:
+    """Фоновая проверка интернет-соединения с кэшированием результата
+
+    Проба выполняется раз в interval секунд в отдельном потоке, а запросы
+    к нейросетям только читают последний результат. Пока проверки не было,
+    соединение считается доступным.
+    """
+
+    def __init__(self, host="8.8.8.8", port=53, interval=30, timeout=3):
+        self.host = host
+        self.port = int(port)
+        self.interval = interval
+        self.timeout = timeout
+        self.checked_at = None
+        self._online = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запуск фоновой проверки"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="connectivity", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Остановка фоновой проверки"""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Однократная проверка доступности адреса пробы"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.timeout):
+                online = True
+        except OSError:
+            online = False
+        self._online = online
+        self.checked_at = time.monotonic()
+        return online
+
+    def is_online(self):
+        """Последний известный статус соединения (без сетевых вызовов)"""
+        return self._online is not False
+
+    def mark_online(self):
+        """Успешный ответ нейросети подтверждает, что соединение есть"""
+        self._online = True
+
+
+class HealthMonitor:
+    """Параллельные проверки соединения с нейросетями с кэшем результатов
+
+    Каждая проверка выполняется в своем фоновом потоке. Повторный запрос
+    проверки той же пары (нейросеть, ключ), пока первая не завершилась,
+    присоединяется к ней, а результат хранится ttl секунд и отдается без
+    сетевых вызовов. on_result вызывается из потока проверки.
+    """
+
+    def __init__(self, probe, ttl=300, on_result=None):
+        self.probe = probe
+        self.ttl = ttl
+        self.on_result = on_result
+        self._results = {}
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def get_status(self, network, api_key, max_age=None):
+        """Последний результат проверки или None, если он старше max_age (по умолчанию ttl)"""
+        with self._lock:
+            entry = self._results.get((network, api_key))
+        if entry is None:
+            return None
+        status, checked_at = entry
+        if time.monotonic() - checked_at > (self.ttl if max_age is None else max_age):
+            return None
+        return status
+
+    def submit(self, network, api_key, force=False):
+        """Запуск проверки в фоне (Future со статусом); свежий результат берется из кэша"""
+        key = (network, api_key)
+        with self._lock:
+            running = self._running.get(key)
+            if running is not None:
+                return running
+            entry = self._results.get(key)
+            if not force and entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                future = Future()
+                future.set_result(entry[0])
+                return future
+            future = Future()
+            self._running[key] = future
+        threading.Thread(target=self._run, args=(key, future), name=f"health-{network}", daemon=True).start()
+        return future
+
+    def _run(self, key, future):
+        network, api_key = key
+        try:
+            status = bool(self.probe(network, api_key))
+        except Exception:
+            status = False
+        with self._lock:
+            self._results[key] = (status, time.monotonic())
+            self._running.pop(key, None)
+        future.set_result(status)
+        if self.on_result:
+            self.on_result(network, api_key, status)
+
+    def check(self, network, api_key, force=False):
+        """Проверка одной нейросети с ожиданием результата"""
+        return self.submit(network, api_key, force).result()
+
+    def check_all(self, targets, force=False):
+        """Одновременная проверка пар (нейросеть, ключ), результат - {нейросеть: статус}"""
+        futures = {network: self.submit(network, api_key, force) for network, api_key in targets}
+        return {network: future.result() for network, future in futures.items()}
+
+
+def normalize_question(text):
+    """Текст вопроса без различий в пробелах и переносах строк (для ключей запросов)"""
+    return " ".join(text.split())
+
+
+class ResponseCache:
+    """Постоянный кэш ответов нейросетей в SQLite
+
+    Ключ - хэш от нейросети, модели, параметров запроса и текста вопроса
+    (без учета различий в пробелах).
+    Записи старше ttl секунд не выдаются, а при превышении max_size байт
+    вытесняются давно не использованные (LRU).
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_size=100 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, provider TEXT, response TEXT, "
+            "created REAL, last_used REAL, size INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider, params, question):
+        """Ключ кэша для нейросети, параметров запроса и вопроса"""
+        payload = json.dumps({"provider": provider, "params": params, "question": normalize_question(question)},
+                             ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Ответ из кэша или None, если записи нет или она устарела"""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if now - created > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            return response
+
+    def put(self, key, provider, response):
+        """Сохранение ответа в кэш с вытеснением устаревших и лишних записей"""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, response, created, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, response, now, now, size)
+            )
+            self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        stale = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if total <= self.max_size:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def is_history_file(name):
+    """Файл с ответами, который показывается в истории"""
+    return name.startswith('responses_') or ANSWER_FILE_PATTERN.search(name) is not None
+
+
+def parse_answer_file(path):
+    """Время отправки, исходный файл и ответы нейросетей из файла с ответами"""
+    sent, source, answers = None, "", {}
+    network = None
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith("--- ") and line.endswith(" ---") and line[4:-4].replace(" (из кэша)", "") in PROVIDERS:
+                network = line[4:-4].replace(" (из кэша)", "")
+                answers[network] = []
+            elif network is not None:
+                if line == "=" * 60:
+                    network = None
+                else:
+                    answers[network].append(line)
+            elif sent is None and line.startswith("Вопрос отправлен: "):
+                try:
+                    sent = datetime.strptime(line[len("Вопрос отправлен: "):], '%Y-%m-%d %H:%M:%S').timestamp()
+                except ValueError:
+                    pass
+            elif not source and line.startswith("Исходный файл: "):
+                source = line[len("Исходный файл: "):]
+    return sent, source, {name: "\n".join(lines) for name, lines in answers.items()}
+
+
+def make_search_query(text):
+    """Запрос FTS5 из слов пользователя: все слова обязательны, последнее - как префикс"""
+    words = [word.replace('"', '""') for word in text.split()]
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class HistoryIndex:
+    """Индекс файлов с ответами в папке сохранения (SQLite)
+
+    Пополняется при сохранении ответов, а sync сверяет индекс с папкой,
+    перечитывая только новые и измененные файлы. Список истории читается
+    из индекса страницами, без обхода папки. Ответы и текст вопроса
+    попадают в полнотекстовый индекс FTS5 (если он есть в сборке SQLite).
+    """
+
+    # Из исходного файла вопроса индексируется только начало (файл может быть очень большим)
+    QUESTION_PREVIEW_CHARS = 64 * 1024
+
+    def __init__(self, save_dir, filename=".preconcil_history.sqlite3"):
+        self.save_dir = save_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(save_dir, filename), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "name TEXT PRIMARY KEY, sent REAL, mtime REAL, size INTEGER, source TEXT, providers TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_sent ON files (sent, name)")
+
+        has_search = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'answers_search'").fetchone() is not None
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS answers_search USING fts5("
+                "question, answer, name UNINDEXED, network UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            self.searchable = True
+        except sqlite3.OperationalError:
+            self.searchable = False
+        if self.searchable and not has_search:
+            # Индекс истории без поиска: файлы будут заново прочитаны при sync
+            self._db.execute("DELETE FROM files")
+        self._db.commit()
+
+    def add(self, name, sent=None, source="", answers=None, question=None):
+        """Добавление или обновление файла в индексе
+
+        answers - ответы по нейросетям; question - текст вопроса (если не
+        задан, читается начало исходного файла, пока он существует).
+        """
+        answers = answers or {}
+        stat = os.stat(os.path.join(self.save_dir, name))
+        if question is None:
+            question = ""
+            if source and os.path.isfile(source):
+                try:
+                    with open(source, 'r', encoding='utf-8', errors='replace') as f:
+                        question = f.read(self.QUESTION_PREVIEW_CHARS)
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (name, sent, mtime, size, source, providers) VALUES (?, ?, ?, ?, ?, ?)",
+                (name, sent if sent is not None else stat.st_mtime, stat.st_mtime, stat.st_size,
+                 source, ",".join(answers))
+            )
+            if self.searchable:
+                self._db.execute("DELETE FROM answers_search WHERE name = ?", (name,))
+                self._db.executemany(
+                    "INSERT INTO answers_search (question, answer, name, network) VALUES (?, ?, ?, ?)",
+                    [(question, answer, name, network) for network, answer in answers.items()]
+                )
+            self._db.commit()
+
+    def sync(self):
+        """Сверка индекса с папкой; возвращает число добавленных, измененных и удаленных файлов"""
+        with self._lock:
+            known = {name: (mtime, size) for name, mtime, size in
+                     self._db.execute("SELECT name, mtime, size FROM files")}
+
+        changed = 0
+        seen = set()
+        with os.scandir(self.save_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_history_file(entry.name):
+                    continue
+                seen.add(entry.name)
+                stat = entry.stat()
+                if known.get(entry.name) == (stat.st_mtime, stat.st_size):
+                    continue
+                try:
+                    sent, source, answers = parse_answer_file(entry.path)
+                    self.add(entry.name, sent, source, answers)
+                    changed += 1
+                except OSError:
+                    continue
+
+        removed = [(name,) for name in known if name not in seen]
+        if removed:
+            with self._lock:
+                self._db.executemany("DELETE FROM files WHERE name = ?", removed)
+                if self.searchable:
+                    self._db.executemany("DELETE FROM answers_search WHERE name = ?", removed)
+                self._db.commit()
+        return changed + len(removed)
+
+    def search(self, text, network=None, since=None, limit=200):
+        """Поиск по вопросам и ответам: [(имя файла, нейросеть, время отправки, фрагмент)], лучшие первыми
+
+        network - только ответы этой нейросети, since - не раньше этого
+        времени (timestamp).
+        """
+        query = make_search_query(text)
+        if not self.searchable or query is None:
+            return []
+
+        sql = ("SELECT files.name, answers_search.network, files.sent, "
+               "snippet(answers_search, -1, '[', ']', '…', 12) "
+               "FROM answers_search JOIN files ON files.name = answers_search.name "
+               "WHERE answers_search MATCH ?")
+        params = [query]
+        if network:
+            sql += " AND answers_search.network = ?"
+            params.append(network)
+        if since is not None:
+            sql += " AND files.sent >= ?"
+            params.append(since)
+        sql += " ORDER BY bm25(answers_search) LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def count(self):
+        """Число файлов в индексе"""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def page(self, offset, limit):
+        """Имена файлов страницы истории, сначала новые"""
+        with self._lock:
+            rows = self._db.execute("SELECT name FROM files ORDER BY sent DESC, name DESC LIMIT ? OFFSET ?",
+                                    (limit, offset)).fetchall()
+        return [name for name, in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def iter_sse_deltas(response):
+    """Текстовые фрагменты из SSE-потока OpenAI-совместимого API"""
+    # text/event-stream часто приходит без charset, а requests по умолчанию берет latin-1
+    response.encoding = 'utf-8'
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        payload = line[5:].strip()
+        if payload == "[DONE]":
+            break
+        try:
+            chunk = json.loads(payload)
+        except ValueError:
+            continue
+        choices = chunk.get("choices") or []
+        if choices:
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+def collect_stream(deltas, on_delta):
+    """Передача фрагментов ответа в on_delta и сборка полного текста"""
+    parts = []
+    for delta in deltas:
+        if delta:
+            parts.append(delta)
+            on_delta(delta)
+    return "".join(parts)
+
+
+class ResultsStore:
+    """Структурированные результаты в JSONL: одна строка на ответ нейросети
+
+    Записи только дописываются в конец файла, поэтому объем пакета не
+    ограничен памятью, а iter_records читает файл построчно.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        """Добавление записей в конец файла"""
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+
+    def iter_records(self, run_id=None):
+        """Записи из файла по одной (только запуска run_id, если он задан)"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if run_id is None or record.get("run_id") == run_id:
+                    yield record
+
+
+def render_answer_report(records, sent, original_file):
+    """Текстовый отчет для файла ответов из записей о полученных ответах"""
+    lines = ["=" * 60,
+             f"Вопрос отправлен: {sent.strftime('%Y-%m-%d %H:%M:%S')}",
+             f"Исходный файл: {original_file}",
+             "=" * 60,
+             ""]
+    for record in records:
+        if record["status"] != "ok":
+            continue
+        lines.append(f"--- {record['network']} (из кэша) ---" if record["cached"] else f"--- {record['network']} ---")
+        lines.append(record["response"])
+        lines.append("=" * 60)
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def percentile(values, fraction):
+    """Перцентиль по методу ближайшего ранга (None для пустого списка)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def read_token_usage(usage):
+    """Токены вопроса и ответа из поля usage (словарь или объект SDK): (prompt, completion)"""
+    if usage is None:
+        return None, None
+    if isinstance(usage, dict):
+        get = usage.get
+    else:
+        def get(name):
+            return getattr(usage, name, None)
+    prompt = get("prompt_tokens")
+    completion = get("completion_tokens")
+    if prompt is None:
+        prompt = get("input_tokens")
+    if completion is None:
+        completion = get("output_tokens")
+    return prompt, completion
+
+
+class MetricsStore:
+    """Метрики запросов к нейросетям и проверок соединения в SQLite
+
+    Сводка (p50/p95/p99) считается по последним window записям каждой
+    нейросети; записи старше keep_days удаляются при открытии.
+    """
+
+    FIELDS = ("model", "latency", "ttfb", "connect", "retries", "prompt_tokens", "completion_tokens")
+
+    def __init__(self, path, window=1000, keep_days=30):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "ts REAL, network TEXT, kind TEXT, status TEXT, model TEXT, latency REAL, ttfb REAL, "
+            "connect REAL, retries INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS calls_network ON calls (network, kind, ts)")
+        self._db.execute("DELETE FROM calls WHERE ts < ?", (time.time() - keep_days * 86400,))
+        self._db.commit()
+
+    def record(self, network, kind, status, info):
+        """Запись запроса (kind="query") или проверки соединения (kind="health")"""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO calls (ts, network, kind, status, model, latency, ttfb, connect, retries, "
+                "prompt_tokens, completion_tokens) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), network, kind, status) + tuple(info.get(field) for field in self.FIELDS)
+            )
+            self._db.commit()
+
+    def summary(self, kind="query"):
+        """Сводка по нейросетям: число вызовов, ошибки, перцентили задержек, токены"""
+        with self._lock:
+            networks = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT network FROM calls WHERE kind = ? ORDER BY network", (kind,))]
+            rows_by_network = {
+                network: self._db.execute(
+                    "SELECT status, latency, ttfb, connect, retries, prompt_tokens, completion_tokens, model "
+                    "FROM calls WHERE network = ? AND kind = ? ORDER BY ts DESC LIMIT ?",
+                    (network, kind, self.window)).fetchall()
+                for network in networks
+            }
+
+        result = {}
+        for network, rows in rows_by_network.items():
+            latencies = [row[1] for row in rows if row[0] == "ok" and row[1] is not None]
+            ttfbs = [row[2] for row in rows if row[0] == "ok" and row[2] is not None]
+            result[network] = {
+                "count": len(rows),
+                "errors": sum(1 for row in rows if row[0] != "ok"),
+                "latency": {q: percentile(latencies, q) for q in (0.5, 0.95, 0.99)},
+                "latency_sum": sum(latencies),
+                "latency_count": len(latencies),
+                "ttfb": {q: percentile(ttfbs, q) for q in (0.5, 0.95, 0.99)},
+                "connect": sum(row[3] or 0 for row in rows),
+                "retries": sum(row[4] or 0 for row in rows),
+                "prompt_tokens": sum(row[5] or 0 for row in rows),
+                "completion_tokens": sum(row[6] or 0 for row in rows),
+                "last_model": rows[0][7] if rows else None
+            }
+        return result
+
+    def write_prometheus(self, path):
+        """Экспорт сводки в текстовом формате Prometheus (файл заменяется атомарно)"""
+        lines = []
+        summaries = {kind: self.summary(kind) for kind in ("query", "health")}
+
+        def label(network, kind, **extra):
+            pairs = [("network", network), ("kind", kind)] + list(extra.items())
+            return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in pairs) + "}"
+
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        lines.append("# HELP preconcil_latency_seconds Длительность успешных вызовов нейросетей")
+        lines.append("# TYPE preconcil_latency_seconds summary")
+        for kind, summary in summaries.items():
+            for network, stats in summary.items():
+                for q, value in stats["latency"].items():
+                    if value is not None:
+                        lines.append(f"preconcil_latency_seconds{label(network, kind, quantile=q)} {value:.6f}")
+                lines.append(f"preconcil_latency_seconds_sum{label(network, kind)} {stats['latency_sum']:.6f}")
+                lines.append(f"preconcil_latency_seconds_count{label(network, kind)} {stats['latency_count']}")
+
+        lines.append("# HELP preconcil_ttfb_seconds Время до первого байта ответа")
+        lines.append("# TYPE preconcil_ttfb_seconds gauge")
+        for kind, summary in summaries.items():
+            for network, stats in summary.items():
+                for q, value in stats["ttfb"].items():
+                    if value is not None:
+                        lines.append(f"preconcil_ttfb_seconds{label(network, kind, quantile=q)} {value:.6f}")
+
+        counters = (("calls", "count", "Число вызовов"), ("errors", "errors", "Число неудачных вызовов"),
+                    ("retries", "retries", "Число повторов после 429 и сетевых ошибок"),
+                    ("connect_seconds", "connect", "Суммарное время установки соединений"))
+        for name, field, help_text in counters:
+            lines.append(f"# HELP preconcil_{name} {help_text} (последние записи)")
+            lines.append(f"# TYPE preconcil_{name} gauge")
+            for kind, summary in summaries.items():
+                for network, stats in summary.items():
+                    lines.append(f"preconcil_{name}{label(network, kind)} {stats[field]}")
+
+        lines.append("# HELP preconcil_tokens Токены вопросов и ответов (последние записи)")
+        lines.append("# TYPE preconcil_tokens gauge")
+        for network, stats in summaries["query"].items():
+            lines.append(f"preconcil_tokens{label(network, 'query', type='prompt')} {stats['prompt_tokens']}")
+            lines.append(f"preconcil_tokens{label(network, 'query', type='completion')} {stats['completion_tokens']}")
+
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class StreamRecorder:
+    """Прием потокового ответа нейросети
+
+    Фрагменты дописываются в промежуточный файл и передаются в on_text(имя,
+    фрагмент) для вывода в интерфейсе. Попутно замеряются время до первого
+    токена и скорость генерации (один фрагмент потока считается токеном).
+    """
+
+    def __init__(self, network, partial_path=None, on_text=None):
+        self.network = network
+        self.partial_path = partial_path
+        self.on_text = on_text
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+        self._lock = threading.Lock()
+        self._file = open(partial_path, 'w', encoding='utf-8') if partial_path else None
+
+    def __call__(self, delta):
+        with self._lock:
+            if self.finished_at is not None:
+                return
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.tokens += 1
+            if self._file:
+                self._file.write(delta)
+                self._file.flush()
+        if self.on_text:
+            self.on_text(self.network, delta)
+
+    def finish(self):
+        """Завершение приема: закрытие промежуточного файла"""
+        with self._lock:
+            if self.finished_at is None:
+                self.finished_at = time.perf_counter()
+                if self._file:
+                    self._file.close()
+
+    def discard(self):
+        """Удаление промежуточного файла (ответ сохранен в итоговый отчет)"""
+        self.finish()
+        if self.partial_path and os.path.exists(self.partial_path):
+            os.remove(self.partial_path)
+
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started
+
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        duration = self.finished_at - self.first_token_at
+        return self.tokens / duration if duration > 0 else None
+
+
+def parse_retry_delay(value):
+    """Пауза в секундах из Retry-After или x-ratelimit-reset-* (None, если не распознана)
+
+    Поддерживаются число секунд, длительность вида "1m30.5s" или "20ms",
+    метка времени Unix (в секундах или миллисекундах) и дата HTTP/ISO 8601.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+
+    try:
+        number = float(value)
+    except ValueError:
+        number = None
+    if number is not None:
+        if number > 1e12:  # метка времени в миллисекундах
+            return max(0.0, number / 1000 - time.time())
+        if number > 1e9:  # метка времени в секундах
+            return max(0.0, number - time.time())
+        return max(0.0, number)
+
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if parts and "".join(amount + unit for amount, unit in parts) == value:
+        units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(amount) * units[unit] for amount, unit in parts)
+
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return max(0.0, moment.timestamp() - time.time())
+
+
+def is_rate_limit_error(error):
+    """Исключение SDK означает ответ 429 (превышен лимит запросов)"""
+    return getattr(error, "status_code", None) == 429 or "429" in str(error)
+
+
+def is_transient_http_error(error):
+    """Сетевая ошибка, таймаут или ответ 429/5xx: запрос имеет смысл повторить позже"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class RateLimiter:
+    """Адаптивный ограничитель частоты запросов (token bucket) для нейросети и ключа
+
+    Запросы не отклоняются, а ждут свободного токена. После ответа 429
+    скорость снижается вдвое, а новые запросы ждут паузу из Retry-After /
+    x-ratelimit-* или экспоненциальную паузу со случайным разбросом.
+    Успешные ответы постепенно возвращают скорость к исходной.
+    """
+
+    def __init__(self, requests_per_minute=60, burst=3, backoff_base=1.0, backoff_max=60.0):
+        self.max_rate = max(requests_per_minute, 1) / 60.0
+        self.rate = self.max_rate
+        self.burst = max(1, burst)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.tokens = float(self.burst)
+        self.failures = 0
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Ожидание разрешения на запрос; возвращает время ожидания в секундах"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def backoff(self, hint=None):
+        """Пауза перед повтором после 429 или сетевой ошибки; возвращает ее длительность"""
+        with self._lock:
+            self.failures += 1
+            if hint is None:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+                delay *= random.uniform(0.5, 1.5)
+            else:
+                # Небольшой разброс, чтобы ожидающие запросы не ушли одновременно
+                delay = hint + random.uniform(0, min(1.0, hint * 0.1 + 0.1))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+            self.rate = max(self.max_rate * 0.1, self.rate * 0.5)
+            self.tokens = 0.0
+            return delay
+
+    def update(self, status_code, headers=None):
+        """Учет ответа нейросети; для 429 возвращает паузу перед повтором"""
+        headers = {key.lower(): value for key, value in (headers or {}).items()}
+        if status_code == 429:
+            hint = parse_retry_delay(headers.get("retry-after"))
+            if hint is None:
+                hint = parse_retry_delay(headers.get("x-ratelimit-reset-requests") or
+                                         headers.get("x-ratelimit-reset"))
+            return self.backoff(hint)
+
+        with self._lock:
+            self.failures = 0
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.1)
+
+            # Квота исчерпана: ждем ее обновления, не дожидаясь 429
+            remaining = headers.get("x-ratelimit-remaining-requests") or headers.get("x-ratelimit-remaining")
+            try:
+                exhausted = remaining is not None and float(remaining) <= 0
+            except ValueError:
+                exhausted = False
+            if exhausted:
+                reset = parse_retry_delay(headers.get("x-ratelimit-reset-requests") or
+                                          headers.get("x-ratelimit-reset"))
+                if reset:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+        return 0.0
+
+
+class CircuitBreaker:
+    """Автоматический выключатель запросов к нейросети для одного ключа
+
+    После failure_threshold ошибок или таймаутов подряд выключатель
+    размыкается: запросы сразу завершаются ошибкой без обращения к сети.
+    Через reset_timeout секунд пропускается один пробный запрос; его успех
+    замыкает выключатель, а ошибка снова размыкает его на вдвое больший
+    срок (не более max_reset_timeout). on_change(state) вызывается при
+    смене состояния: "closed", "open" или "half_open".
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=60, max_reset_timeout=600, on_change=None):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(reset_timeout, max_reset_timeout)
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.open_for = reset_timeout
+        self.open_until = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        changed = state != self.state
+        self.state = state
+        return changed
+
+    def _notify(self, changed):
+        if changed and self.on_change:
+            self.on_change(self.state)
+
+    def allow(self):
+        """Можно ли отправить запрос (в полуоткрытом состоянии - только один пробный)"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self._trial or time.monotonic() < self.open_until:
+                return False
+            self._trial = True
+            changed = self._set_state(self.HALF_OPEN)
+        self._notify(changed)
+        return True
+
+    def retry_in(self):
+        """Через сколько секунд будет пропущен пробный запрос"""
+        return max(0.0, self.open_until - time.monotonic())
+
+    def record(self, success):
+        """Учет результата запроса, пропущенного через allow()"""
+        with self._lock:
+            self._trial = False
+            if success:
+                self.failures = 0
+                self.open_for = self.reset_timeout
+                changed = self._set_state(self.CLOSED)
+            else:
+                self.failures += 1
+                if self.state == self.HALF_OPEN:
+                    self.open_for = min(self.max_reset_timeout, self.open_for * 2)
+                elif self.failures < self.failure_threshold:
+                    return
+                self.open_until = time.monotonic() + self.open_for
+                changed = self._set_state(self.OPEN)
+        self._notify(changed)
+
+    def release(self):
+        """Запрос, пропущенный через allow(), не учитывается (например, общий с другим запросом)"""
+        with self._lock:
+            self._trial = False
+
+    def probe_succeeded(self):
+        """Успешная проверка соединения: пробный запрос пропускается сразу"""
+        with self._lock:
+            if self.state == self.OPEN:
+                self.open_until = 0.0
+
+
+class ModelRace:
+    """Перебор резервных моделей нейросети с опережающим запуском (hedging)
+
+    Без hedge_delay модели пробуются по очереди. С hedge_delay следующая
+    модель запускается параллельно, если текущая не ответила за это время,
+    и сразу после отказа текущей (400/404/503). Побеждает первая попытка,
+    получившая ответ (claim); остальные по флагу cancelled закрывают свои
+    ответы и больше не запускаются.
+    """
+
+    def __init__(self, models, hedge_delay=None):
+        self.models = list(models)
+        self.hedge_delay = hedge_delay
+        self.winner = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def claim(self, model):
+        """Попытка стать победителем гонки; False, если ответ уже получен другой моделью"""
+        with self._lock:
+            if self.winner is None and not self.cancelled:
+                self.winner = model
+                return True
+            return self.winner == model
+
+    def run(self, attempt):
+        """Запуск гонки; attempt(model, race) возвращает ("ok" | "next" | "fatal", значение)
+
+        Возвращает (статус, значение) итоговой попытки; при отказе всех
+        моделей - ("next", последняя ошибка).
+        """
+        results = queue.Queue()
+        pending = list(self.models)
+        running = 0
+        last_error = ""
+
+        def worker(model):
+            try:
+                outcome = attempt(model, self)
+            except Exception as e:
+                outcome = ("next", str(e))
+            results.put((model,) + tuple(outcome))
+
+        def launch():
+            model = pending.pop(0)
+            threading.Thread(target=worker, args=(model,), daemon=True).start()
+
+        launch()
+        running += 1
+        try:
+            while running:
+                hedging = self.hedge_delay is not None and pending and self.winner is None
+                try:
+                    model, status, value = results.get(timeout=self.hedge_delay if hedging else None)
+                except queue.Empty:
+                    launch()
+                    running += 1
+                    continue
+
+                running -= 1
+                if status == "ok" or status == "fatal" or model == self.winner:
+                    return status, value
+                if value:
+                    last_error = value
+                if pending and self.winner is None:
+                    launch()
+                    running += 1
+            return "next", last_error
+        finally:
+            self._cancelled.set()
+
+
+class ModelCatalog:
+    """Каталог доступных моделей нейросетей и статистика их ответов (JSON на диске)
+
+    Список моделей нейросети считается свежим ttl секунд, а после неудачного
+    запроса списка новый запрос откладывается на failure_ttl секунд. Статистика
+    успехов и задержек затухает со временем, так что порядок резервных
+    моделей определяется их недавним поведением; на диск она пишется не чаще
+    раза в save_interval секунд и при завершении работы (flush).
+    """
+
+    DECAY = 0.9
+
+    def __init__(self, path, ttl=24 * 3600, failure_ttl=300, save_interval=30):
+        self.path = path
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._data = {"models": {}, "stats": {}}
+        self._failed = {}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+            self._data["models"].update(loaded.get("models", {}))
+            self._data["stats"].update(loaded.get("stats", {}))
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def get_models(self, network):
+        """Известные модели нейросети и признак свежести списка: (ids или None, fresh)"""
+        with self._lock:
+            entry = self._data["models"].get(network)
+        if not entry:
+            return None, False
+        return set(entry["ids"]), time.time() - entry["fetched"] < self.ttl
+
+    def set_models(self, network, ids):
+        """Сохранение списка моделей, полученного от нейросети"""
+        with self._lock:
+            self._data["models"][network] = {"fetched": time.time(), "ids": sorted(ids)}
+            self._failed.pop(network, None)
+            self._save()
+
+    def set_failed(self, network):
+        """Учет неудачного запроса списка моделей"""
+        with self._lock:
+            self._failed[network] = time.monotonic()
+
+    def recently_failed(self, network):
+        """Список моделей недавно не удалось получить - повторный запрос пока не нужен"""
+        with self._lock:
+            failed_at = self._failed.get(network)
+        return failed_at is not None and time.monotonic() - failed_at < self.failure_ttl
+
+    def record(self, network, model, success, latency=None):
+        """Учет попытки запроса к модели"""
+        with self._lock:
+            stats = self._data["stats"].setdefault(network, {}).setdefault(
+                model, {"ok": 0.0, "failed": 0.0, "latency": None})
+            stats["ok"] *= self.DECAY
+            stats["failed"] *= self.DECAY
+            if success:
+                stats["ok"] += 1
+                if latency is not None:
+                    previous = stats["latency"]
+                    stats["latency"] = latency if previous is None else previous * 0.7 + latency * 0.3
+            else:
+                stats["failed"] += 1
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.save_interval:
+                self._save()
+
+    def flush(self):
+        """Запись несохраненной статистики на диск"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def order(self, network, candidates):
+        """Резервные модели без пропавших из каталога, лучшие по статистике - первыми"""
+        ids, _ = self.get_models(network)
+        alive = [model for model in candidates if ids is None or model in ids] or list(candidates)
+
+        with self._lock:
+            stats = dict(self._data["stats"].get(network, {}))
+
+        def score(item):
+            index, model = item
+            entry = stats.get(model, {})
+            ok, failed = entry.get("ok", 0), entry.get("failed", 0)
+            success_rate = (ok + 1) / (ok + failed + 2)
+            latency = entry.get("latency")
+            return -round(success_rate, 1), latency if latency is not None else float("inf"), index
+
+        return [model for _, model in sorted(enumerate(alive), key=score)]
+
+    def _save(self):
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+
+class GenAPIPoller:
+    """Опрос результатов задач GenAPI в одном общем потоке
+
+    Задачи опрашиваются по нарастающему расписанию (first_delay, затем
+    интервал растет в backoff раз до max_delay) или через паузу, указанную
+    сервером. Незавершенные задачи хранятся в SQLite: после перезапуска
+    опрос продолжается, а готовый ответ выдается при повторном запросе
+    того же вопроса без новой генерации. Каждая задача опрашивается с
+    ключом, с которым она создана; ключи хранятся только в памяти, так что
+    задачи прошлого запуска получают ключ, переданный в resume.
+    """
+
+    def __init__(self, path, fetch_status, first_delay=1.0, max_delay=10.0, backoff=1.5,
+                 max_wait=300, keep_hours=24):
+        self.path = path
+        self.fetch_status = fetch_status
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self._api_keys = {}
+        self._schedule = []
+        self._delays = {}
+        self._events = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "key TEXT PRIMARY KEY, request_id TEXT, status TEXT, result TEXT, created REAL)"
+        )
+        self._db.execute("DELETE FROM tasks WHERE created < ?", (time.time() - keep_hours * 3600,))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(network_id, question):
+        """Ключ задачи для нейросети GenAPI и вопроса"""
+        return hashlib.sha256(f"{network_id}\n{question}".encode('utf-8')).hexdigest()
+
+    def find(self, key):
+        """Сохраненная задача: (request_id, статус, результат) или None"""
+        with self._lock:
+            return self._db.execute("SELECT request_id, status, result FROM tasks WHERE key = ?",
+                                    (key,)).fetchone()
+
+    def resume(self, api_key):
+        """Продолжение опроса задач, оставшихся от прошлого запуска"""
+        if not api_key:
+            return 0
+        with self._lock:
+            rows = self._db.execute("SELECT key, created FROM tasks WHERE status = 'pending'").fetchall()
+        for key, created in rows:
+            with self._condition:
+                self._api_keys.setdefault(key, api_key)
+            self._enqueue(key, created)
+        return len(rows)
+
+    def add(self, key, request_id, api_key):
+        """Новая задача в опросе"""
+        with self._condition:
+            self._api_keys[key] = api_key
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO tasks (key, request_id, status, result, created) "
+                             "VALUES (?, ?, 'pending', NULL, ?)", (key, request_id, now))
+            self._db.commit()
+        self._enqueue(key, now)
+
+    def wait(self, key, timeout=None):
+        """Ожидание завершения задачи: (статус, результат); статус None - время истекло
+
+        Полученный результат удаляется из хранилища.
+        """
+        with self._condition:
+            event = self._events.setdefault(key, threading.Event())
+        row = self.find(key)
+        if row is not None and row[1] == "pending":
+            event.wait(self.max_wait if timeout is None else timeout)
+            row = self.find(key)
+        if row is None or row[1] == "pending":
+            return None, None
+        with self._condition:
+            if key not in self._delays:
+                self._events.pop(key, None)
+        self._delete(key)
+        return row[1], row[2]
+
+    def stop(self):
+        """Остановка потока опроса (задачи остаются в хранилище)"""
+        with self._condition:
+            self._thread = None
+            self._condition.notify_all()
+
+    def _enqueue(self, key, created):
+        with self._condition:
+            self._events.setdefault(key, threading.Event())
+            if key in self._delays:
+                return
+            self._delays[key] = (self.first_delay, created)
+            heapq.heappush(self._schedule, (time.monotonic() + self.first_delay, key))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="genapi-poller", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        current = threading.current_thread()
+        while True:
+            with self._condition:
+                if self._thread is not current:
+                    return
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                due, key = self._schedule[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                heapq.heappop(self._schedule)
+            self._poll(key)
+
+    def _poll(self, key):
+        row = self.find(key)
+        if row is None or row[1] != "pending":
+            self._finish(key, None)
+            return
+
+        try:
+            with self._condition:
+                api_key = self._api_keys.get(key)
+            status_data, hint = self.fetch_status(row[0], api_key)
+        except Exception:
+            status_data, hint = None, None
+        status = (status_data or {}).get("status")
+
+        if status == "success":
+            output = status_data.get("output")
+            self._finish(key, "success", output or "Ответ GenAPI получен, но поле 'output' пустое.")
+        elif status == "failed":
+            error_result = status_data.get("result", ["Неизвестная ошибка"])
+            self._finish(key, "failed", f"Ошибка GenAPI: задача не выполнена. Детали: {error_result}")
+        else:
+            with self._condition:
+                delay, created = self._delays[key]
+                if time.time() - created > self.max_wait:
+                    self._delays.pop(key)
+                    expired = True
+                else:
+                    next_delay = hint if hint is not None else min(self.max_delay, delay * self.backoff)
+                    self._delays[key] = (next_delay, created)
+                    heapq.heappush(self._schedule, (time.monotonic() + next_delay, key))
+                    expired = False
+            if expired:
+                self._finish(key, "expired", f"Ошибка GenAPI: Превышено время ожидания ответа по задаче {row[0]}.")
+
+    def _finish(self, key, status, result=None):
+        if status is not None:
+            with self._lock:
+                self._db.execute("UPDATE tasks SET status = ?, result = ? WHERE key = ?", (status, result, key))
+                self._db.commit()
+        with self._condition:
+            self._delays.pop(key, None)
+            self._api_keys.pop(key, None)
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM tasks WHERE key = ?", (key,))
+            self._db.commit()
+
+
+def create_file_logger(path, max_bytes=1024 * 1024, backups=3):
+    """Журнал в файле с ротацией по размеру (None, если файл недоступен)"""
+    logger = logging.getLogger(f"preconcil.{os.path.abspath(path)}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        try:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        except OSError:
+            return None
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+class ProviderSpec:
+    """Описание нейросети: ключ конфигурации, модель по умолчанию и обработчики
+
+    Обработчики запроса и проверки соединения задаются именами методов
+    приложения и разрешаются только при первом обращении к нейросети.
+    """
+
+    def __init__(self, name, key_name, default_model, query, health_check, client=None, title=None,
+                 key_label="API ключ:", key_required=True, selected=True, note=None,
+                 model_label=None, fallback_models=None, system_prompt=None, temperature=None,
+                 max_tokens=None, streaming=False, requests_per_minute=60, hedge_delay=None,
+                 list_models=None, batch_submit=None, batch_poll=None, context_tokens=8000):
+        self.name = name
+        self.key_name = key_name
+        self.default_model = default_model
+        self.query = query
+        self.health_check = health_check
+        self.client = client
+        self.title = title or f"{name} API"
+        self.key_label = key_label
+        self.key_required = key_required
+        self.selected = selected
+        self.note = note
+        self.model_label = model_label
+        self.fallback_models = list(fallback_models or [default_model])
+        self.system_prompt = system_prompt
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.streaming = streaming
+        self.requests_per_minute = requests_per_minute
+        self.hedge_delay = hedge_delay
+        self.list_models = list_models
+        self.batch_submit = batch_submit
+        self.batch_poll = batch_poll
+        # Сколько токенов вопроса помещается в один запрос (больше - запросы по частям)
+        self.context_tokens = context_tokens
+
+    def get_query_handler(self, app):
+        """Метод приложения, отправляющий вопрос в нейросеть"""
+        return getattr(app, self.query)
+
+    def get_health_check(self, app):
+        """Метод приложения, проверяющий соединение с нейросетью"""
+        return getattr(app, self.health_check)
+
+    def get_client_factory(self, app):
+        """Метод приложения, создающий клиент SDK (или None для HTTP API)"""
+        return getattr(app, self.client) if self.client else None
+
+    def get_model_lister(self, app):
+        """Метод приложения, запрашивающий доступные модели (или None)"""
+        return getattr(app, self.list_models) if self.list_models else None
+
+    def get_batch_handlers(self, app):
+        """Методы приложения (отправка, опрос) для Batch API или None"""
+        if not self.batch_submit:
+            return None
+        return getattr(app, self.batch_submit), getattr(app, self.batch_poll)
+
+
+# Реестр нейросетей: имя в интерфейсе -> описание (порядок задает порядок в UI)
+PROVIDERS = {}
+
+# Системные промпты, с которыми отправляются вопросы
+SYSTEM_PROMPT = "Вы - полезный ассистент. Отвечай на русском языке."
+SYSTEM_PROMPT_INFORMAL = "Ты - полезный ассистент. Отвечай на русском языке."
+
+# Запросы по частям для вопросов, не помещающихся в контекст нейросети
+CHUNK_MAP_PROMPT = ("Это часть {number} большого документа с вопросом или заданием, который не помещается "
+                    "в один запрос. Выпиши из нее все, что нужно для ответа; если в этой части есть сам "
+                    "вопрос или задание, приведи его дословно.\n\n{text}")
+CHUNK_REFINE_PROMPT = ("Ниже заметки по предыдущим частям большого документа с вопросом или заданием и его "
+                       "часть {number}. Дополни заметки всем, что нужно для ответа; вопрос или задание, если "
+                       "они есть, приведи дословно. Верни только обновленные заметки.\n\n"
+                       "Заметки:\n{notes}\n\nЧасть {number}:\n{text}")
+CHUNK_COMBINE_PROMPT = ("Объедини заметки по частям большого документа в одни заметки, сохранив все нужное "
+                        "для ответа и дословный текст вопроса или задания.\n\n{text}")
+CHUNK_REDUCE_PROMPT = ("Ниже заметки по частям большого документа (по порядку), в котором содержится вопрос "
+                       "или задание. Дай по ним итоговый ответ на этот вопрос или выполни задание.\n\n{text}")
+
+
+def register_provider(spec):
+    """Регистрация нейросети в реестре"""
+    PROVIDERS[spec.name] = spec
+    return spec
+
+
+register_provider(ProviderSpec(
+    "OpenAI GPT", "openai", "gpt-3.5-turbo",
+    query="query_openai", health_check="test_openai_connection",
+    title="OpenAI API", selected=False,
+    system_prompt=SYSTEM_PROMPT, temperature=0.7, max_tokens=1000, streaming=True,
+    batch_submit="submit_openai_batch", batch_poll="poll_openai_batch", context_tokens=15000))
+register_provider(ProviderSpec(
+    "Anthropic Claude", "anthropic", "claude-3-haiku-20240307",
+    query="query_anthropic", health_check="test_anthropic_connection", client="create_anthropic_client",
+    title="Anthropic API", selected=False,
+    max_tokens=1000, streaming=True,
+    batch_submit="submit_anthropic_batch", batch_poll="poll_anthropic_batch", context_tokens=150000))
+register_provider(ProviderSpec(
+    "DeepSeek", "deepseek", "deepseek-chat",
+    query="query_deepseek", health_check="test_deepseek_connection", client="create_deepseek_client",
+    system_prompt=SYSTEM_PROMPT, temperature=0.7, max_tokens=1000, streaming=True, context_tokens=60000))
+register_provider(ProviderSpec(
+    "Groq", "groq", "llama-3.1-8b-instant",
+    query="query_groq", health_check="test_groq_connection", list_models="list_groq_models",
+    fallback_models=[
+        "llama-3.1-8b-instant",
+        "llama-3.1-70b-versatile",
+        "llama3-8b-8192",
+        "mixtral-8x7b-32768"
+    ],
+    system_prompt=SYSTEM_PROMPT_INFORMAL, temperature=0.7, max_tokens=1000, streaming=True,
+    requests_per_minute=30, hedge_delay=4, context_tokens=5000))
+register_provider(ProviderSpec(
+    "OpenRouter", "openrouter", "mistralai/mistral-7b-instruct:free",
+    query="query_openrouter", health_check="test_openrouter_connection", list_models="list_openrouter_models",
+    fallback_models=[
+        "mistralai/mistral-7b-instruct:free",
+        "google/gemma-7b-it:free",
+        "huggingfaceh4/zephyr-7b-beta:free"
+    ],
+    system_prompt=SYSTEM_PROMPT_INFORMAL, temperature=0.7, max_tokens=1000, streaming=True,
+    requests_per_minute=20, hedge_delay=6, context_tokens=30000))
+register_provider(ProviderSpec(
+    "Hugging Face", "huggingface", "microsoft/DialoGPT-medium",
+    query="query_huggingface", health_check="test_huggingface_connection",
+    list_models="list_huggingface_models",
+    key_label="API ключ (необязательно):", key_required=False,
+    fallback_models=[
+        "microsoft/DialoGPT-medium",
+        "gpt2",
+        "distilgpt2",
+        "facebook/opt-350m"
+    ],
+    temperature=0.7, max_tokens=500, hedge_delay=8, context_tokens=500))
+register_provider(ProviderSpec(
+    "Mistral AI", "mistral", "mistral-small-latest",
+    query="query_mistral", health_check="test_mistral_connection", client="create_mistral_client",
+    note="Документация: https://docs.mistral.ai/",
+    temperature=0.7, max_tokens=1000, streaming=True, context_tokens=30000))
+register_provider(ProviderSpec(
+    "GigaChat", "gigachat", "GigaChat",
+    query="query_gigachat", health_check="test_gigachat_connection", client="create_gigachat_client",
+    title="GigaChat API (Sberbank)", key_label="Ключ авторизации (Authorization):",
+    note="Требуется сертификат НУЦ Минцифры (см. install_gigachat_cert.bat)", context_tokens=30000))
+register_provider(ProviderSpec(
+    "GenAPI", "genapi", "gpt-4o-mini",
+    query="query_genapi", health_check="test_genapi_connection",
+    title="GenAPI", model_label="ID нейросети (по умолчанию: gpt-4o-mini):", context_tokens=120000))
+
+
+class QueryDispatcher:
+    """Параллельная отправка запросов к нейросетям с общим дедлайном на запуск"""
+
+    def __init__(self, max_workers=9, deadline=360, slots=None):
+        self.max_workers = max(1, int(max_workers))
+        self.deadline = deadline
+        # Общий семафор позволяет ограничить запросы сразу нескольких запусков
+        self.slots = slots
+
+    def run(self, tasks, on_result=None):
+        """Запуск задач {имя: функция}; возвращает (результаты, список просроченных)
+
+        Каждый результат передается в on_result(имя, ответ, исключение) сразу по
+        мере готовности. Задачи, не успевшие завершиться до дедлайна, не
+        блокируют вызывающего и попадают в список просроченных.
+        """
+        results_queue = queue.Queue()
+        slots = self.slots or threading.Semaphore(self.max_workers)
+        cancelled = threading.Event()
+
+        def worker(name, func):
+            with slots:
+                # Задача, не успевшая стартовать до дедлайна, не отправляется
+                if cancelled.is_set():
+                    return
+                try:
+                    results_queue.put((name, func(), None))
+                except Exception as e:
+                    results_queue.put((name, None, e))
+
+        for name, func in tasks.items():
+            threading.Thread(target=worker, args=(name, func), name=f"query-{name}", daemon=True).start()
+
+        deadline = time.monotonic() + self.deadline
+        pending = set(tasks)
+        results = {}
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                name, response, error = results_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            pending.discard(name)
+            results[name] = (response, error)
+            if on_result:
+                on_result(name, response, error)
+
+        cancelled.set()
+        timed_out = [name for name in tasks if name in pending]
+        return results, timed_out
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных вызовов (single-flight)
+
+    Пока вызов с ключом выполняется, повторные вызовы с тем же ключом не
+    запускают функцию, а ждут и получают ее результат или исключение.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, on_wait=None):
+        """Результат func() и признак того, что он получен от чужого вызова
+
+        on_wait вызывается перед ожиданием чужого вызова.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            if on_wait:
+                on_wait()
+            return call.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        call.set_result(result)
+        return result, False
+
+
+# Имена файлов с ответами: name_answer.txt, name_answer (1).txt и т.д.
+ANSWER_FILE_PATTERN = re.compile(r"_answer( \(\d+\))?\.txt$")
+ANSWER_NAME_PATTERN = re.compile(r"^(.*)_answer(?: \((\d+)\))?\.txt$")
+
+# Периоды поиска по истории: подпись -> число дней (None - без ограничения)
+HISTORY_PERIODS = {"За все время": None, "За сутки": 1, "За неделю": 7, "За месяц": 30, "За год": 365}
+
+
+def answer_filename(base_name, number):
+    """Имя файла ответов: base_answer.txt, затем base_answer (1).txt, (2) и т.д."""
+    return f"{base_name}_answer.txt" if number == 0 else f"{base_name}_answer ({number}).txt"
+
+
+def file_digest(path):
+    """SHA-256 содержимого файла (читается блоками)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class QuestionFile:
+    """Большой файл с вопросом: читается блоками и целиком в памяти не хранится
+
+    Для ключей кэша используется хэш содержимого, для поиска по истории -
+    начало файла (preview).
+    """
+
+    def __init__(self, path, block_size=64 * 1024, preview_chars=2000):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.block_size = block_size
+        self.sha256 = file_digest(path)
+        self.key_text = f"Файл {self.sha256}"
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            self.preview = f.read(preview_chars).strip()
+
+    def blocks(self):
+        """Текст файла блоками по block_size символов"""
+        with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+            for block in iter(lambda: f.read(self.block_size), ""):
+                yield block
+
+
+def find_text_cut(text, max_chars):
+    """Место разреза текста не дальше max_chars: по абзацу, строке, предложению или слову"""
+    window = text[:max_chars]
+    for separator in ("\n\n", "\n", ". ", " "):
+        position = window.rfind(separator)
+        if position >= max_chars // 2:
+            return position + len(separator)
+    return max_chars
+
+
+def split_text_blocks(blocks, max_chars):
+    """Части текста не длиннее max_chars из потока блоков (в памяти - не больше части и блока)"""
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        while len(buffer) > max_chars:
+            cut = find_text_cut(buffer, max_chars)
+            chunk = buffer[:cut].strip()
+            buffer = buffer[cut:]
+            if chunk:
+                yield chunk
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def question_chunks(question, max_chars):
+    """Части вопроса (строки или QuestionFile) не длиннее max_chars"""
+    if isinstance(question, QuestionFile):
+        blocks = question.blocks()
+    else:
+        block_size = 64 * 1024
+        blocks = (question[start:start + block_size] for start in range(0, len(question), block_size))
+    return split_text_blocks(blocks, max_chars)
+
+
+def question_size(question):
+    """Длина вопроса в символах (для файла - оценка сверху по размеру в байтах)"""
+    return question.size if isinstance(question, QuestionFile) else len(question)
+
+
+def is_error_response(response):
+    """Ответ нейросети похож на сообщение об ошибке (в том числе упоминает error в тексте)"""
+    return bool(response) and (response.startswith("Ошибка") or "Error" in response or "error" in response.lower())
+
+
+def is_failure_response(response):
+    """Обработчик запроса вернул ошибку (пустой ответ или сообщение "Ошибка ...")"""
+    return not response or response.startswith("Ошибка")
+
+
+class WorkQueue:
+    """Постоянная очередь файлов с вопросами в SQLite
+
+    Файл с тем же путем и содержимым ставится в очередь только один раз.
+    Задача помечается владельцем - открытой очередью, которая ее взяла.
+    При открытии очереди в ожидание возвращаются только задачи, прерванные
+    перезапуском: задачи очередей этого процесса, чьи рабочие потоки еще
+    не завершились (release), не трогаются.
+    """
+
+    _live_owners = set()
+    _live_lock = threading.Lock()
+
+    def __init__(self, path):
+        self.path = path
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT, digest TEXT, status TEXT, "
+            "added REAL, updated REAL, result TEXT, owner TEXT, UNIQUE (path, digest))"
+        )
+        try:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        except sqlite3.OperationalError:
+            pass  # Столбец уже есть
+
+        with WorkQueue._live_lock:
+            live = list(WorkQueue._live_owners)
+            WorkQueue._live_owners.add(self.owner)
+        self._db.execute(
+            "UPDATE jobs SET status = 'pending', owner = NULL WHERE status = 'processing' "
+            f"AND (owner IS NULL OR owner NOT IN ({', '.join('?' * len(live))}))", live
+        )
+        self._db.commit()
+
+    def add(self, path, digest):
+        """Постановка файла в очередь; False, если он уже был в очереди"""
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO jobs (path, digest, status, added, updated) VALUES (?, ?, 'pending', ?, ?)",
+                (path, digest, now, now)
+            )
+            self._db.commit()
+            return cursor.rowcount > 0
+
+    def claim(self):
+        """Следующая задача в ожидании, помеченная как обрабатываемая: (id, путь) или None"""
+        with self._lock:
+            while True:
+                row = self._db.execute(
+                    "SELECT id, path FROM jobs WHERE status = 'pending' ORDER BY id LIMIT 1").fetchone()
+                if row is None:
+                    return None
+                # Задачу могла взять очередь того же файла в другом соединении
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'processing', owner = ?, updated = ? WHERE id = ? AND status = 'pending'",
+                    (self.owner, time.time(), row[0]))
+                self._db.commit()
+                if cursor.rowcount:
+                    return row
+
+    def finish(self, job_id, status, result=""):
+        """Завершение задачи со статусом 'done' или 'failed'"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ?",
+                             (status, result, time.time(), job_id))
+            self._db.commit()
+
+    def counts(self):
+        """Число задач по статусам"""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def release(self):
+        """Рабочие потоки очереди завершились: ее незавершенные задачи можно возвращать в ожидание"""
+        with WorkQueue._live_lock:
+            WorkQueue._live_owners.discard(self.owner)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class InboxWatcher:
+    """Наблюдение за папкой входящих
+
+    События файловой системы берутся из watchdog (inotify в Linux), а без
+    него папка опрашивается раз в poll_interval секунд. Файл передается в
+    on_ready только после того, как его размер и время изменения не менялись
+    settle_time секунд, - недописанные файлы не обрабатываются.
+    """
+
+    def __init__(self, inbox_dir, on_ready, poll_interval=2.0, settle_time=2.0):
+        self.inbox_dir = inbox_dir
+        self.on_ready = on_ready
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.mode = None
+        self._candidates = {}
+        self._delivered = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread = None
+
+    def start(self):
+        """Запуск наблюдения (возвращает режим: 'inotify' или 'опрос')"""
+        self._observer = self._start_observer()
+        self.mode = "inotify" if self._observer else "опрос"
+        self._scan()
+        self._thread = threading.Thread(target=self._run, name="inbox-watcher", daemon=True)
+        self._thread.start()
+        return self.mode
+
+    def stop(self):
+        """Остановка наблюдения"""
+        self._stop.set()
+        if self._observer:
+            self._observer.stop()
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return None
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if not event.is_directory:
+                    watcher._touch(getattr(event, "dest_path", "") or event.src_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.inbox_dir, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def _is_question_file(self, path):
+        name = os.path.basename(path)
+        return name.endswith(".txt") and not name.startswith(".") and not ANSWER_FILE_PATTERN.search(name)
+
+    def _touch(self, path):
+        if self._is_question_file(path):
+            with self._lock:
+                # Изменения размера или времени отслеживаются в _check_candidates
+                self._candidates.setdefault(path, None)
+
+    def _scan(self):
+        try:
+            names = os.listdir(self.inbox_dir)
+        except OSError:
+            return
+        for name in names:
+            self._touch(os.path.join(self.inbox_dir, name))
+
+    def _run(self):
+        # С событиями файловой системы опрос нужен только для проверки "устоявшихся" файлов
+        interval = min(self.poll_interval, 0.5) if self._observer else self.poll_interval
+        while not self._stop.wait(interval):
+            if not self._observer:
+                self._scan()
+            self._check_candidates()
+
+    def _check_candidates(self):
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, seen in list(self._candidates.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self._candidates[path]
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if self._delivered.get(path) == signature:
+                    del self._candidates[path]
+                elif seen is None or seen[0] != signature:
+                    self._candidates[path] = (signature, now)
+                elif now - seen[1] >= self.settle_time:
+                    del self._candidates[path]
+                    self._delivered[path] = signature
+                    ready.append(path)
+
+        for path in ready:
+            self.on_ready(path)
+
+
+class InboxProcessor:
+    """Автоматическая обработка новых файлов с вопросами из папки входящих
+
+    Найденные файлы попадают в постоянную очередь рядом с папкой входящих,
+    а рабочие потоки отправляют вопросы в нейросети и сохраняют ответы.
+    """
+
+    QUEUE_FILENAME = ".preconcil_queue.sqlite3"
+
+    def __init__(self, core, inbox_dir, save_dir, networks, api_keys, workers=2, poll_interval=2.0,
+                 settle_time=2.0, slots=None, on_processed=None):
+        self.core = core
+        self.on_processed = on_processed
+        self.inbox_dir = inbox_dir
+        self.save_dir = save_dir
+        self.networks = networks
+        self.api_keys = api_keys
+        self.workers = max(1, int(workers))
+        self.slots = slots
+        self.queue = WorkQueue(os.path.join(inbox_dir, self.QUEUE_FILENAME))
+        self.watcher = InboxWatcher(inbox_dir, self.enqueue, poll_interval=poll_interval, settle_time=settle_time)
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._running = 0
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Запуск наблюдения и рабочих потоков"""
+        mode = self.watcher.start()
+        pending = self.queue.counts().get("pending", 0)
+        self.core.log_message(f"📂 Наблюдение за {self.inbox_dir} ({mode}), в очереди: {pending}")
+        self._running = self.workers
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inbox-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Остановка наблюдения; текущие запросы завершаются в фоне
+
+        Пока они не завершились, взятые задачи не возвращаются в ожидание
+        новой очередью той же папки (см. WorkQueue), так что повторный запуск
+        наблюдения не обработает файл дважды.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        self.watcher.stop()
+
+    def enqueue(self, path):
+        """Постановка готового файла в очередь (повторно не ставится)"""
+        try:
+            digest = file_digest(path)
+        except OSError as e:
+            self.core.log_message(f"⚠️ Не удалось прочитать {path}: {str(e)}")
+            return
+        if self.queue.add(path, digest):
+            self.core.log_message(f"📥 В очередь: {os.path.basename(path)}")
+            self._wakeup.set()
+
+    def _worker(self):
+        try:
+            self._process_jobs()
+        finally:
+            with self._running_lock:
+                self._running -= 1
+                last = self._running == 0
+            if last:
+                self.queue.release()
+
+    def _process_jobs(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+
+            job_id, path = job
+            try:
+                question = self.core.read_question_file(path)
+                if not question:
+                    self.queue.finish(job_id, "failed", "пустой или нечитаемый файл")
+                    continue
+                _, _, saved_file = self.core.process_question(question, self.networks, self.api_keys,
+                                                              self.save_dir, path, slots=self.slots)
+                if saved_file:
+                    self.queue.finish(job_id, "done", saved_file)
+                    if self.on_processed:
+                        self.on_processed(saved_file)
+                else:
+                    self.queue.finish(job_id, "failed", "нет ответов")
+            except Exception as e:
+                self.core.log_message(f"❌ Ошибка обработки {path}: {str(e)}")
+                self.queue.finish(job_id, "failed", str(e))
+
+
+class NeuralNetworkCore:
+    """Работа с нейросетями без интерфейса: конфигурация, запросы и сохранение ответов
+
+    Используется окном приложения (NeuralNetworkApp) и пакетным режимом
+    командной строки (run_batch).
+    """
+
+    def __init__(self, config_file="config.json"):
+        # Конфигурация
+        self.config_file = config_file
+        self.load_config()
+
+        # Журнал в файле рядом с конфигурацией
+        log_config = self.config["log"]
+        config_dir = os.path.dirname(os.path.abspath(config_file))
+        self.file_logger = create_file_logger(os.path.join(config_dir, log_config["filename"]),
+                                              max_bytes=log_config["max_size_kb"] * 1024,
+                                              backups=log_config["backups"])
+
+        # Пул соединений с нейросетями
+        pool_config = self.config["connection_pool"]
+        self.connection_pool = ConnectionPool(pool_connections=pool_config["pool_connections"],
+                                              pool_maxsize=pool_config["pool_maxsize"])
+
+        # Фоновая проверка интернет-соединения
+        connectivity_config = self.config["connectivity"]
+        self.connectivity = ConnectivityMonitor(host=connectivity_config["probe_host"],
+                                                port=connectivity_config["probe_port"],
+                                                interval=connectivity_config["interval"],
+                                                timeout=connectivity_config["timeout"])
+        self.connectivity.start()
+
+        # Ограничители частоты запросов по нейросети и ключу (см. get_rate_limiter)
+        self._rate_limiters = {}
+        self._rate_limiters_lock = threading.Lock()
+
+        # Выключатели запросов к недоступным нейросетям (см. get_circuit_breaker)
+        self._circuit_breakers = {}
+        self._circuit_breakers_lock = threading.Lock()
+
+        # Метрики запросов и экспорт для Prometheus (рядом с конфигурацией)
+        metrics_config = self.config["metrics"]
+        self.metrics = None
+        self.metrics_export_path = os.path.join(config_dir, metrics_config["prometheus_file"])
+        if metrics_config["enabled"]:
+            try:
+                self.metrics = MetricsStore(os.path.join(config_dir, metrics_config["filename"]),
+                                            window=metrics_config["window"],
+                                            keep_days=metrics_config["keep_days"])
+            except sqlite3.Error as e:
+                self.log_message(f"⚠️ Метрики недоступны: {str(e)}")
+        # Файл для Prometheus обновляется отложенно (см. schedule_metrics_export)
+        self._metrics_export_timer = None
+        self._metrics_export_lock = threading.Lock()
+
+        # Параллельные проверки соединения с нейросетями с кэшем результатов
+        self.health = HealthMonitor(self.run_health_check, ttl=self.config["health_checks"]["ttl"],
+                                    on_result=self.on_health_result)
+
+        # Каталог моделей и статистика резервных моделей (рядом с конфигурацией)
+        catalog_config = self.config["model_catalog"]
+        self.model_catalog = ModelCatalog(os.path.join(config_dir, catalog_config["filename"]),
+                                          ttl=catalog_config["ttl_hours"] * 3600,
+                                          failure_ttl=catalog_config["failure_ttl"],
+                                          save_interval=catalog_config["save_interval"])
+        self._catalog_refreshing = set()
+        self._catalog_lock = threading.Lock()
+
+        # Общий опрос задач GenAPI (незавершенные задачи переживают перезапуск)
+        genapi_config = self.config["genapi"]
+        self.genapi_poller = GenAPIPoller(os.path.join(config_dir, genapi_config["tasks_filename"]),
+                                          self.fetch_genapi_status,
+                                          first_delay=genapi_config["first_poll"],
+                                          max_delay=genapi_config["max_poll_interval"],
+                                          max_wait=genapi_config["max_wait"])
+        self.genapi_poller.resume(self.config["api_keys"].get("genapi"))
+
+        # Загруженные SDK нейросетей (см. load_sdk)
+        self._sdk_modules = {}
+
+        # Кэши ответов по папкам сохранения (см. get_response_cache)
+        self._response_caches = {}
+        self._response_caches_lock = threading.Lock()
+
+        # Индексы истории ответов по папкам сохранения (см. get_history_index)
+        self._history_indexes = {}
+        self._history_indexes_lock = threading.Lock()
+
+        # Структурированные результаты по папкам сохранения (см. get_results_store)
+        self._results_stores = {}
+        self._results_stores_lock = threading.Lock()
+
+        # Сведения о текущем запросе к нейросети в потоке запроса (см. call_info)
+        self._call_local = threading.local()
+
+        # Занятые номера файлов ответов по папкам (см. get_answer_numbers)
+        self._answer_numbers = {}
+        self._answer_numbers_lock = threading.Lock()
+
+        # Метрики последних потоковых ответов по нейросетям
+        self.stream_stats = {}
+
+        # Одинаковые одновременные запросы к нейросети отправляются один раз
+        self.single_flight = SingleFlight()
 
     def load_config(self):
         """Загрузка конфигурации из файла"""
         self.config = {
-            "api_keys": {
-                "openai": "",
-                "anthropic": "",
-                "deepseek": "",
-                "groq": "",
-                "openrouter": "",
-                "huggingface": "",
-                "mistral": "",
-                "gigachat": "",
-                "genapi": ""
-            },
+            "api_keys": {spec.key_name: "" for spec in PROVIDERS.values()},
             "telegram": {
                 "bot_token": "",
                 "chat_id": ""
             },
-            "last_directory": ""
+            "last_directory": "",
+            "models": {},
+            "inbox": {
+                "directory": "",
+                "workers": 2,
+                "poll_interval": 2,
+                "settle_seconds": 2
+            },
+            "rate_limits": {
+                "requests_per_minute": {},
+                "burst": 3,
+                "max_retries": 4,
+                "backoff_base": 1.0,
+                "backoff_max": 60
+            },
+            "circuit_breaker": {
+                "enabled": True,
+                "failure_threshold": 3,
+                "reset_timeout": 60,
+                "max_reset_timeout": 600
+            },
+            "model_fallback": {},
+            "batch_api": {
+                "max_requests": 10000,
+                "first_poll": 30,
+                "max_poll_interval": 600,
+                "max_wait_hours": 24
+            },
+            "genapi": {
+                "tasks_filename": "genapi_tasks.sqlite3",
+                "first_poll": 1,
+                "max_poll_interval": 10,
+                "max_wait": 300
+            },
+            "results": {
+                "enabled": True,
+                "filename": "preconcil_results.jsonl"
+            },
+            "history": {
+                "index_filename": ".preconcil_history.sqlite3",
+                "page_size": 200,
+                "preview_chunk_kb": 64
+            },
+            "log": {
+                "filename": "preconcil.log",
+                "max_size_kb": 1024,
+                "backups": 3,
+                "max_lines": 2000,
+                "flush_interval_ms": 100
+            },
+            "metrics": {
+                "enabled": True,
+                "filename": "metrics.sqlite3",
+                "prometheus_file": "metrics.prom",
+                "window": 1000,
+                "keep_days": 30,
+                "export_interval": 15
+            },
+            "model_catalog": {
+                "enabled": True,
+                "filename": "model_catalog.json",
+                "ttl_hours": 24,
+                "failure_ttl": 300,
+                "save_interval": 30
+            },
+            "connection_pool": {
+                "pool_connections": 4,
+                "pool_maxsize": 10
+            },
+            "chunking": {
+                "enabled": True,
+                "mode": "map_reduce",
+                "chars_per_token": 2.5,
+                "max_input_tokens": {},
+                "max_workers": 3,
+                "stream_threshold_kb": 256
+            },
+            "response_cache": {
+                "enabled": True,
+                "filename": ".preconcil_cache.sqlite3",
+                "ttl_hours": 168,
+                "max_size_mb": 100
+            },
+            "connectivity": {
+                "probe_host": "8.8.8.8",
+                "probe_port": 53,
+                "interval": 30,
+                "timeout": 3
+            },
+            "health_checks": {
+                "ttl": 300,
+                "refresh_interval": 240
+            },
+            "dispatch": {
+                "max_workers": 9,
+                "run_deadline": 360,
+                "coalesce_requests": True
+            }
         }
 
         if os.path.exists(self.config_file):
@@ -86,8 +2295,12 @@ class NeuralNetworkApp:
                     loaded_config = json.load(f)
                     # Обновляем только существующие ключи
                     for key in self.config:
-                        if key in loaded_config:
+                        if key not in loaded_config:
+                            continue
+                        if isinstance(self.config[key], dict):
                             self.config[key].update(loaded_config[key])
+                        else:
+                            self.config[key] = loaded_config[key]
             except:
                 pass
 
@@ -100,516 +2313,115 @@ class NeuralNetworkApp:
         except:
             return False
 
-    def setup_main_tab(self):
-        """Создание основной вкладки"""
-        self.main_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.main_tab, text="Основное")
+    def log_message(self, message):
+        """Вывод сообщения в консоль и журнал"""
+        self.write_log_file(message)
+        print(f"{datetime.now().strftime('%H:%M:%S')} - {message}", flush=True)
 
-        # Фрейм для выбора файла
-        file_frame = ttk.LabelFrame(self.main_tab, text="Выбор файла с вопросом", padding=10)
-        file_frame.pack(fill='x', padx=10, pady=5)
+    def write_log_file(self, message):
+        """Запись сообщения в журнал (потокобезопасно)"""
+        if self.file_logger is not None:
+            self.file_logger.info(message)
 
-        ttk.Label(file_frame, text="Файл с вопросом:").grid(row=0, column=0, sticky='w')
+    def get_api_key(self, network):
+        """API ключ нейросети из конфигурации"""
+        return self.config["api_keys"].get(PROVIDERS[network].key_name, "")
 
-        self.file_path_var = tk.StringVar()
-        self.file_entry = ttk.Entry(file_frame, textvariable=self.file_path_var, width=70)
-        self.file_entry.grid(row=1, column=0, padx=(0, 10))
+    def get_telegram_settings(self):
+        """Токен бота и Chat ID для отправки результатов в Telegram"""
+        return self.config["telegram"]["bot_token"], self.config["telegram"]["chat_id"]
 
-        ttk.Button(file_frame, text="Выбрать...", command=self.select_file).grid(row=1, column=1)
+    def on_stream_start(self, networks):
+        """Начало потокового вывода для перечисленных нейросетей"""
 
-        # Отображение базового имени файла
-        ttk.Label(file_frame, text="Имя файла для сохранения:").grid(row=2, column=0, sticky='w', pady=(10, 0))
-        self.filename_display_var = tk.StringVar()
-        ttk.Label(file_frame, textvariable=self.filename_display_var,
-                  font=('TkDefaultFont', 9, 'italic')).grid(row=3, column=0, columnspan=2, sticky='w')
+    def show_stream_text(self, network, text):
+        """Фрагмент потокового ответа (в консольном режиме не выводится)"""
 
-        # Фрейм для выбора директории сохранения
-        save_frame = ttk.LabelFrame(self.main_tab, text="Директория для сохранения ответов", padding=10)
-        save_frame.pack(fill='x', padx=10, pady=5)
+    def get_answer_numbers(self, directory):
+        """Занятые номера файлов ответов в папке: базовое имя -> множество номеров
 
-        ttk.Label(save_frame, text="Папка для сохранения:").grid(row=0, column=0, sticky='w')
+        Папка читается один раз и перечитывается, только когда меняется
+        время ее модификации.
+        """
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return {}
 
-        self.save_path_var = tk.StringVar()
-        self.save_entry = ttk.Entry(save_frame, textvariable=self.save_path_var, width=70)
-        self.save_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(save_frame, text="Выбрать...", command=self.select_save_directory).grid(row=1, column=1)
+        with self._answer_numbers_lock:
+            cached = self._answer_numbers.get(directory)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
 
-        # Предварительный просмотр имени файла для сохранения
-        ttk.Label(save_frame, text="Будет сохранен как:").grid(row=2, column=0, sticky='w', pady=(10, 0))
-        self.save_filename_var = tk.StringVar()
-        ttk.Label(save_frame, textvariable=self.save_filename_var,
-                  font=('TkDefaultFont', 9, 'italic'), foreground='blue').grid(row=3, column=0, columnspan=2,
-                                                                               sticky='w')
+        numbers = {}
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                match = ANSWER_NAME_PATTERN.match(entry.name)
+                if match:
+                    numbers.setdefault(match.group(1), set()).add(int(match.group(2) or 0))
 
-        # Фрейм для выбора нейросетей
-        networks_frame = ttk.LabelFrame(self.main_tab, text="Выбор нейросетей", padding=10)
-        networks_frame.pack(fill='x', padx=10, pady=5)
+        with self._answer_numbers_lock:
+            self._answer_numbers[directory] = (mtime, numbers)
+        return numbers
 
-        self.networks_vars = {
-            "OpenAI GPT": tk.BooleanVar(value=False),
-            "Anthropic Claude": tk.BooleanVar(value=False),
-            "DeepSeek": tk.BooleanVar(value=True),
-            "Groq": tk.BooleanVar(value=True),
-            "OpenRouter": tk.BooleanVar(value=True),
-            "Hugging Face": tk.BooleanVar(value=True),
-            "Mistral AI": tk.BooleanVar(value=True),
-            "GigaChat": tk.BooleanVar(value=True),
-            "GenAPI": tk.BooleanVar(value=True)
-        }
+    def generate_unique_filename(self, directory, base_name):
+        """Генерация уникального имени файла с суффиксами (1), (2) и т.д."""
+        used = self.get_answer_numbers(directory).get(base_name, ())
+        counter = 0
+        while counter in used:
+            counter += 1
+        return answer_filename(base_name, counter)
+
+    def create_answer_file(self, directory, base_name):
+        """Создание файла ответов с уникальным именем: (имя, открытый файл)
+
+        Файл создается в режиме 'x', поэтому параллельные обработчики
+        не перезапишут ответы друг друга: при совпадении берется следующий номер.
+        """
+        numbers = self.get_answer_numbers(directory)
+        with self._answer_numbers_lock:
+            used = set(numbers.get(base_name, ()))
+        counter = 0
+        while True:
+            while counter in used:
+                counter += 1
+            filename = answer_filename(base_name, counter)
+            try:
+                f = open(os.path.join(directory, filename), 'x', encoding='utf-8')
+            except FileExistsError:
+                used.add(counter)
+                continue
 
-        # Создаем 3 колонки для чекбоксов
-        row_counter = 0
-        col_counter = 0
-        self.network_checkbuttons = {}
+            with self._answer_numbers_lock:
+                cached = self._answer_numbers.get(directory)
+                if cached is not None:
+                    cached[1].setdefault(base_name, set()).add(counter)
+            return filename, f
 
-        for i, (name, var) in enumerate(self.networks_vars.items()):
-            cb = ttk.Checkbutton(networks_frame, text=name, variable=var)
-            cb.grid(row=row_counter, column=col_counter, sticky='w', padx=10, pady=2)
-            self.network_checkbuttons[name] = cb
+    def test_openai_connection(self, api_key):
+        """Тест соединения с OpenAI"""
+        if not api_key:
+            return False
 
-            col_counter += 1
-            if col_counter > 2:  # 3 колонки
-                col_counter = 0
-                row_counter += 1
+        try:
+            openai = self.load_sdk("openai")
+            openai.api_key = api_key
+            openai.Model.list()
+            return True
+        except:
+            return False
 
-        # Кнопки управления
-        button_frame = ttk.Frame(self.main_tab)
-        button_frame.pack(fill='x', padx=10, pady=20)
+    def test_anthropic_connection(self, api_key):
+        """Тест соединения с Anthropic"""
+        if not api_key:
+            return False
 
-        ttk.Button(button_frame, text="Проверить соединение",
-                   command=self.check_connections).pack(side='left', padx=5)
-        ttk.Button(button_frame, text="Отправить запрос", command=self.send_requests,
-                   style="Accent.TButton").pack(side='left', padx=5)
-        ttk.Button(button_frame, text="Сохранить конфигурацию",
-                   command=self.save_configuration).pack(side='left', padx=5)
-        ttk.Button(button_frame, text="Очистить лог",
-                   command=self.clear_log).pack(side='left', padx=5)
-
-        # Прогресс-бар и лог
-        self.progress = ttk.Progressbar(self.main_tab, mode='indeterminate')
-        self.progress.pack(fill='x', padx=10, pady=5)
-
-        log_frame = ttk.LabelFrame(self.main_tab, text="Лог выполнения", padding=10)
-        log_frame.pack(fill='both', expand=True, padx=10, pady=5)
-
-        self.log_text = tk.Text(log_frame, height=12, wrap='word')
-        scrollbar = ttk.Scrollbar(log_frame, command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=scrollbar.set)
-
-        self.log_text.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
-
-        # Привязываем события изменения
-        self.file_path_var.trace('w', self.update_filename_display)
-        self.save_path_var.trace('w', self.update_save_filename_display)
-
-    def setup_api_tab(self):
-        """Создание вкладки с настройками API"""
-        self.api_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.api_tab, text="Настройки API")
-
-        # OpenAI
-        openai_frame = ttk.LabelFrame(self.api_tab, text="OpenAI API", padding=10)
-        openai_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(openai_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.openai_key_var = tk.StringVar()
-        self.openai_entry = ttk.Entry(openai_frame, textvariable=self.openai_key_var, width=70, show="*")
-        self.openai_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(openai_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.openai_entry)).grid(row=1, column=1)
-
-        # Anthropic
-        anthropic_frame = ttk.LabelFrame(self.api_tab, text="Anthropic API", padding=10)
-        anthropic_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(anthropic_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.anthropic_key_var = tk.StringVar()
-        self.anthropic_entry = ttk.Entry(anthropic_frame, textvariable=self.anthropic_key_var, width=70, show="*")
-        self.anthropic_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(anthropic_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.anthropic_entry)).grid(row=1, column=1)
-
-        # DeepSeek
-        deepseek_frame = ttk.LabelFrame(self.api_tab, text="DeepSeek API", padding=10)
-        deepseek_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(deepseek_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.deepseek_key_var = tk.StringVar()
-        self.deepseek_entry = ttk.Entry(deepseek_frame, textvariable=self.deepseek_key_var, width=70, show="*")
-        self.deepseek_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(deepseek_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.deepseek_entry)).grid(row=1, column=1)
-
-        # Groq
-        groq_frame = ttk.LabelFrame(self.api_tab, text="Groq API", padding=10)
-        groq_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(groq_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.groq_key_var = tk.StringVar()
-        self.groq_entry = ttk.Entry(groq_frame, textvariable=self.groq_key_var, width=70, show="*")
-        self.groq_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(groq_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.groq_entry)).grid(row=1, column=1)
-
-        # OpenRouter
-        openrouter_frame = ttk.LabelFrame(self.api_tab, text="OpenRouter API", padding=10)
-        openrouter_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(openrouter_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.openrouter_key_var = tk.StringVar()
-        self.openrouter_entry = ttk.Entry(openrouter_frame, textvariable=self.openrouter_key_var, width=70, show="*")
-        self.openrouter_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(openrouter_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.openrouter_entry)).grid(row=1, column=1)
-
-        # Hugging Face
-        huggingface_frame = ttk.LabelFrame(self.api_tab, text="Hugging Face API", padding=10)
-        huggingface_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(huggingface_frame, text="API ключ (необязательно):").grid(row=0, column=0, sticky='w')
-        self.huggingface_key_var = tk.StringVar()
-        self.huggingface_entry = ttk.Entry(huggingface_frame, textvariable=self.huggingface_key_var, width=70, show="*")
-        self.huggingface_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(huggingface_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.huggingface_entry)).grid(row=1, column=1)
-
-        # Mistral AI
-        mistral_frame = ttk.LabelFrame(self.api_tab, text="Mistral AI API", padding=10)
-        mistral_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(mistral_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.mistral_key_var = tk.StringVar()
-        self.mistral_entry = ttk.Entry(mistral_frame, textvariable=self.mistral_key_var, width=70, show="*")
-        self.mistral_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(mistral_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.mistral_entry)).grid(row=1, column=1)
-        ttk.Label(mistral_frame, text="Документация: https://docs.mistral.ai/",
-                  font=('TkDefaultFont', 8, 'italic')).grid(row=2, column=0, columnspan=2, sticky='w', pady=(5, 0))
-
-        # GigaChat
-        gigachat_frame = ttk.LabelFrame(self.api_tab, text="GigaChat API (Sberbank)", padding=10)
-        gigachat_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(gigachat_frame, text="Ключ авторизации (Authorization):").grid(row=0, column=0, sticky='w')
-        self.gigachat_key_var = tk.StringVar()
-        self.gigachat_entry = ttk.Entry(gigachat_frame, textvariable=self.gigachat_key_var, width=70, show="*")
-        self.gigachat_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(gigachat_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.gigachat_entry)).grid(row=1, column=1)
-        ttk.Label(gigachat_frame, text="Требуется сертификат НУЦ Минцифры (см. install_gigachat_cert.bat)",
-                  font=('TkDefaultFont', 8, 'italic')).grid(row=2, column=0, columnspan=2, sticky='w', pady=(5, 0))
-
-        # GenAPI
-        genapi_frame = ttk.LabelFrame(self.api_tab, text="GenAPI", padding=10)
-        genapi_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(genapi_frame, text="API ключ:").grid(row=0, column=0, sticky='w')
-        self.genapi_key_var = tk.StringVar()
-        self.genapi_entry = ttk.Entry(genapi_frame, textvariable=self.genapi_key_var, width=70, show="*")
-        self.genapi_entry.grid(row=1, column=0, padx=(0, 10))
-        ttk.Button(genapi_frame, text="Показать",
-                   command=lambda: self.toggle_password(self.genapi_entry)).grid(row=1, column=1)
-        ttk.Label(genapi_frame, text="ID нейросети (по умолчанию: gpt-4o-mini):").grid(row=2, column=0, sticky='w',
-                                                                                       pady=(5, 0))
-        self.genapi_network_id_var = tk.StringVar(value="gpt-4o-mini")
-        ttk.Entry(genapi_frame, textvariable=self.genapi_network_id_var, width=70).grid(row=3, column=0, columnspan=2,
-                                                                                        sticky='w', pady=(2, 0))
-
-        # Telegram Bot
-        telegram_frame = ttk.LabelFrame(self.api_tab, text="Telegram Bot API", padding=10)
-        telegram_frame.pack(fill='x', padx=10, pady=5)
-
-        ttk.Label(telegram_frame, text="Токен бота:").grid(row=0, column=0, sticky='w')
-        self.telegram_token_var = tk.StringVar()
-        ttk.Entry(telegram_frame, textvariable=self.telegram_token_var, width=70).grid(row=1, column=0, columnspan=2,
-                                                                                       pady=(0, 10))
-
-        ttk.Label(telegram_frame, text="Chat ID:").grid(row=2, column=0, sticky='w')
-        self.telegram_chat_id_var = tk.StringVar()
-        ttk.Entry(telegram_frame, textvariable=self.telegram_chat_id_var, width=70).grid(row=3, column=0, columnspan=2)
-
-    def setup_status_tab(self):
-        """Создание вкладки со статусом соединения"""
-        self.status_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.status_tab, text="Статус соединения")
-
-        # Фрейм для статусов
-        status_frame = ttk.LabelFrame(self.status_tab, text="Статус подключения к API", padding=10)
-        status_frame.pack(fill='both', expand=True, padx=10, pady=10)
-
-        # Создаем виджеты для отображения статуса
-        self.status_labels = {}
-        self.status_text_vars = {}
-
-        networks = [
-            ("OpenAI GPT", self.openai_key_var),
-            ("Anthropic Claude", self.anthropic_key_var),
-            ("DeepSeek", self.deepseek_key_var),
-            ("Groq", self.groq_key_var),
-            ("OpenRouter", self.openrouter_key_var),
-            ("Hugging Face", self.huggingface_key_var),
-            ("Mistral AI", self.mistral_key_var),
-            ("GigaChat", self.gigachat_key_var),
-            ("GenAPI", self.genapi_key_var)
-        ]
-
-        for i, (name, key_var) in enumerate(networks):
-            # Фрейм для каждого сервиса
-            service_frame = ttk.Frame(status_frame)
-            service_frame.pack(fill='x', padx=10, pady=5)
-
-            # Название сервиса
-            ttk.Label(service_frame, text=f"{name}:", width=15, anchor='w').pack(side='left', padx=(0, 10))
-
-            # Индикатор статуса
-            status_canvas = tk.Canvas(service_frame, width=20, height=20, bg='white', highlightthickness=0)
-            status_canvas.pack(side='left', padx=(0, 10))
-            self.status_labels[name] = status_canvas
-
-            # Текст статуса
-            status_text_var = tk.StringVar(value="Не проверено")
-            self.status_text_vars[name] = status_text_var
-            ttk.Label(service_frame, textvariable=status_text_var, width=20, anchor='w').pack(side='left', padx=(0, 10))
-
-            # Кнопка проверки
-            ttk.Button(service_frame, text="Проверить", width=10,
-                       command=lambda n=name, k=key_var: self.check_single_connection(n, k.get())).pack(side='left')
-
-        # Кнопка проверки всех соединений
-        ttk.Button(status_frame, text="Проверить все соединения",
-                   command=self.check_all_connections, style="Accent.TButton").pack(pady=20)
-
-    def setup_history_tab(self):
-        """Создание вкладки с историей"""
-        self.history_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.history_tab, text="История")
-
-        # Панель управления историей
-        history_control = ttk.Frame(self.history_tab)
-        history_control.pack(fill='x', padx=10, pady=5)
-
-        ttk.Button(history_control, text="Обновить", command=self.load_history).pack(side='left', padx=5)
-        ttk.Button(history_control, text="Отправить в Telegram",
-                   command=self.send_selected_to_telegram).pack(side='left', padx=5)
-
-        # Список файлов
-        list_frame = ttk.Frame(self.history_tab)
-        list_frame.pack(fill='both', expand=True, padx=10, pady=5)
-
-        self.history_listbox = tk.Listbox(list_frame, selectmode='single')
-        scrollbar = ttk.Scrollbar(list_frame, command=self.history_listbox.yview)
-        self.history_listbox.configure(yscrollcommand=scrollbar.set)
-
-        self.history_listbox.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
-
-        # Просмотр содержимого
-        view_frame = ttk.LabelFrame(self.history_tab, text="Просмотр файла", padding=10)
-        view_frame.pack(fill='both', expand=True, padx=10, pady=5)
-
-        self.history_text = tk.Text(view_frame, wrap='word')
-        history_scrollbar = ttk.Scrollbar(view_frame, command=self.history_text.yview)
-        self.history_text.configure(yscrollcommand=history_scrollbar.set)
-
-        self.history_text.pack(side='left', fill='both', expand=True)
-        history_scrollbar.pack(side='right', fill='y')
-
-        # Привязываем событие выбора
-        self.history_listbox.bind('<<ListboxSelect>>', self.on_history_select)
-
-    def load_config_to_ui(self):
-        """Загрузка конфигурации в UI"""
-        self.openai_key_var.set(self.config["api_keys"]["openai"])
-        self.anthropic_key_var.set(self.config["api_keys"]["anthropic"])
-        self.deepseek_key_var.set(self.config["api_keys"]["deepseek"])
-        self.groq_key_var.set(self.config["api_keys"]["groq"])
-        self.openrouter_key_var.set(self.config["api_keys"]["openrouter"])
-        self.huggingface_key_var.set(self.config["api_keys"]["huggingface"])
-        self.mistral_key_var.set(self.config["api_keys"]["mistral"])
-        self.gigachat_key_var.set(self.config["api_keys"]["gigachat"])
-        self.genapi_key_var.set(self.config["api_keys"]["genapi"])
-
-        self.telegram_token_var.set(self.config["telegram"]["bot_token"])
-        self.telegram_chat_id_var.set(self.config["telegram"]["chat_id"])
-
-        if self.config["last_directory"]:
-            self.save_path_var.set(self.config["last_directory"])
-
-    def toggle_password(self, entry):
-        """Переключение видимости пароля"""
-        current_show = entry.cget('show')
-        entry.config(show='' if current_show == '*' else '*')
-
-    def update_filename_display(self, *args):
-        """Обновление отображения имени файла"""
-        filepath = self.file_path_var.get()
-        if filepath and os.path.exists(filepath):
-            filename = os.path.basename(filepath)
-            base_name = os.path.splitext(filename)[0]
-            self.filename_display_var.set(f"Базовое имя: {base_name}")
-            self.update_save_filename_display()
-        else:
-            self.filename_display_var.set("")
-
-    def update_save_filename_display(self, *args):
-        """Обновление отображения имени файла для сохранения"""
-        filepath = self.file_path_var.get()
-        save_dir = self.save_path_var.get()
-
-        if filepath and save_dir and os.path.exists(filepath):
-            filename = os.path.basename(filepath)
-            base_name = os.path.splitext(filename)[0]
-            save_name = self.generate_unique_filename(save_dir, base_name)
-            self.save_filename_var.set(save_name)
-        else:
-            self.save_filename_var.set("")
-
-    def generate_unique_filename(self, directory, base_name):
-        """Генерация уникального имени файла с суффиксами (1), (2) и т.д."""
-        suffix = "_answer"
-        counter = 1
-        filename = f"{base_name}{suffix}.txt"
-        filepath = os.path.join(directory, filename)
-
-        # Проверяем существование файлов и добавляем суффиксы
-        while os.path.exists(filepath):
-            if counter == 1:
-                filename = f"{base_name}{suffix} (1).txt"
-            else:
-                filename = f"{base_name}{suffix} ({counter}).txt"
-            filepath = os.path.join(directory, filename)
-            counter += 1
-
-        return filename
-
-    def select_file(self):
-        """Выбор файла с вопросом"""
-        filename = filedialog.askopenfilename(
-            title="Выберите файл с вопросом",
-            filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")]
-        )
-        if filename:
-            self.file_path_var.set(filename)
-
-    def select_save_directory(self):
-        """Выбор директории для сохранения"""
-        directory = filedialog.askdirectory(title="Выберите папку для сохранения")
-        if directory:
-            self.save_path_var.set(directory)
-            self.config["last_directory"] = directory
-            self.save_config()
-
-    def check_all_connections_background(self):
-        """Фоновая проверка всех соединений"""
-        thread = threading.Thread(target=self._check_all_connections_thread, daemon=True)
-        thread.start()
-
-    def _check_all_connections_thread(self):
-        """Поток для проверки всех соединений"""
-        networks_to_check = []
-
-        if self.openai_key_var.get():
-            networks_to_check.append(("OpenAI GPT", self.openai_key_var.get()))
-        if self.anthropic_key_var.get():
-            networks_to_check.append(("Anthropic Claude", self.anthropic_key_var.get()))
-        if self.deepseek_key_var.get():
-            networks_to_check.append(("DeepSeek", self.deepseek_key_var.get()))
-        if self.groq_key_var.get():
-            networks_to_check.append(("Groq", self.groq_key_var.get()))
-        if self.openrouter_key_var.get():
-            networks_to_check.append(("OpenRouter", self.openrouter_key_var.get()))
-        if self.huggingface_key_var.get():
-            networks_to_check.append(("Hugging Face", self.huggingface_key_var.get()))
-        if self.mistral_key_var.get():
-            networks_to_check.append(("Mistral AI", self.mistral_key_var.get()))
-        if self.gigachat_key_var.get():
-            networks_to_check.append(("GigaChat", self.gigachat_key_var.get()))
-        if self.genapi_key_var.get():
-            networks_to_check.append(("GenAPI", self.genapi_key_var.get()))
-
-        for name, key in networks_to_check:
-            self.check_single_connection(name, key)
-            time.sleep(1)
-
-    def check_single_connection(self, network_name, api_key):
-        """Проверка соединения с одной нейросетью"""
-        try:
-            if network_name == "OpenAI GPT":
-                status = self.test_openai_connection(api_key)
-            elif network_name == "Anthropic Claude":
-                status = self.test_anthropic_connection(api_key)
-            elif network_name == "DeepSeek":
-                status = self.test_deepseek_connection(api_key)
-            elif network_name == "Groq":
-                status = self.test_groq_connection(api_key)
-            elif network_name == "OpenRouter":
-                status = self.test_openrouter_connection(api_key)
-            elif network_name == "Hugging Face":
-                status = self.test_huggingface_connection(api_key)
-            elif network_name == "Mistral AI":
-                status = self.test_mistral_connection(api_key)
-            elif network_name == "GigaChat":
-                status = self.test_gigachat_connection(api_key)
-            elif network_name == "GenAPI":
-                status = self.test_genapi_connection(api_key)
-            else:
-                status = False
-
-            self.connection_status[network_name] = status
-            self.update_status_indicator(network_name, status)
-
-            if not status and api_key:
-                self.log_message(f"⚠️ Не удалось подключиться к {network_name}")
-
-            return status
-
-        except Exception as e:
-            self.connection_status[network_name] = False
-            self.update_status_indicator(network_name, False)
-            self.log_message(f"❌ Ошибка проверки {network_name}: {str(e)}")
-            return False
-
-    def update_status_indicator(self, network_name, status):
-        """Обновление индикатора статуса"""
-        if network_name in self.status_labels:
-            canvas = self.status_labels[network_name]
-            canvas.delete("all")
-
-            if status:
-                # Зеленый кружок
-                canvas.create_oval(2, 2, 18, 18, fill="green", outline="")
-                canvas.create_text(10, 10, text="✓", fill="white", font=('Arial', 10, 'bold'))
-                self.status_text_vars[network_name].set("Подключено ✓")
-            else:
-                # Красный кружок
-                canvas.create_oval(2, 2, 18, 18, fill="red", outline="")
-                canvas.create_text(10, 10, text="✗", fill="white", font=('Arial', 10, 'bold'))
-                self.status_text_vars[network_name].set("Ошибка ✗")
-
-    def test_openai_connection(self, api_key):
-        """Тест соединения с OpenAI"""
-        if not api_key:
-            return False
-
-        try:
-            openai.api_key = api_key
-            openai.Model.list()
-            return True
-        except:
-            return False
-
-    def test_anthropic_connection(self, api_key):
-        """Тест соединения с Anthropic"""
-        if not api_key:
-            return False
-
-        try:
-            client = Anthropic(api_key=api_key)
-            client.models.list()
-            return True
-        except:
-            return False
+        try:
+            client = self.get_client("Anthropic Claude", api_key)
+            client.models.list()
+            return True
+        except:
+            return False
 
     def test_deepseek_connection(self, api_key):
         """Тест соединения с DeepSeek"""
@@ -617,10 +2429,7 @@ class NeuralNetworkApp:
             return False
 
         try:
-            client = DeepSeekClient(
-                api_key=api_key,
-                base_url="https://api.deepseek.com"
-            )
+            client = self.get_client("DeepSeek", api_key)
             client.models.list()
             return True
         except:
@@ -634,7 +2443,7 @@ class NeuralNetworkApp:
         try:
             url = "https://api.groq.com/openai/v1/models"
             headers = {"Authorization": f"Bearer {api_key}"}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.get_session("Groq", api_key).get(url, headers=headers, timeout=10)
             return response.status_code == 200
         except:
             return False
@@ -647,7 +2456,7 @@ class NeuralNetworkApp:
         try:
             url = "https://openrouter.ai/api/v1/models"
             headers = {"Authorization": f"Bearer {api_key}"}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.get_session("OpenRouter", api_key).get(url, headers=headers, timeout=10)
             return response.status_code == 200
         except:
             return False
@@ -657,7 +2466,7 @@ class NeuralNetworkApp:
         try:
             url = "https://api-inference.huggingface.co/models/facebook/bart-large-mnli"
             headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.get_session("Hugging Face", api_key).get(url, headers=headers, timeout=10)
             return response.status_code in [200, 503]
         except:
             return False
@@ -668,7 +2477,7 @@ class NeuralNetworkApp:
             return False
 
         try:
-            client = MistralClient(api_key=api_key)
+            client = self.get_client("Mistral AI", api_key)
             models_response = client.models.list()
             return hasattr(models_response, 'data') and len(models_response.data) > 0
         except Exception as e:
@@ -681,11 +2490,10 @@ class NeuralNetworkApp:
             return False
 
         try:
-            # Пробуем получить токен доступа
-            # Для теста используем verify_ssl_certs=False
-            with GigaChat(credentials=api_key, verify_ssl_certs=False, scope="GIGACHAT_API_PERS") as giga:
-                models = giga.get_models()
-                return True
+            # Пробуем получить токен доступа (клиент из пула хранит его до истечения)
+            giga = self.get_client("GigaChat", api_key)
+            giga.get_models()
+            return True
         except Exception as e:
             self.log_message(f"Ошибка GigaChat: {str(e)}")
             return False
@@ -698,7 +2506,7 @@ class NeuralNetworkApp:
         try:
             url = "https://api.gen-api.ru/api/v1/user"
             headers = {"Authorization": f"Bearer {api_key}"}
-            response = requests.get(url, headers=headers, timeout=15)
+            response = self.get_session("GenAPI", api_key).get(url, headers=headers, timeout=15)
             if response.status_code == 200:
                 data = response.json()
                 return 'balance' in data
@@ -707,145 +2515,561 @@ class NeuralNetworkApp:
             self.log_message(f"Ошибка проверки GenAPI: {e}")
             return False
 
-    def check_connections(self):
-        """Проверка всех соединений"""
-        self.log_message("Проверяем соединения...")
-        thread = threading.Thread(target=self._check_all_connections_thread, daemon=True)
-        thread.start()
-
-    def check_all_connections(self):
-        """Проверка всех соединений с уведомлением"""
-        self.log_message("Начинаем проверку всех соединений...")
-
-        failed_connections = []
-        successful_connections = []
+    def load_sdk(self, module_name):
+        """Ленивый импорт SDK нейросети при первом обращении к ней"""
+        module = self._sdk_modules.get(module_name)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(module_name)
+            self._sdk_modules[module_name] = module
+            self.log_message(f"⏱ SDK {module_name} загружен за {time.perf_counter() - started:.2f} с")
+        return module
+
+    def get_session(self, network, api_key):
+        """Keep-alive сессия HTTP из пула соединений"""
+        return self.connection_pool.get_session(network, api_key)
+
+    def get_client(self, network, api_key):
+        """Клиент SDK нейросети из пула соединений"""
+        factory = PROVIDERS[network].get_client_factory(self)
+        return self.connection_pool.get_client(network, api_key, lambda: factory(api_key))
+
+    def get_rate_limiter(self, network, api_key):
+        """Ограничитель частоты запросов для нейросети и ключа"""
+        key = (network, api_key)
+        with self._rate_limiters_lock:
+            limiter = self._rate_limiters.get(key)
+            if limiter is None:
+                limits = self.config["rate_limits"]
+                spec = PROVIDERS[network]
+                limiter = RateLimiter(
+                    requests_per_minute=limits["requests_per_minute"].get(spec.key_name, spec.requests_per_minute),
+                    burst=limits["burst"],
+                    backoff_base=limits["backoff_base"],
+                    backoff_max=limits["backoff_max"]
+                )
+                self._rate_limiters[key] = limiter
+            return limiter
+
+    def get_circuit_breaker(self, network, api_key):
+        """Выключатель запросов для нейросети и ключа (None, если отключен в настройках)"""
+        breaker_config = self.config["circuit_breaker"]
+        if not breaker_config["enabled"]:
+            return None
+        key = (network, api_key)
+        with self._circuit_breakers_lock:
+            breaker = self._circuit_breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=breaker_config["failure_threshold"],
+                    reset_timeout=breaker_config["reset_timeout"],
+                    max_reset_timeout=breaker_config["max_reset_timeout"],
+                    on_change=lambda state, n=network, k=api_key: self.on_circuit_change(n, k, state)
+                )
+                self._circuit_breakers[key] = breaker
+            return breaker
+
+    def is_circuit_open(self, network, api_key):
+        """Запросы к нейросети приостановлены после серии ошибок"""
+        breaker = self.get_circuit_breaker(network, api_key)
+        return breaker is not None and breaker.state == CircuitBreaker.OPEN
+
+    def on_circuit_change(self, network, api_key, state):
+        """Смена состояния выключателя (вызывается из рабочего потока)"""
+        if state == CircuitBreaker.OPEN:
+            breaker = self.get_circuit_breaker(network, api_key)
+            self.log_message(f"⛔ {network}: {breaker.failures} ошибок подряд, запросы приостановлены "
+                             f"на {breaker.open_for:.0f} с")
+        elif state == CircuitBreaker.HALF_OPEN:
+            self.log_message(f"🔄 {network}: пробный запрос после паузы")
+        else:
+            self.log_message(f"✅ {network}: запросы возобновлены")
+
+    def send_http(self, network, api_key, method, url, **kwargs):
+        """HTTP-запрос к нейросети через пул соединений с учетом лимитов частоты
+
+        Ответ 429 и сетевые ошибки (в том числе таймаут соединения) не
+        возвращаются сразу: запрос повторяется (до max_retries раз) после
+        паузы, которую задает ограничитель. Таймаут чтения ответа не
+        повторяется: сервер мог уже принять запрос (задачу, пакет).
+        """
+        limiter = self.get_rate_limiter(network, api_key)
+        session = self.get_session(network, api_key)
+        max_retries = self.config["rate_limits"]["max_retries"]
+        info = self.call_info()
+
+        for attempt in range(max_retries + 1):
+            if attempt:
+                info["retries"] = info.get("retries", 0) + 1
+            limiter.acquire()
+            take_connect_time()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if attempt == max_retries:
+                    raise
+                delay = limiter.backoff()
+                self.log_message(f"⏳ {network}: сетевая ошибка, повтор через {delay:.1f} с")
+                continue
+            finally:
+                info["connect"] = round(info.get("connect", 0) + take_connect_time(), 4)
+
+            info["ttfb"] = round(response.elapsed.total_seconds(), 4)
+            delay = limiter.update(response.status_code, response.headers)
+            if response.status_code != 429 or attempt == max_retries:
+                return response
+            response.close()
+            self.log_message(f"⏳ {network}: превышен лимит запросов, повтор через {delay:.1f} с")
+
+    def call_with_rate_limit(self, network, api_key, func, *args, **kwargs):
+        """Вызов SDK нейросети с учетом лимитов частоты и повтором после 429"""
+        limiter = self.get_rate_limiter(network, api_key)
+        max_retries = self.config["rate_limits"]["max_retries"]
+        info = self.call_info()
+
+        for attempt in range(max_retries + 1):
+            if attempt:
+                info["retries"] = info.get("retries", 0) + 1
+            limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if attempt == max_retries or not is_rate_limit_error(e):
+                    raise
+                response = getattr(e, "response", None)
+                delay = limiter.update(429, getattr(response, "headers", None))
+                self.log_message(f"⏳ {network}: превышен лимит запросов, повтор через {delay:.1f} с")
+                continue
+            limiter.update(200)
+            return result
+
+    def create_anthropic_client(self, api_key):
+        """Создание клиента Anthropic"""
+        return self.load_sdk("anthropic").Anthropic(api_key=api_key)
+
+    def create_deepseek_client(self, api_key):
+        """Создание клиента DeepSeek (OpenAI-совместимый API)"""
+        return self.load_sdk("openai").OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+
+    def create_mistral_client(self, api_key):
+        """Создание клиента Mistral AI"""
+        return self.load_sdk("mistralai").Mistral(api_key=api_key)
+
+    def create_gigachat_client(self, api_key):
+        """Создание клиента GigaChat (для теста используем verify_ssl_certs=False)"""
+        return self.load_sdk("gigachat").GigaChat(credentials=api_key, verify_ssl_certs=False,
+                                                  scope="GIGACHAT_API_PERS")
+
+    def get_model(self, network):
+        """Модель нейросети: из конфигурации, если задана, иначе по умолчанию"""
+        spec = PROVIDERS[network]
+        return self.config["models"].get(spec.key_name) or spec.default_model
+
+    def list_groq_models(self, api_key):
+        """Модели, доступные по ключу Groq"""
+        url = "https://api.groq.com/openai/v1/models"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        response = self.send_http("Groq", api_key, "GET", url, headers=headers, timeout=10)
+        response.raise_for_status()
+        return [model["id"] for model in response.json()["data"]]
+
+    def list_openrouter_models(self, api_key):
+        """Модели, доступные в OpenRouter"""
+        url = "https://openrouter.ai/api/v1/models"
+        response = self.send_http("OpenRouter", api_key, "GET", url, timeout=10)
+        response.raise_for_status()
+        return [model["id"] for model in response.json()["data"]]
+
+    def list_huggingface_models(self, api_key):
+        """Резервные модели Hugging Face, которые еще существуют на хабе"""
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        available = []
+        for model in PROVIDERS["Hugging Face"].fallback_models:
+            url = f"https://huggingface.co/api/models/{model}"
+            response = self.send_http("Hugging Face", api_key, "GET", url, headers=headers, timeout=10)
+            if response.status_code == 200:
+                available.append(model)
+            elif response.status_code not in (401, 404):
+                response.raise_for_status()
+        return available
+
+    def refresh_model_catalog(self, network, api_key):
+        """Запрос списка моделей нейросети в каталог (без повторных параллельных запросов)"""
+        with self._catalog_lock:
+            if network in self._catalog_refreshing:
+                return
+            self._catalog_refreshing.add(network)
+        try:
+            models = PROVIDERS[network].get_model_lister(self)(api_key)
+            self.model_catalog.set_models(network, models)
+        except Exception as e:
+            self.model_catalog.set_failed(network)
+            self.log_message(f"⚠️ {network}: не удалось обновить список моделей: {str(e)}")
+        finally:
+            with self._catalog_lock:
+                self._catalog_refreshing.discard(network)
+
+    def get_fallback_models(self, network, api_key):
+        """Резервные модели нейросети в порядке перебора
+
+        Модели, которых нет в каталоге нейросети, пропускаются, а остальные
+        упорядочиваются по недавним успехам и задержкам. Отсутствующий или
+        устаревший каталог запрашивается в фоне, а запрос пока идет по
+        известному списку моделей. После неудачного запроса списка он не
+        повторяется failure_ttl секунд.
+        """
+        spec = PROVIDERS[network]
+        if not self.config["model_catalog"]["enabled"]:
+            return spec.fallback_models
+
+        if spec.list_models and not self.model_catalog.recently_failed(network):
+            _, fresh = self.model_catalog.get_models(network)
+            with self._catalog_lock:
+                refreshing = network in self._catalog_refreshing
+            if not fresh and not refreshing:
+                threading.Thread(target=self.refresh_model_catalog, args=(network, api_key),
+                                 daemon=True).start()
+
+        return self.model_catalog.order(network, spec.fallback_models)
+
+    def get_hedge_delay(self, network):
+        """Задержка опережающего запуска следующей модели (None - перебор по очереди)
+
+        В config.json: "model_fallback": {"groq": {"strategy": "sequential"}} или
+        {"groq": {"strategy": "hedge", "hedge_delay": 2}}.
+        """
+        spec = PROVIDERS[network]
+        settings = self.config["model_fallback"].get(spec.key_name, {})
+        if settings.get("strategy") == "sequential":
+            return None
+        return settings.get("hedge_delay", spec.hedge_delay)
+
+    def race_models(self, network, api_key, attempt):
+        """Перебор резервных моделей нейросети по ее стратегии (см. ModelRace)"""
+        info = self.call_info()
+
+        def timed_attempt(model, race):
+            # Сведения попытки переносятся в сведения запроса, только если она победила
+            attempt_info = {}
+            self._call_local.info = attempt_info
+            started = time.monotonic()
+            status, value = attempt(model, race)
+            if status == "ok":
+                info.update(attempt_info)
+                info["model"] = model
+                self.model_catalog.record(network, model, True, time.monotonic() - started)
+            elif status == "next" and value:
+                self.model_catalog.record(network, model, False)
+            return status, value
+
+        race = ModelRace(self.get_fallback_models(network, api_key), self.get_hedge_delay(network))
+        return race.run(timed_attempt)
+
+    def build_messages(self, network, question):
+        """Сообщения чата: системный промпт нейросети (если есть) и вопрос"""
+        system_prompt = PROVIDERS[network].system_prompt
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        messages.append({"role": "user", "content": question})
+        return messages
+
+    def request_params(self, network):
+        """Параметры запроса, от которых зависит ответ (для ключа кэша)"""
+        spec = PROVIDERS[network]
+        models = spec.fallback_models if len(spec.fallback_models) > 1 else [self.get_model(network)]
+        return {
+            "models": models,
+            "system_prompt": spec.system_prompt,
+            "temperature": spec.temperature,
+            "max_tokens": spec.max_tokens
+        }
 
-        if self.openai_key_var.get():
-            if self.check_single_connection("OpenAI GPT", self.openai_key_var.get()):
-                successful_connections.append("OpenAI GPT")
-            else:
-                failed_connections.append("OpenAI GPT")
+    def get_response_cache(self, save_dir):
+        """Кэш ответов рядом с папкой сохранения (None, если кэш отключен)"""
+        cache_config = self.config["response_cache"]
+        if not cache_config["enabled"]:
+            return None
+        with self._response_caches_lock:
+            cache = self._response_caches.get(save_dir)
+            if cache is None:
+                try:
+                    cache = ResponseCache(os.path.join(save_dir, cache_config["filename"]),
+                                          ttl=cache_config["ttl_hours"] * 3600,
+                                          max_size=cache_config["max_size_mb"] * 1024 * 1024)
+                except sqlite3.Error as e:
+                    self.log_message(f"⚠️ Кэш ответов недоступен: {str(e)}")
+                    return None
+                self._response_caches[save_dir] = cache
+            return cache
+
+    def get_history_index(self, save_dir):
+        """Индекс истории ответов в папке сохранения (None, если индекс недоступен)"""
+        with self._history_indexes_lock:
+            index = self._history_indexes.get(save_dir)
+            if index is None:
+                try:
+                    index = HistoryIndex(save_dir, self.config["history"]["index_filename"])
+                except sqlite3.Error as e:
+                    self.log_message(f"⚠️ Индекс истории недоступен: {str(e)}")
+                    return None
+                self._history_indexes[save_dir] = index
+            return index
+
+    def get_results_store(self, save_dir):
+        """Файл структурированных результатов в папке сохранения (None, если отключен)"""
+        results_config = self.config["results"]
+        if not results_config["enabled"]:
+            return None
+        with self._results_stores_lock:
+            store = self._results_stores.get(save_dir)
+            if store is None:
+                store = ResultsStore(os.path.join(save_dir, results_config["filename"]))
+                self._results_stores[save_dir] = store
+            return store
+
+    def call_info(self):
+        """Сведения о текущем запросе к нейросети (модель и т.п.), заполняемые обработчиком запроса"""
+        info = getattr(self._call_local, "info", None)
+        return info if info is not None else {}
+
+    def record_usage(self, usage):
+        """Учет токенов из ответа нейросети в сведениях о текущем запросе"""
+        prompt, completion = read_token_usage(usage)
+        info = self.call_info()
+        if prompt is not None:
+            info["prompt_tokens"] = prompt
+        if completion is not None:
+            info["completion_tokens"] = completion
+
+    def record_metrics(self, network, kind, status, info):
+        """Запись метрики вызова; файл для Prometheus обновляется позже в фоне"""
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.record(network, kind, status, info)
+        except sqlite3.Error as e:
+            self.log_message(f"⚠️ Не удалось записать метрики: {str(e)}")
+            return
+        self.schedule_metrics_export()
 
-        if self.anthropic_key_var.get():
-            if self.check_single_connection("Anthropic Claude", self.anthropic_key_var.get()):
-                successful_connections.append("Anthropic Claude")
-            else:
-                failed_connections.append("Anthropic Claude")
-
-        if self.deepseek_key_var.get():
-            if self.check_single_connection("DeepSeek", self.deepseek_key_var.get()):
-                successful_connections.append("DeepSeek")
-            else:
-                failed_connections.append("DeepSeek")
-
-        if self.groq_key_var.get():
-            if self.check_single_connection("Groq", self.groq_key_var.get()):
-                successful_connections.append("Groq")
-            else:
-                failed_connections.append("Groq")
-
-        if self.openrouter_key_var.get():
-            if self.check_single_connection("OpenRouter", self.openrouter_key_var.get()):
-                successful_connections.append("OpenRouter")
-            else:
-                failed_connections.append("OpenRouter")
-
-        if self.huggingface_key_var.get():
-            if self.check_single_connection("Hugging Face", self.huggingface_key_var.get()):
-                successful_connections.append("Hugging Face")
-            else:
-                failed_connections.append("Hugging Face")
-
-        if self.mistral_key_var.get():
-            if self.check_single_connection("Mistral AI", self.mistral_key_var.get()):
-                successful_connections.append("Mistral AI")
-            else:
-                failed_connections.append("Mistral AI")
-
-        if self.gigachat_key_var.get():
-            if self.check_single_connection("GigaChat", self.gigachat_key_var.get()):
-                successful_connections.append("GigaChat")
-            else:
-                failed_connections.append("GigaChat")
-
-        if self.genapi_key_var.get():
-            if self.check_single_connection("GenAPI", self.genapi_key_var.get()):
-                successful_connections.append("GenAPI")
-            else:
-                failed_connections.append("GenAPI")
-
-        self.show_connection_results(successful_connections, failed_connections)
-
-    def show_connection_results(self, successful, failed):
-        """Показ результатов проверки соединений"""
-        message = "Результаты проверки соединений:\n\n"
-
-        if successful:
-            message += "✅ Успешные подключения:\n"
-            for service in successful:
-                message += f"   • {service}\n"
-            message += "\n"
-
-        if failed:
-            message += "❌ Не удалось подключиться:\n"
-            for service in failed:
-                message += f"   • {service}\n"
-
-        if not successful and not failed:
-            message += "ℹ️ Нет сервисов для проверки. Введите API ключи."
-
-        messagebox.showinfo("Результаты проверки", message)
-
-    def log_message(self, message):
-        """Добавление сообщения в лог"""
-        self.log_text.insert('end', f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
-        self.log_text.see('end')
-        self.root.update_idletasks()
-
-    def clear_log(self):
-        """Очистка лога"""
-        self.log_text.delete(1.0, 'end')
-
-    def save_configuration(self):
-        """Сохранение конфигурации"""
-        self.config["api_keys"]["openai"] = self.openai_key_var.get()
-        self.config["api_keys"]["anthropic"] = self.anthropic_key_var.get()
-        self.config["api_keys"]["deepseek"] = self.deepseek_key_var.get()
-        self.config["api_keys"]["groq"] = self.groq_key_var.get()
-        self.config["api_keys"]["openrouter"] = self.openrouter_key_var.get()
-        self.config["api_keys"]["huggingface"] = self.huggingface_key_var.get()
-        self.config["api_keys"]["mistral"] = self.mistral_key_var.get()
-        self.config["api_keys"]["gigachat"] = self.gigachat_key_var.get()
-        self.config["api_keys"]["genapi"] = self.genapi_key_var.get()
-
-        self.config["telegram"]["bot_token"] = self.telegram_token_var.get()
-        self.config["telegram"]["chat_id"] = self.telegram_chat_id_var.get()
-
-        if self.save_config():
-            self.log_message("Конфигурация сохранена")
-            messagebox.showinfo("Успех", "Конфигурация успешно сохранена!")
-        else:
-            messagebox.showerror("Ошибка", "Не удалось сохранить конфигурацию")
+    def schedule_metrics_export(self):
+        """Обновление файла для Prometheus не чаще раза в export_interval секунд"""
+        with self._metrics_export_lock:
+            if self._metrics_export_timer is not None:
+                return
+            self._metrics_export_timer = threading.Timer(self.config["metrics"]["export_interval"],
+                                                         self.export_metrics)
+            self._metrics_export_timer.daemon = True
+            self._metrics_export_timer.start()
+
+    def export_metrics(self):
+        """Запись сводки метрик в файл для Prometheus (отложенная запись отменяется)"""
+        with self._metrics_export_lock:
+            timer, self._metrics_export_timer = self._metrics_export_timer, None
+        if timer is not None:
+            timer.cancel()
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.write_prometheus(self.metrics_export_path)
+        except (sqlite3.Error, OSError) as e:
+            self.log_message(f"⚠️ Не удалось записать метрики: {str(e)}")
+
+    def run_health_check(self, network, api_key):
+        """Проверка соединения с нейросетью с записью в метрики"""
+        take_connect_time()
+        started = time.perf_counter()
+        status = False
+        try:
+            status = PROVIDERS[network].get_health_check(self)(api_key)
+            return status
+        finally:
+            if api_key or not PROVIDERS[network].key_required:
+                self.record_metrics(network, "health", "ok" if status else "error", {
+                    "latency": round(time.perf_counter() - started, 4),
+                    "connect": round(take_connect_time(), 4)
+                })
+
+    def on_health_result(self, network, api_key, status):
+        """Результат проверки соединения (вызывается из потока проверки)"""
+        if not status and api_key:
+            self.log_message(f"⚠️ Не удалось подключиться к {network}")
+        if status:
+            breaker = self.get_circuit_breaker(network, api_key)
+            if breaker is not None:
+                breaker.probe_succeeded()
 
     def read_question_file(self, filepath):
-        """Чтение вопроса из файла"""
+        """Чтение вопроса из файла (большой файл не читается целиком, см. QuestionFile)"""
         try:
+            chunking = self.config["chunking"]
+            if chunking["enabled"] and os.path.getsize(filepath) > chunking["stream_threshold_kb"] * 1024:
+                return QuestionFile(filepath)
             with open(filepath, 'r', encoding='utf-8') as f:
                 return f.read().strip()
         except Exception as e:
             self.log_message(f"Ошибка чтения файла: {str(e)}")
             return None
 
-    def check_internet_connection(self):
-        """Проверка интернет-соединения"""
-        try:
-            socket.create_connection(("8.8.8.8", 53), timeout=3)
-            return True
-        except OSError:
+    def question_key(self, question):
+        """Текст вопроса для ключей кэша и объединения запросов (для большого файла - его хэш)"""
+        return question.key_text if isinstance(question, QuestionFile) else question
+
+    def get_chunk_size(self, network):
+        """Наибольшая длина части вопроса в символах по оценке числа токенов для нейросети"""
+        chunking = self.config["chunking"]
+        spec = PROVIDERS[network]
+        tokens = chunking["max_input_tokens"].get(spec.key_name, spec.context_tokens)
+        reserve = len(spec.system_prompt or "") + max(len(CHUNK_MAP_PROMPT), len(CHUNK_REFINE_PROMPT)) + 100
+        return max(500, int(tokens * chunking["chars_per_token"]) - reserve)
+
+    def needs_chunking(self, network, question):
+        """Вопрос не помещается в один запрос к нейросети"""
+        if not self.config["chunking"]["enabled"]:
             return False
+        return isinstance(question, QuestionFile) or len(question) > self.get_chunk_size(network)
+
+    def chunk_rounds(self, network, question):
+        """Оценка числа последовательных запросов при отправке вопроса частями"""
+        if not self.needs_chunking(network, question):
+            return 1
+        parts = math.ceil(question_size(question) / self.get_chunk_size(network))
+        if self.config["chunking"]["mode"] == "sequential":
+            return math.ceil(parts * 1.5) + 1
+        workers = max(1, self.config["chunking"]["max_workers"])
+        return math.ceil(parts / workers) + math.ceil(math.log(max(parts, 2), 2)) + 1
+
+    def query_chunked(self, network, question, api_key, on_delta=None, slots=None):
+        """Ответ на вопрос, не помещающийся в контекст нейросети, по частям
+
+        Вопрос делится на части по оценке числа токенов (файл читается
+        потоком). В режиме map_reduce части отправляются параллельно (не
+        больше max_workers запросов одновременно), а заметки по ним сводятся
+        в итоговый ответ; в режиме sequential заметки дополняются частями по
+        очереди. Потоковый вывод (on_delta) - только для итогового ответа.
+
+        slots - общий семафор запросов (см. process_question): место
+        вызывающего запроса отдается на время отправки частей, и каждый
+        запрос части занимает свое. Повторы, токены и модель запросов частей
+        учитываются в сведениях вызывающего запроса.
+        """
+        if slots is None:
+            return self._query_chunks(network, question, api_key, on_delta, contextlib.nullcontext())
+        slots.release()
+        try:
+            return self._query_chunks(network, question, api_key, on_delta, slots)
+        finally:
+            slots.acquire()
+
+    def _query_chunks(self, network, question, api_key, on_delta, budget):
+        chunking = self.config["chunking"]
+        spec = PROVIDERS[network]
+        handler = spec.get_query_handler(self)
+        workers = max(1, chunking["max_workers"])
+        max_chars = self.get_chunk_size(network)
+        info = self.call_info()
+        info_lock = threading.Lock()
+
+        def ask(prompt, stream=False):
+            # Запросы частей идут и из потоков пула: сведения собираются отдельно и суммируются
+            chunk_info = {}
+            previous = getattr(self._call_local, "info", None)
+            self._call_local.info = chunk_info
+            try:
+                with budget:
+                    if stream and on_delta and spec.streaming:
+                        return handler(prompt, api_key, on_delta=on_delta)
+                    return handler(prompt, api_key)
+            finally:
+                self._call_local.info = previous
+                with info_lock:
+                    for field in ("retries", "prompt_tokens", "completion_tokens"):
+                        if field in chunk_info:
+                            info[field] = info.get(field, 0) + chunk_info[field]
+                    if chunk_info.get("model"):
+                        info["model"] = chunk_info["model"]
+
+        sequential = chunking["mode"] == "sequential"
+        # В последовательном режиме в запросе остается место для заметок
+        chunks = question_chunks(question, max_chars * 2 // 3 if sequential else max_chars)
+        first = next(chunks, None)
+        second = next(chunks, None)
+        if first is None:
+            return f"Ошибка {network}: пустой вопрос"
+        if second is None:
+            return ask(first, stream=True)
+        chunks = itertools.chain([first, second], chunks)
+
+        self.log_message(f"✂️ {network}: вопрос больше контекста (~{max_chars / chunking['chars_per_token']:.0f} "
+                         f"токенов), отправляем частями")
+        notes = []
+        if sequential:
+            for number, chunk in enumerate(chunks, 1):
+                prompt = (CHUNK_MAP_PROMPT.format(number=number, text=chunk) if not notes else
+                          CHUNK_REFINE_PROMPT.format(number=number, notes=notes[0], text=chunk))
+                response = ask(prompt)
+                if is_failure_response(response):
+                    return f"{response or f'Ошибка {network}: пустой ответ'} (часть {number})"
+                notes = [response]
+            parts = number
+        else:
+            results = {}
+            errors = []
+            room = threading.Semaphore(workers)
+
+            def map_chunk(number, chunk):
+                try:
+                    response = ask(CHUNK_MAP_PROMPT.format(number=number, text=chunk))
+                    if is_failure_response(response):
+                        errors.append(f"{response or f'Ошибка {network}: пустой ответ'} (часть {number})")
+                    else:
+                        results[number] = response
+                except Exception as e:
+                    errors.append(f"Ошибка {network}: {str(e)} (часть {number})")
+                finally:
+                    room.release()
+
+            # Следующая часть читается, только когда освободилось место (память не растет)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                parts = 0
+                for number, chunk in enumerate(chunks, 1):
+                    room.acquire()
+                    if errors:
+                        room.release()
+                        break
+                    parts = number
+                    executor.submit(map_chunk, number, chunk)
+            if errors:
+                return errors[0]
+            notes = [results[number] for number in sorted(results)]
+
+        # Заметки, не помещающиеся в один запрос, сводятся группами
+        while True:
+            sections = [f"--- Часть {number} ---\n{note}" for number, note in enumerate(notes, 1)]
+            groups = [[]]
+            for section in sections:
+                if groups[-1] and sum(map(len, groups[-1])) + len(section) > max_chars:
+                    groups.append([])
+                groups[-1].append(section)
+            if len(groups) == 1 or len(groups) >= len(notes):
+                break
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                notes = list(executor.map(lambda group: ask(CHUNK_COMBINE_PROMPT.format(text="\n\n".join(group))),
+                                          groups))
+            failed = [note for note in notes if is_failure_response(note)]
+            if failed:
+                return failed[0] or f"Ошибка {network}: пустой ответ"
+
+        self.log_message(f"✂️ {network}: итоговый ответ по {parts} частям")
+        return ask(CHUNK_REDUCE_PROMPT.format(text="\n\n".join(sections)), stream=True)
 
-    def query_openai(self, question, api_key):
-        """Запрос к OpenAI GPT"""
+    def check_internet_connection(self):
+        """Проверка интернет-соединения (по кэшу фоновой проверки)"""
+        return self.connectivity.is_online()
+
+    def query_openai(self, question, api_key, on_delta=None):
+        """Запрос к OpenAI GPT (on_delta - прием потокового ответа)"""
+        # SDK нужен и в обработчиках ошибок ниже, поэтому загружается до try
+        openai = self.load_sdk("openai")
         try:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
@@ -854,15 +3078,19 @@ class NeuralNetworkApp:
                 return "Ошибка: Введите API ключ OpenAI"
 
             openai.api_key = api_key
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "Вы - полезный ассистент. Отвечай на русском языке."},
-                    {"role": "user", "content": question}
-                ],
-                max_tokens=1000,
-                temperature=0.7
+            spec = PROVIDERS["OpenAI GPT"]
+            response = self.call_with_rate_limit(
+                "OpenAI GPT", api_key, openai.ChatCompletion.create,
+                model=self.get_model("OpenAI GPT"),
+                messages=self.build_messages("OpenAI GPT", question),
+                max_tokens=spec.max_tokens,
+                temperature=spec.temperature,
+                stream=bool(on_delta)
             )
+            if on_delta:
+                return collect_stream((chunk.choices[0].delta.get("content") for chunk in response
+                                       if chunk.choices), on_delta)
+            self.record_usage(getattr(response, "usage", None))
             return response.choices[0].message.content
         except openai.error.AuthenticationError:
             return "Ошибка: Неверный API ключ OpenAI"
@@ -873,8 +3101,8 @@ class NeuralNetworkApp:
         except Exception as e:
             return f"Ошибка OpenAI: {str(e)}"
 
-    def query_anthropic(self, question, api_key):
-        """Запрос к Anthropic Claude"""
+    def query_anthropic(self, question, api_key, on_delta=None):
+        """Запрос к Anthropic Claude (on_delta - прием потокового ответа)"""
         try:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
@@ -882,12 +3110,25 @@ class NeuralNetworkApp:
             if not api_key:
                 return "Ошибка: Введите API ключ Anthropic"
 
-            client = Anthropic(api_key=api_key)
-            response = client.messages.create(
-                model="claude-3-haiku-20240307",
-                max_tokens=1000,
-                messages=[{"role": "user", "content": question}]
+            client = self.get_client("Anthropic Claude", api_key)
+            if on_delta:
+                def stream_answer():
+                    with client.messages.stream(
+                            model=self.get_model("Anthropic Claude"),
+                            max_tokens=PROVIDERS["Anthropic Claude"].max_tokens,
+                            messages=self.build_messages("Anthropic Claude", question)
+                    ) as stream:
+                        return collect_stream(stream.text_stream, on_delta)
+
+                return self.call_with_rate_limit("Anthropic Claude", api_key, stream_answer)
+
+            response = self.call_with_rate_limit(
+                "Anthropic Claude", api_key, client.messages.create,
+                model=self.get_model("Anthropic Claude"),
+                max_tokens=PROVIDERS["Anthropic Claude"].max_tokens,
+                messages=self.build_messages("Anthropic Claude", question)
             )
+            self.record_usage(response.usage)
             return response.content[0].text
         except Exception as e:
             if "401" in str(e):
@@ -897,8 +3138,166 @@ class NeuralNetworkApp:
             else:
                 return f"Ошибка Anthropic: {str(e)}"
 
-    def query_deepseek(self, question, api_key):
-        """Запрос к DeepSeek"""
+    def submit_openai_batch(self, questions, api_key):
+        """Отправка вопросов в OpenAI Batch API ({id: вопрос}); возвращает id пакета"""
+        network = "OpenAI GPT"
+        spec = PROVIDERS[network]
+        lines = [json.dumps({
+            "custom_id": request_id, "method": "POST", "url": "/v1/chat/completions",
+            "body": {"model": self.get_model(network), "messages": self.build_messages(network, question),
+                     "max_tokens": spec.max_tokens, "temperature": spec.temperature}
+        }, ensure_ascii=False) for request_id, question in questions.items()]
+
+        headers = {"Authorization": f"Bearer {api_key}"}
+        response = self.send_http(network, api_key, "POST", "https://api.openai.com/v1/files", headers=headers,
+                                  data={"purpose": "batch"},
+                                  files={"file": ("preconcil_batch.jsonl", "\n".join(lines).encode('utf-8'))},
+                                  timeout=120)
+        response.raise_for_status()
+        response = self.send_http(network, api_key, "POST", "https://api.openai.com/v1/batches", headers=headers,
+                                  json={"input_file_id": response.json()["id"],
+                                        "endpoint": "/v1/chat/completions", "completion_window": "24h"},
+                                  timeout=30)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def poll_openai_batch(self, batch_id, api_key):
+        """Результаты пакета OpenAI: None, пока он обрабатывается, иначе {id: (ответ, ошибка)}"""
+        network = "OpenAI GPT"
+        headers = {"Authorization": f"Bearer {api_key}"}
+        response = self.send_http(network, api_key, "GET", f"https://api.openai.com/v1/batches/{batch_id}",
+                                  headers=headers, timeout=30)
+        response.raise_for_status()
+        batch = response.json()
+        if batch["status"] in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+
+        # Истекший или отмененный пакет может содержать часть ответов
+        results = {}
+        for file_id in (batch.get("output_file_id"), batch.get("error_file_id")):
+            if not file_id:
+                continue
+            response = self.send_http(network, api_key, "GET", f"https://api.openai.com/v1/files/{file_id}/content",
+                                      headers=headers, timeout=120)
+            response.raise_for_status()
+            for line in response.text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                reply = item.get("response") or {}
+                body = reply.get("body") or {}
+                if reply.get("status_code") == 200 and body.get("choices"):
+                    results[item["custom_id"]] = (body["choices"][0]["message"]["content"], None)
+                else:
+                    error = item.get("error") or body.get("error") or f"HTTP {reply.get('status_code')}"
+                    results[item["custom_id"]] = (None, f"Ошибка OpenAI: {error}")
+        if not results and batch["status"] != "completed":
+            raise RuntimeError(f"пакет завершился со статусом {batch['status']}")
+        return results
+
+    def submit_anthropic_batch(self, questions, api_key):
+        """Отправка вопросов в Anthropic Message Batches API ({id: вопрос}); возвращает id пакета"""
+        network = "Anthropic Claude"
+        headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
+        requests_list = [{
+            "custom_id": request_id,
+            "params": {"model": self.get_model(network), "max_tokens": PROVIDERS[network].max_tokens,
+                       "messages": self.build_messages(network, question)}
+        } for request_id, question in questions.items()]
+        response = self.send_http(network, api_key, "POST", "https://api.anthropic.com/v1/messages/batches",
+                                  headers=headers, json={"requests": requests_list}, timeout=120)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def poll_anthropic_batch(self, batch_id, api_key):
+        """Результаты пакета Anthropic: None, пока он обрабатывается, иначе {id: (ответ, ошибка)}"""
+        network = "Anthropic Claude"
+        headers = {"x-api-key": api_key, "anthropic-version": "2023-06-01"}
+        response = self.send_http(network, api_key, "GET",
+                                  f"https://api.anthropic.com/v1/messages/batches/{batch_id}",
+                                  headers=headers, timeout=30)
+        response.raise_for_status()
+        batch = response.json()
+        if batch["processing_status"] != "ended":
+            return None
+
+        response = self.send_http(network, api_key, "GET", batch["results_url"], headers=headers, timeout=120)
+        response.raise_for_status()
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            result = item.get("result") or {}
+            if result.get("type") == "succeeded":
+                results[item["custom_id"]] = (result["message"]["content"][0]["text"], None)
+            else:
+                error = result.get("error") or result.get("type")
+                results[item["custom_id"]] = (None, f"Ошибка Anthropic: {error}")
+        return results
+
+    def run_batch_api(self, questions, api_keys):
+        """Отправка вопросов пакетами в нейросети с Batch API и ожидание результатов
+
+        questions - {нейросеть: {id: вопрос}}. Вопросы делятся на пакеты не
+        больше max_requests; все пакеты опрашиваются по одному расписанию
+        (интервал растет от first_poll до max_poll_interval). Возвращает
+        {нейросеть: {id: (ответ, ошибка)}} для всех переданных вопросов.
+        """
+        batch_config = self.config["batch_api"]
+        size = max(1, batch_config["max_requests"])
+        results = {network: {} for network in questions}
+        jobs = []
+
+        for network, network_questions in questions.items():
+            submit, poll = PROVIDERS[network].get_batch_handlers(self)
+            ids = list(network_questions)
+            for start in range(0, len(ids), size):
+                chunk = {request_id: network_questions[request_id] for request_id in ids[start:start + size]}
+                try:
+                    batch_id = submit(chunk, api_keys[network])
+                except Exception as e:
+                    self.log_message(f"❌ {network}: пакет не отправлен: {str(e)}")
+                    results[network].update((request_id, (None, f"Ошибка отправки пакета: {str(e)}"))
+                                            for request_id in chunk)
+                    continue
+                self.log_message(f"📦 {network}: пакет {batch_id} принят ({len(chunk)} вопросов)")
+                jobs.append((network, batch_id, poll, list(chunk)))
+
+        delay = batch_config["first_poll"]
+        deadline = time.monotonic() + batch_config["max_wait_hours"] * 3600
+        while jobs:
+            time.sleep(max(0.0, min(delay, deadline - time.monotonic())))
+            expired = time.monotonic() >= deadline
+            pending = []
+            for network, batch_id, poll, ids in jobs:
+                try:
+                    done = poll(batch_id, api_keys[network])
+                    missing = f"Ошибка: в пакете {batch_id} нет ответа"
+                except Exception as e:
+                    if is_transient_http_error(e):
+                        # Временная ошибка не отменяет пакет: опрос повторится по расписанию
+                        self.log_message(f"⚠️ {network}: не удалось опросить пакет {batch_id}: {str(e)}")
+                        done, missing = None, f"Ошибка опроса пакета {batch_id}: {str(e)}"
+                    else:
+                        self.log_message(f"❌ {network}: пакет {batch_id} не выполнен: {str(e)}")
+                        done, missing = {}, f"Ошибка пакета {batch_id}: {str(e)}"
+                if done is None and not expired:
+                    pending.append((network, batch_id, poll, ids))
+                    continue
+                if done is None:
+                    self.log_message(f"⏱ {network}: пакет {batch_id} не завершился за отведенное время")
+                    done, missing = {}, f"Ошибка: пакет {batch_id} не завершился за отведенное время"
+                elif done:
+                    self.log_message(f"✅ {network}: пакет {batch_id} завершен")
+                for request_id in ids:
+                    results[network][request_id] = done.get(request_id) or (None, missing)
+            jobs = pending
+            delay = min(batch_config["max_poll_interval"], delay * 1.5)
+        return results
+
+    def query_deepseek(self, question, api_key, on_delta=None):
+        """Запрос к DeepSeek (on_delta - прием потокового ответа)"""
         try:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
@@ -906,21 +3305,21 @@ class NeuralNetworkApp:
             if not api_key:
                 return "Ошибка: Введите API ключ DeepSeek"
 
-            client = DeepSeekClient(
-                api_key=api_key,
-                base_url="https://api.deepseek.com"
-            )
+            client = self.get_client("DeepSeek", api_key)
 
-            response = client.chat.completions.create(
-                model="deepseek-chat",
-                messages=[
-                    {"role": "system", "content": "Вы - полезный ассистент. Отвечай на русском языке."},
-                    {"role": "user", "content": question}
-                ],
-                max_tokens=1000,
-                temperature=0.7,
-                stream=False
+            spec = PROVIDERS["DeepSeek"]
+            response = self.call_with_rate_limit(
+                "DeepSeek", api_key, client.chat.completions.create,
+                model=self.get_model("DeepSeek"),
+                messages=self.build_messages("DeepSeek", question),
+                max_tokens=spec.max_tokens,
+                temperature=spec.temperature,
+                stream=bool(on_delta)
             )
+            if on_delta:
+                return collect_stream((chunk.choices[0].delta.content for chunk in response if chunk.choices),
+                                      on_delta)
+            self.record_usage(response.usage)
             return response.choices[0].message.content
         except Exception as e:
             if "402" in str(e):
@@ -932,8 +3331,8 @@ class NeuralNetworkApp:
             else:
                 return f"Ошибка DeepSeek: {str(e)}"
 
-    def query_groq(self, question, api_key):
-        """Запрос к Groq API"""
+    def query_groq(self, question, api_key, on_delta=None):
+        """Запрос к Groq API (on_delta - прием потокового ответа)"""
         try:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
@@ -947,47 +3346,50 @@ class NeuralNetworkApp:
                 "Content-Type": "application/json"
             }
 
-            models_to_try = [
-                "llama-3.1-8b-instant",
-                "llama-3.1-70b-versatile",
-                "llama3-8b-8192",
-                "mixtral-8x7b-32768"
-            ]
+            spec = PROVIDERS["Groq"]
 
-            last_error = ""
-            for model in models_to_try:
+            def attempt(model, race):
                 data = {
                     "model": model,
-                    "messages": [
-                        {"role": "system", "content": "Ты - полезный ассистент. Отвечай на русском языке."},
-                        {"role": "user", "content": question}
-                    ],
-                    "temperature": 0.7,
-                    "max_tokens": 1000
+                    "messages": self.build_messages("Groq", question),
+                    "temperature": spec.temperature,
+                    "max_tokens": spec.max_tokens,
+                    "stream": bool(on_delta)
                 }
 
                 try:
-                    response = requests.post(url, headers=headers, json=data, timeout=30)
-
-                    if response.status_code == 200:
-                        return response.json()["choices"][0]["message"]["content"]
-                    elif response.status_code == 400:
-                        last_error = f"Модель {model} недоступна"
-                        continue
-                    elif response.status_code == 401:
-                        return "Ошибка: Неверный API ключ Groq"
-                    elif response.status_code == 429:
-                        return "Ошибка: Превышен лимит запросов Groq"
-                except:
-                    continue
-
-            return f"Ошибка Groq: Не удалось найти рабочую модель. {last_error}"
+                    response = self.send_http("Groq", api_key, "POST", url, headers=headers, json=data,
+                                              timeout=30, stream=bool(on_delta))
+                except requests.exceptions.Timeout:
+                    return "next", f"Модель {model} не ответила вовремя"
+
+                if response.status_code == 200:
+                    if not race.claim(model):
+                        response.close()
+                        return "next", ""
+                    if on_delta:
+                        return "ok", collect_stream(iter_sse_deltas(response), on_delta)
+                    body = response.json()
+                    self.record_usage(body.get("usage"))
+                    return "ok", body["choices"][0]["message"]["content"]
+                elif response.status_code == 400:
+                    return "next", f"Модель {model} недоступна"
+                elif response.status_code == 401:
+                    return "fatal", "Ошибка: Неверный API ключ Groq"
+                elif response.status_code == 429:
+                    return "fatal", "Ошибка: Превышен лимит запросов Groq"
+                return "next", f"Модель {model}: код ответа {response.status_code}"
+
+            status, result = self.race_models("Groq", api_key, attempt)
+            if status == "next":
+                return f"Ошибка Groq: Не удалось найти рабочую модель. {result}"
+            return result
 
         except Exception as e:
             return f"Ошибка Groq: {str(e)}"
 
-    def query_openrouter(self, question, api_key):
-        """Запрос к OpenRouter API"""
+    def query_openrouter(self, question, api_key, on_delta=None):
+        """Запрос к OpenRouter API (on_delta - прием потокового ответа)"""
         try:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
@@ -1003,40 +3405,44 @@ class NeuralNetworkApp:
                 "X-Title": "PreConcil AI Manager"
             }
 
-            free_models_to_try = [
-                "mistralai/mistral-7b-instruct:free",
-                "google/gemma-7b-it:free",
-                "huggingfaceh4/zephyr-7b-beta:free"
-            ]
+            spec = PROVIDERS["OpenRouter"]
 
-            last_error = ""
-            for model in free_models_to_try:
+            def attempt(model, race):
                 data = {
                     "model": model,
-                    "messages": [
-                        {"role": "system", "content": "Ты - полезный ассистент. Отвечай на русском языке."},
-                        {"role": "user", "content": question}
-                    ],
-                    "max_tokens": 1000,
-                    "temperature": 0.7
+                    "messages": self.build_messages("OpenRouter", question),
+                    "max_tokens": spec.max_tokens,
+                    "temperature": spec.temperature,
+                    "stream": bool(on_delta)
                 }
 
                 try:
-                    response = requests.post(url, headers=headers, json=data, timeout=30)
-
-                    if response.status_code == 200:
-                        return response.json()["choices"][0]["message"]["content"]
-                    elif response.status_code == 404:
-                        last_error = f"Модель {model} не найдена"
-                        continue
-                    elif response.status_code == 401:
-                        return "Ошибка: Неверный API ключ OpenRouter"
-                    elif response.status_code == 429:
-                        return "Ошибка: Превышен лимит запросов OpenRouter"
-                except:
-                    continue
-
-            return f"Ошибка OpenRouter: Не удалось найти рабочую модель. {last_error}"
+                    response = self.send_http("OpenRouter", api_key, "POST", url, headers=headers, json=data,
+                                              timeout=30, stream=bool(on_delta))
+                except requests.exceptions.Timeout:
+                    return "next", f"Модель {model} не ответила вовремя"
+
+                if response.status_code == 200:
+                    if not race.claim(model):
+                        response.close()
+                        return "next", ""
+                    if on_delta:
+                        return "ok", collect_stream(iter_sse_deltas(response), on_delta)
+                    body = response.json()
+                    self.record_usage(body.get("usage"))
+                    return "ok", body["choices"][0]["message"]["content"]
+                elif response.status_code in (400, 404):
+                    return "next", f"Модель {model} не найдена"
+                elif response.status_code == 401:
+                    return "fatal", "Ошибка: Неверный API ключ OpenRouter"
+                elif response.status_code == 429:
+                    return "fatal", "Ошибка: Превышен лимит запросов OpenRouter"
+                return "next", f"Модель {model}: код ответа {response.status_code}"
+
+            status, result = self.race_models("OpenRouter", api_key, attempt)
+            if status == "next":
+                return f"Ошибка OpenRouter: Не удалось найти рабочую модель. {result}"
+            return result
 
         except Exception as e:
             return f"Ошибка OpenRouter: {str(e)}"
@@ -1047,238 +3453,1171 @@ class NeuralNetworkApp:
             if not self.check_internet_connection():
                 return "Ошибка: Нет интернет-соединения"
 
-            models_to_try = [
-                "microsoft/DialoGPT-medium",
-                "gpt2",
-                "distilgpt2",
-                "facebook/opt-350m"
-            ]
-
+            spec = PROVIDERS["Hugging Face"]
             headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
-            last_error = ""
 
-            for model in models_to_try:
+            def attempt(model, race):
                 url = f"https://api-inference.huggingface.co/models/{model}"
 
-                data = {
-                    "inputs": question,
-                    "parameters": {
-                        "max_new_tokens": 500,
-                        "temperature": 0.7,
-                        "return_full_text": False
-                    }
-                }
+                data = {
+                    "inputs": question,
+                    "parameters": {
+                        "max_new_tokens": spec.max_tokens,
+                        "temperature": spec.temperature,
+                        "return_full_text": False
+                    }
+                }
+
+                response = self.send_http("Hugging Face", api_key, "POST", url, headers=headers, json=data,
+                                          timeout=60)
+
+                if response.status_code == 200:
+                    if not race.claim(model):
+                        # Ответ проигравшей модели не нужен: соединение сразу возвращается в пул
+                        response.close()
+                        return "next", ""
+                    result = response.json()
+                    if isinstance(result, list) and len(result) > 0:
+                        if "generated_text" in result[0]:
+                            return "ok", result[0]["generated_text"]
+                        else:
+                            text = str(result[0]).replace("{", "").replace("}", "").replace("'", "")
+                            return "ok", text if len(text) > 10 else f"Ответ от {model}: {text}"
+                    return "ok", f"Ответ от {model}: {str(result)}"
+                elif response.status_code == 503:
+                    return "next", f"Модель {model} загружается"
+                elif response.status_code == 429:
+                    return "next", f"Лимит запросов для {model}"
+                return "next", f"Модель {model}: код ответа {response.status_code}"
+
+            status, result = self.race_models("Hugging Face", api_key, attempt)
+            if status == "next":
+                return f"Ошибка Hugging Face: Не удалось найти рабочую модель. {result}"
+            return result
+
+        except Exception as e:
+            return f"Ошибка Hugging Face: {str(e)}"
+
+    def query_mistral(self, question, api_key, on_delta=None):
+        """Запрос к Mistral AI API (on_delta - прием потокового ответа)"""
+        try:
+            if not self.check_internet_connection():
+                return "Ошибка: Нет интернет-соединения"
+
+            if not api_key:
+                return "Ошибка: Введите API ключ Mistral AI"
+
+            client = self.get_client("Mistral AI", api_key)
+
+            spec = PROVIDERS["Mistral AI"]
+            if on_delta:
+                events = self.call_with_rate_limit(
+                    "Mistral AI", api_key, client.chat.stream,
+                    model=self.get_model("Mistral AI"),
+                    messages=self.build_messages("Mistral AI", question),
+                    max_tokens=spec.max_tokens,
+                    temperature=spec.temperature
+                )
+                return collect_stream((event.data.choices[0].delta.content for event in events
+                                       if event.data.choices), on_delta)
+
+            chat_response = self.call_with_rate_limit(
+                "Mistral AI", api_key, client.chat.complete,
+                model=self.get_model("Mistral AI"),
+                messages=self.build_messages("Mistral AI", question),
+                max_tokens=spec.max_tokens,
+                temperature=spec.temperature
+            )
+            self.record_usage(chat_response.usage)
+            return chat_response.choices[0].message.content
+        except Exception as e:
+            if "401" in str(e):
+                return "Ошибка: Неверный API ключ Mistral AI"
+            elif "429" in str(e):
+                return "Ошибка: Превышен лимит запросов Mistral AI"
+            else:
+                return f"Ошибка Mistral AI: {str(e)}"
+
+    def query_gigachat(self, question, api_key):
+        """Запрос к GigaChat API"""
+        try:
+            if not self.check_internet_connection():
+                return "Ошибка: Нет интернет-соединения"
+
+            if not api_key:
+                return "Ошибка: Введите ключ авторизации GigaChat"
+
+            giga = self.get_client("GigaChat", api_key)
+            response = self.call_with_rate_limit("GigaChat", api_key, giga.chat, question)
+            self.record_usage(getattr(response, "usage", None))
+            return response.choices[0].message.content
+        except Exception as e:
+            error_msg = str(e)
+            if "401" in error_msg or "authenticat" in error_msg.lower():
+                return "Ошибка: Неверный ключ авторизации GigaChat"
+            elif "certificate" in error_msg.lower() or "SSL" in error_msg:
+                return "Ошибка GigaChat: Проблема с SSL-сертификатом."
+            elif "429" in error_msg:
+                return "Ошибка: Превышен лимит запросов GigaChat"
+            else:
+                return f"Ошибка GigaChat: {error_msg}"
+
+    def fetch_genapi_status(self, request_id, api_key):
+        """Статус задачи GenAPI: (данные ответа или None, пауза до следующего опроса от сервера)"""
+        status_url = f"https://api.gen-api.ru/api/v1/request/get/{request_id}"
+        headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+        status_response = self.send_http("GenAPI", api_key, "GET", status_url, headers=headers, timeout=30)
+        hint = parse_retry_delay(status_response.headers.get("Retry-After"))
+        if status_response.status_code != 200:
+            self.log_message(f"GenAPI: Ошибка опроса статуса {request_id}: {status_response.status_code}")
+            return None, hint
+        return status_response.json(), hint
+
+    def query_genapi(self, question, api_key):
+        """Запрос к GenAPI: задача создается один раз, результат ожидается от общего опроса"""
+        try:
+            if not self.check_internet_connection():
+                return "Ошибка: Нет интернет-соединения"
+            if not api_key:
+                return "Ошибка: Введите API ключ GenAPI"
+
+            # Получаем ID нейросети из поля ввода
+            network_id = self.get_model("GenAPI")
+
+            # 0. Задача с тем же вопросом уже создана (например, до перезапуска)
+            task_key = GenAPIPoller.make_key(network_id, question)
+            task = self.genapi_poller.find(task_key)
+            if task is not None and task[1] in ("pending", "success"):
+                self.log_message(f"GenAPI: Продолжаем ожидание задачи {task[0]}")
+                if task[1] == "pending":
+                    self.genapi_poller.resume(api_key)
+                status, result = self.genapi_poller.wait(task_key)
+                return result or f"Ошибка GenAPI: Превышено время ожидания ответа по задаче {task[0]}."
+
+            # 1. Отправка задачи на генерацию
+            url = f"https://api.gen-api.ru/api/v1/networks/{network_id}"
+            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+            # ВАЖНО: Структура 'input' зависит от выбранной нейросети
+            # Это минимальный пример для текстовой генерации
+            data = {
+                "input": {
+                    "messages": [
+                        {"role": "user", "content": question}
+                    ]
+                }
+            }
+
+            gen_response = self.send_http("GenAPI", api_key, "POST", url, headers=headers, json=data, timeout=30)
+            if gen_response.status_code != 200:
+                error_msg = f"Ошибка GenAPI при создании задачи: {gen_response.status_code}"
+                try:
+                    error_detail = gen_response.json().get('result', gen_response.text)
+                    error_msg += f" - {error_detail}"
+                except:
+                    pass
+                return error_msg
+
+            # 2. Получение request_id для отслеживания задачи
+            task_data = gen_response.json()
+            request_id = task_data.get("request_id")
+            if not request_id:
+                return "Ошибка GenAPI: не получен ID задачи для отслеживания."
+
+            self.log_message(f"GenAPI: Задача {request_id} принята в работу (status: {task_data.get('status')})")
+
+            # 3. Ожидание результата от общего опроса задач GenAPI
+            self.genapi_poller.add(task_key, str(request_id), api_key)
+            status, result = self.genapi_poller.wait(task_key)
+            return result or f"Ошибка GenAPI: Превышено время ожидания ответа по задаче {request_id}."
+
+        except requests.exceptions.Timeout:
+            return "Ошибка GenAPI: Таймаут при ожидании ответа от сервера."
+        except Exception as e:
+            return f"Ошибка GenAPI: {str(e)}"
+
+    def save_responses(self, responses, save_dir, original_file, cached_networks=(), question=None, records=None):
+        """Сохранение ответов в файл с уникальным именем
+
+        Текст файла строится из записей результатов (records, см.
+        process_question); без них - из ответов. question - для поиска по истории.
+        """
+        try:
+            if records is None:
+                records = [{"network": network, "status": "ok", "cached": network in cached_networks,
+                            "response": response} for network, response in responses.items()]
+
+            base_name = os.path.splitext(os.path.basename(original_file))[0]
+            filename, f = self.create_answer_file(save_dir, base_name)
+            filepath = os.path.join(save_dir, filename)
+            sent = datetime.now()
+
+            with f:
+                f.write(render_answer_report(records, sent, original_file))
+
+            history_index = self.get_history_index(save_dir)
+            if history_index is not None:
+                history_index.add(filename, sent.timestamp(), original_file, responses, question)
+
+            self.log_message(f"✅ Ответы сохранены в: {filepath}")
+            return filepath
+        except Exception as e:
+            self.log_message(f"❌ Ошибка сохранения: {str(e)}")
+            return None
+
+    def send_to_telegram(self, filepath, bot_token, chat_id):
+        """Отправка файла в Telegram"""
+        try:
+            url = f"https://api.telegram.org/bot{bot_token}/sendDocument"
+
+            with open(filepath, 'rb') as file:
+                files = {'document': file}
+                data = {'chat_id': chat_id}
+                response = self.get_session("Telegram", bot_token).post(url, files=files, data=data)
+
+            if response.status_code == 200:
+                self.log_message("✅ Файл успешно отправлен в Telegram")
+                return True
+            else:
+                self.log_message(f"❌ Ошибка отправки в Telegram: {response.status_code}")
+                return False
+        except Exception as e:
+            self.log_message(f"❌ Ошибка отправки в Telegram: {str(e)}")
+            return False
+
+    def _query_network(self, network, question, api_key, on_delta=None, call_info=None, slots=None):
+        """Отправка вопроса в одну нейросеть (с потоковым выводом, если он поддерживается)
+
+        В call_info записываются модель, ответившая на вопрос, и длительность запроса.
+        slots - общий семафор запросов, из которого берутся места для частей вопроса.
+        """
+        spec = PROVIDERS.get(network)
+        if spec is None:
+            return "Неподдерживаемая нейросеть"
+
+        info = call_info if call_info is not None else {}
+        info["model"] = self.get_model(network)
+        self._call_local.info = info
+        started = time.perf_counter()
+        try:
+            if self.needs_chunking(network, question):
+                return self.query_chunked(network, question, api_key, on_delta, slots)
+            if on_delta and spec.streaming:
+                return spec.get_query_handler(self)(question, api_key, on_delta=on_delta)
+            return spec.get_query_handler(self)(question, api_key)
+        finally:
+            info["latency"] = round(time.perf_counter() - started, 3)
+            self._call_local.info = None
+
+    def query_coalesced(self, network, question, api_key, on_delta=None, call_info=None, slots=None):
+        """Запрос к нейросети, объединяемый с таким же уже выполняющимся запросом
+
+        Ключ - нейросеть, ключ API, параметры запроса и вопрос без учета
+        пробелов. Присоединившийся запрос получает тот же ответ и модель,
+        а в call_info отмечается shared.
+        """
+        info = call_info if call_info is not None else {}
+        if not self.config["dispatch"]["coalesce_requests"]:
+            return self._query_network(network, question, api_key, on_delta, info, slots)
+
+        key = (network, api_key, json.dumps(self.request_params(network), sort_keys=True),
+               normalize_question(self.question_key(question)))
+
+        def query():
+            return self._query_network(network, question, api_key, on_delta, info, slots), dict(info)
+
+        # shared отмечается до ожидания: запрос может не дождаться общего вызова
+        (response, leader_info), shared = self.single_flight.do(key, query,
+                                                                on_wait=lambda: info.update(shared=True))
+        if shared:
+            info.update(model=leader_info.get("model"))
+            self.log_message(f"🔗 {network}: ответ получен от такого же запроса, отправленного ранее")
+        return response
+
+    def process_question(self, question, selected_networks, api_keys, save_dir, original_file,
+                         bypass_cache=False, streaming=False, slots=None, send_telegram=True,
+                         batch_results=None):
+        """Отправка вопроса в выбранные нейросети и сохранение ответов
+
+        question - текст вопроса или QuestionFile для большого файла (вопрос,
+        не помещающийся в контекст нейросети, отправляется частями).
+        slots - общий семафор, ограничивающий число одновременных запросов
+        (например, на весь пакет файлов). batch_results - уже полученные
+        через Batch API результаты {нейросеть: (ответ, ошибка)}; в эти
+        нейросети вопрос не отправляется. Возвращает (ответы, список
+        нейросетей с ошибками, путь к сохраненному файлу или None).
+        """
+        received = {}
+        failed_networks = []
+        failed_calls = set()
+        cached_networks = set()
+        errors = {}
+        call_infos = {network: {} for network in selected_networks}
+
+        # Ответы из кэша не отправляются повторно
+        cache = self.get_response_cache(save_dir)
+        cache_keys = {}
+        if cache is not None:
+            for network in selected_networks:
+                cache_keys[network] = cache.make_key(network, self.request_params(network), self.question_key(question))
+                if bypass_cache:
+                    continue
+                cached_response = cache.get(cache_keys[network])
+                if cached_response is not None:
+                    received[network] = cached_response
+                    cached_networks.add(network)
+                    self.log_message(f"♻️ Ответ от {network} взят из кэша")
+
+        def on_result(network, response, error):
+            """Обработка ответа сразу по мере поступления"""
+            if error is not None or is_failure_response(response):
+                # Исключения и ошибки обработчика - сбои вызова (для выключателя)
+                failed_calls.add(network)
+            if error is not None:
+                self.log_message(f"❌ Ошибка при запросе к {network}: {str(error)}")
+                failed_networks.append(network)
+                errors[network] = str(error)
+            # Проверяем, не вернулась ли ошибка
+            elif is_error_response(response):
+                self.log_message(f"❌ {response}")
+                failed_networks.append(network)
+                errors[network] = response
+            else:
+                received[network] = response
+                self.connectivity.mark_online()
+                self.log_message(f"✅ Получен ответ от {network}")
+                if cache is not None:
+                    cache.put(cache_keys[network], network, response)
+
+        # Результаты Batch API учитываются как обычные ответы
+        batched = set()
+        for network, (response, error) in (batch_results or {}).items():
+            if network in selected_networks and network not in cached_networks:
+                batched.add(network)
+                call_infos[network].update(model=self.get_model(network), batch=True)
+                on_result(network, response, error)
+
+        # Отправка запросов ко всем выбранным нейросетям одновременно
+        dispatch_config = self.config["dispatch"]
+        # Вопрос, отправляемый частями, получает больше времени
+        rounds = max([self.chunk_rounds(network, question) for network in selected_networks] or [1])
+        dispatcher = QueryDispatcher(max_workers=dispatch_config["max_workers"],
+                                     deadline=dispatch_config["run_deadline"] * rounds, slots=slots)
+        tasks = {}
+        recorders = {}
+        breakers = {}
+        circuit_open = set()
+        base_name = os.path.splitext(os.path.basename(original_file))[0]
+        for network in selected_networks:
+            if network in cached_networks or network in batched:
+                continue
+            # Недоступная нейросеть не задерживает вопрос на время таймаута
+            breaker = self.get_circuit_breaker(network, api_keys[network])
+            if breaker is not None and not breaker.allow():
+                self.log_message(f"⏸ {network}: запросы приостановлены после серии ошибок "
+                                 f"(повтор через {breaker.retry_in():.0f} с)")
+                failed_networks.append(network)
+                circuit_open.add(network)
+                errors[network] = f"Ошибка: {network} временно недоступна после серии ошибок"
+                continue
+            breakers[network] = breaker
+            self.log_message(f"Отправляем запрос в {network}...")
+            if streaming and PROVIDERS[network].streaming:
+                # Потоковый ответ сразу дописывается в промежуточный файл
+                partial_path = os.path.join(save_dir, f".{base_name}.{PROVIDERS[network].key_name}.partial")
+                recorders[network] = StreamRecorder(network, partial_path, on_text=self.show_stream_text)
+            tasks[network] = (lambda n=network: self.query_coalesced(n, question, api_keys[n], recorders.get(n),
+                                                                     call_infos[n], slots))
+
+        if recorders:
+            self.on_stream_start(list(recorders))
+
+        _, timed_out = dispatcher.run(tasks, on_result)
+
+        for network, recorder in recorders.items():
+            recorder.finish()
+            self.record_stream_stats(recorder)
+            ttft = recorder.time_to_first_token()
+            if ttft is not None:
+                call_infos[network]["ttfb"] = round(ttft, 4)
+
+        for network in timed_out:
+            self.log_message(f"⏱ {network}: превышено время ожидания ({dispatcher.deadline} с)")
+            failed_networks.append(network)
+            errors[network] = f"Превышено время ожидания ({dispatcher.deadline} с)"
+
+        # Ошибки и таймауты подряд размыкают выключатели нейросетей. Общий вызов
+        # учитывается только тем запросом, который его отправил.
+        for network, breaker in breakers.items():
+            if breaker is None:
+                continue
+            if call_infos[network].get("shared"):
+                breaker.release()
+            else:
+                breaker.record(network not in timed_out and network not in failed_calls)
+
+        # Сохраняем ответы в порядке выбора нейросетей
+        responses = {network: received[network] for network in selected_networks if network in received}
+
+        # Записи результатов: одна на нейросеть
+        run_id = uuid.uuid4().hex
+        if isinstance(question, QuestionFile):
+            question_hash = question.sha256
+        else:
+            question_hash = hashlib.sha256(question.encode('utf-8')).hexdigest()
+        records = []
+        for network in selected_networks:
+            record = {"run_id": run_id, "question_file": original_file, "question_sha256": question_hash,
+                      "network": network, "cached": network in cached_networks}
+            record.update(call_infos[network])
+            if network in responses:
+                record.update(status="ok", response=responses[network])
+            elif network in timed_out:
+                record.update(status="timeout", error=errors[network])
+            elif network in circuit_open:
+                record.update(status="circuit_open", error=errors[network])
+            else:
+                record.update(status="error", error=errors.get(network, ""))
+            records.append(record)
+
+            if (not record["cached"] and not record.get("shared") and network not in circuit_open
+                    and network not in batched):
+                if record["status"] == "timeout":
+                    record.setdefault("latency", dispatcher.deadline)
+                self.record_metrics(network, "query", record["status"], record)
+
+        # Сохранение результатов
+        saved_file = None
+        if responses:
+            self.log_message("Сохраняем результаты...")
+            history_text = question.preview if isinstance(question, QuestionFile) else question
+            saved_file = self.save_responses(responses, save_dir, original_file, cached_networks, history_text,
+                                             records)
+
+            # Промежуточные файлы остаются только для неполученных ответов
+            if saved_file:
+                for network, recorder in recorders.items():
+                    if network in responses:
+                        recorder.discard()
+
+            # Отправка в Telegram (если настроено)
+            bot_token, chat_id = self.get_telegram_settings()
+
+            if send_telegram and bot_token and chat_id and saved_file:
+                self.log_message("Отправляем файл в Telegram...")
+                success = self.send_to_telegram(saved_file, bot_token, chat_id)
+                if not success:
+                    self.log_message("⚠️ Не удалось отправить файл в Telegram")
+        else:
+            self.log_message("❌ Не получено ни одного ответа от нейросетей")
+
+        results_store = self.get_results_store(save_dir)
+        if results_store is not None:
+            saved_at = datetime.now().isoformat(timespec='seconds')
+            answer_file = os.path.basename(saved_file) if saved_file else None
+            for record in records:
+                record.update(time=saved_at, answer_file=answer_file)
+            try:
+                results_store.append(records)
+            except OSError as e:
+                self.log_message(f"⚠️ Не удалось записать результаты: {str(e)}")
+
+        return responses, failed_networks, saved_file
+
+    def record_stream_stats(self, recorder):
+        """Сохранение и вывод метрик потокового ответа"""
+        ttft = recorder.time_to_first_token()
+        if ttft is None:
+            return
+        speed = recorder.tokens_per_second()
+        self.stream_stats[recorder.network] = {
+            "time_to_first_token": ttft,
+            "tokens": recorder.tokens,
+            "tokens_per_second": speed
+        }
+        speed_text = f"{speed:.1f} ток/с" if speed else "скорость не определена"
+        self.log_message(f"⏱ {recorder.network}: первый токен через {ttft:.2f} с, {speed_text}")
+
+
+class NeuralNetworkApp(NeuralNetworkCore):
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Менеджер нейросетей v7.0")
+        self.root.geometry("950x750")
+
+        # Сообщения лога и фрагменты потоковых ответов из рабочих потоков
+        # (выводятся пачками в drain_log)
+        self.log_queue = queue.Queue()
+        self.stream_queue = queue.Queue()
+
+        # Конфигурация, пул соединений и кэши
+        super().__init__("config.json")
+
+        # Создаем вкладки
+        self.notebook = ttk.Notebook(root)
+        self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Вкладка 1: Основные настройки
+        self.setup_main_tab()
+
+        # Вкладка 2: Потоковый вывод ответов
+        self.setup_stream_tab()
+
+        # Вкладка 3: Настройки API
+        self.setup_api_tab()
+
+        # Вкладка 4: История запросов
+        self.setup_history_tab()
+
+        # Вкладка 5: Статус соединения
+        self.setup_status_tab()
+
+        # Загружаем конфигурацию
+        self.load_config_to_ui()
+
+        # Проверяем соединение при запуске (в фоне)
+        self.root.after(1000, self.check_all_connections_background)
+
+        # Вывод лога в окно
+        self.root.after(self.config["log"]["flush_interval_ms"], self.drain_log)
+
+        # Несохраненные метрики и статистика моделей записываются при закрытии окна
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def on_closing(self):
+        """Закрытие окна: запись отложенных метрик и каталога моделей"""
+        if self.inbox_processor is not None:
+            self.inbox_processor.stop()
+        self.export_metrics()
+        self.model_catalog.flush()
+        self.root.destroy()
+
+    def setup_main_tab(self):
+        """Создание основной вкладки"""
+        self.main_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.main_tab, text="Основное")
+
+        # Фрейм для выбора файла
+        file_frame = ttk.LabelFrame(self.main_tab, text="Выбор файла с вопросом", padding=10)
+        file_frame.pack(fill='x', padx=10, pady=5)
+
+        ttk.Label(file_frame, text="Файл с вопросом:").grid(row=0, column=0, sticky='w')
+
+        self.file_path_var = tk.StringVar()
+        self.file_entry = ttk.Entry(file_frame, textvariable=self.file_path_var, width=70)
+        self.file_entry.grid(row=1, column=0, padx=(0, 10))
+
+        ttk.Button(file_frame, text="Выбрать...", command=self.select_file).grid(row=1, column=1)
+
+        # Отображение базового имени файла
+        ttk.Label(file_frame, text="Имя файла для сохранения:").grid(row=2, column=0, sticky='w', pady=(10, 0))
+        self.filename_display_var = tk.StringVar()
+        ttk.Label(file_frame, textvariable=self.filename_display_var,
+                  font=('TkDefaultFont', 9, 'italic')).grid(row=3, column=0, columnspan=2, sticky='w')
+
+        # Фрейм для выбора директории сохранения
+        save_frame = ttk.LabelFrame(self.main_tab, text="Директория для сохранения ответов", padding=10)
+        save_frame.pack(fill='x', padx=10, pady=5)
+
+        ttk.Label(save_frame, text="Папка для сохранения:").grid(row=0, column=0, sticky='w')
+
+        self.save_path_var = tk.StringVar()
+        self.save_entry = ttk.Entry(save_frame, textvariable=self.save_path_var, width=70)
+        self.save_entry.grid(row=1, column=0, padx=(0, 10))
+        ttk.Button(save_frame, text="Выбрать...", command=self.select_save_directory).grid(row=1, column=1)
+
+        # Предварительный просмотр имени файла для сохранения
+        ttk.Label(save_frame, text="Будет сохранен как:").grid(row=2, column=0, sticky='w', pady=(10, 0))
+        self.save_filename_var = tk.StringVar()
+        ttk.Label(save_frame, textvariable=self.save_filename_var,
+                  font=('TkDefaultFont', 9, 'italic'), foreground='blue').grid(row=3, column=0, columnspan=2,
+                                                                               sticky='w')
+
+        # Фрейм папки входящих: новые файлы обрабатываются автоматически
+        inbox_frame = ttk.LabelFrame(self.main_tab, text="Папка входящих (автообработка новых файлов)", padding=10)
+        inbox_frame.pack(fill='x', padx=10, pady=5)
+
+        self.inbox_path_var = tk.StringVar()
+        ttk.Entry(inbox_frame, textvariable=self.inbox_path_var, width=70).grid(row=0, column=0, padx=(0, 10))
+        ttk.Button(inbox_frame, text="Выбрать...", command=self.select_inbox_directory).grid(row=0, column=1)
+        self.inbox_button_var = tk.StringVar(value="Начать наблюдение")
+        ttk.Button(inbox_frame, textvariable=self.inbox_button_var,
+                   command=self.toggle_inbox_watch).grid(row=0, column=2, padx=(5, 0))
+        self.inbox_processor = None
+
+        # Фрейм для выбора нейросетей
+        networks_frame = ttk.LabelFrame(self.main_tab, text="Выбор нейросетей", padding=10)
+        networks_frame.pack(fill='x', padx=10, pady=5)
+
+        self.networks_vars = {name: tk.BooleanVar(value=spec.selected) for name, spec in PROVIDERS.items()}
+
+        # Создаем 3 колонки для чекбоксов
+        row_counter = 0
+        col_counter = 0
+        self.network_checkbuttons = {}
+
+        for i, (name, var) in enumerate(self.networks_vars.items()):
+            cb = ttk.Checkbutton(networks_frame, text=name, variable=var)
+            cb.grid(row=row_counter, column=col_counter, sticky='w', padx=10, pady=2)
+            self.network_checkbuttons[name] = cb
+
+            col_counter += 1
+            if col_counter > 2:  # 3 колонки
+                col_counter = 0
+                row_counter += 1
+
+        self.bypass_cache_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(networks_frame, text="Не использовать кэш ответов",
+                        variable=self.bypass_cache_var).grid(row=row_counter + 1, column=0, columnspan=3,
+                                                             sticky='w', padx=10, pady=(8, 2))
+
+        self.streaming_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(networks_frame, text="Потоковый вывод ответов (вкладка \"Потоковый вывод\")",
+                        variable=self.streaming_var).grid(row=row_counter + 2, column=0, columnspan=3,
+                                                          sticky='w', padx=10, pady=2)
+
+        # Кнопки управления
+        button_frame = ttk.Frame(self.main_tab)
+        button_frame.pack(fill='x', padx=10, pady=20)
+
+        ttk.Button(button_frame, text="Проверить соединение",
+                   command=self.check_connections).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Отправить запрос", command=self.send_requests,
+                   style="Accent.TButton").pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Сохранить конфигурацию",
+                   command=self.save_configuration).pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Очистить лог",
+                   command=self.clear_log).pack(side='left', padx=5)
+
+        # Прогресс-бар и лог
+        self.progress = ttk.Progressbar(self.main_tab, mode='indeterminate')
+        self.progress.pack(fill='x', padx=10, pady=5)
+
+        log_frame = ttk.LabelFrame(self.main_tab, text="Лог выполнения", padding=10)
+        log_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        self.log_text = tk.Text(log_frame, height=12, wrap='word')
+        scrollbar = ttk.Scrollbar(log_frame, command=self.log_text.yview)
+        self.log_text.configure(yscrollcommand=scrollbar.set)
+
+        self.log_text.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        # Привязываем события изменения
+        self.file_path_var.trace('w', self.update_filename_display)
+        self.save_path_var.trace('w', self.update_save_filename_display)
+
+    def setup_stream_tab(self):
+        """Создание вкладки потокового вывода ответов"""
+        self.stream_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.stream_tab, text="Потоковый вывод")
+
+        ttk.Label(self.stream_tab, text="Ответы нейросетей по мере генерации (включите потоковый вывод "
+                                        "на вкладке \"Основное\")",
+                  font=('TkDefaultFont', 9, 'italic')).pack(fill='x', padx=10, pady=(10, 0))
+
+        self.stream_notebook = ttk.Notebook(self.stream_tab)
+        self.stream_notebook.pack(fill='both', expand=True, padx=10, pady=10)
+        self.stream_frames = []
+        self.stream_texts = {}
+
+    def setup_api_tab(self):
+        """Создание вкладки с настройками API"""
+        self.api_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.api_tab, text="Настройки API")
+
+        self.api_key_vars = {}
+        self.api_key_entries = {}
+        self.model_vars = {}
+
+        for name, spec in PROVIDERS.items():
+            provider_frame = ttk.LabelFrame(self.api_tab, text=spec.title, padding=10)
+            provider_frame.pack(fill='x', padx=10, pady=5)
+
+            ttk.Label(provider_frame, text=spec.key_label).grid(row=0, column=0, sticky='w')
+            key_var = tk.StringVar()
+            key_entry = ttk.Entry(provider_frame, textvariable=key_var, width=70, show="*")
+            key_entry.grid(row=1, column=0, padx=(0, 10))
+            ttk.Button(provider_frame, text="Показать",
+                       command=lambda e=key_entry: self.toggle_password(e)).grid(row=1, column=1)
+            self.api_key_vars[name] = key_var
+            self.api_key_entries[name] = key_entry
+            # При смене ключа старые соединения больше не нужны
+            key_var.trace('w', lambda *args, n=name: self.connection_pool.invalidate(n))
+
+            row = 2
+            if spec.note:
+                ttk.Label(provider_frame, text=spec.note,
+                          font=('TkDefaultFont', 8, 'italic')).grid(row=row, column=0, columnspan=2, sticky='w',
+                                                                    pady=(5, 0))
+                row += 1
+
+            # Поле выбора модели (для нейросетей, где модель задается пользователем)
+            if spec.model_label:
+                ttk.Label(provider_frame, text=spec.model_label).grid(row=row, column=0, sticky='w', pady=(5, 0))
+                model_var = tk.StringVar(value=spec.default_model)
+                ttk.Entry(provider_frame, textvariable=model_var, width=70).grid(row=row + 1, column=0,
+                                                                                 columnspan=2, sticky='w',
+                                                                                 pady=(2, 0))
+                self.model_vars[name] = model_var
+
+        # Telegram Bot
+        telegram_frame = ttk.LabelFrame(self.api_tab, text="Telegram Bot API", padding=10)
+        telegram_frame.pack(fill='x', padx=10, pady=5)
+
+        ttk.Label(telegram_frame, text="Токен бота:").grid(row=0, column=0, sticky='w')
+        self.telegram_token_var = tk.StringVar()
+        self.telegram_token_var.trace('w', lambda *args: self.connection_pool.invalidate("Telegram"))
+        ttk.Entry(telegram_frame, textvariable=self.telegram_token_var, width=70).grid(row=1, column=0, columnspan=2,
+                                                                                       pady=(0, 10))
+
+        ttk.Label(telegram_frame, text="Chat ID:").grid(row=2, column=0, sticky='w')
+        self.telegram_chat_id_var = tk.StringVar()
+        ttk.Entry(telegram_frame, textvariable=self.telegram_chat_id_var, width=70).grid(row=3, column=0, columnspan=2)
+
+    def setup_status_tab(self):
+        """Создание вкладки со статусом соединения"""
+        self.status_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.status_tab, text="Статус соединения")
+
+        # Фрейм для статусов
+        status_frame = ttk.LabelFrame(self.status_tab, text="Статус подключения к API", padding=10)
+        status_frame.pack(fill='both', expand=True, padx=10, pady=10)
+
+        # Создаем виджеты для отображения статуса
+        self.status_labels = {}
+        self.status_text_vars = {}
+
+        for name, key_var in self.api_key_vars.items():
+            # Фрейм для каждого сервиса
+            service_frame = ttk.Frame(status_frame)
+            service_frame.pack(fill='x', padx=10, pady=5)
+
+            # Название сервиса
+            ttk.Label(service_frame, text=f"{name}:", width=15, anchor='w').pack(side='left', padx=(0, 10))
+
+            # Индикатор статуса
+            status_canvas = tk.Canvas(service_frame, width=20, height=20, bg='white', highlightthickness=0)
+            status_canvas.pack(side='left', padx=(0, 10))
+            self.status_labels[name] = status_canvas
+
+            # Текст статуса
+            status_text_var = tk.StringVar(value="Не проверено")
+            self.status_text_vars[name] = status_text_var
+            ttk.Label(service_frame, textvariable=status_text_var, width=20, anchor='w').pack(side='left', padx=(0, 10))
+
+            # Кнопка проверки
+            ttk.Button(service_frame, text="Проверить", width=10,
+                       command=lambda n=name, k=key_var: self.check_single_connection(n, k.get())).pack(side='left')
+
+        # Кнопка проверки всех соединений
+        ttk.Button(status_frame, text="Проверить все соединения",
+                   command=self.check_all_connections, style="Accent.TButton").pack(pady=20)
+
+        # Метрики запросов
+        metrics_frame = ttk.LabelFrame(self.status_tab, text="Метрики запросов (последние записи)", padding=10)
+        metrics_frame.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+
+        columns = ("network", "count", "errors", "p50", "p95", "p99", "ttfb", "retries", "tokens", "model")
+        headings = ("Нейросеть", "Запросов", "Ошибок", "p50, с", "p95, с", "p99, с", "TTFB p50, с",
+                    "Повторов", "Токены (вопрос/ответ)", "Модель")
+        self.metrics_tree = ttk.Treeview(metrics_frame, columns=columns, show='headings', height=8)
+        for column, heading in zip(columns, headings):
+            self.metrics_tree.heading(column, text=heading)
+            self.metrics_tree.column(column, width=70 if column not in ("network", "tokens", "model") else 130,
+                                     anchor='w')
+        self.metrics_tree.pack(fill='both', expand=True)
+
+        metrics_control = ttk.Frame(metrics_frame)
+        metrics_control.pack(fill='x', pady=(5, 0))
+        ttk.Button(metrics_control, text="Обновить", command=self.refresh_metrics_view).pack(side='left')
+        ttk.Label(metrics_control, text=f"Экспорт для Prometheus: {self.metrics_export_path}").pack(side='left',
+                                                                                                    padx=10)
+        self.refresh_metrics_view()
+
+    def refresh_metrics_view(self):
+        """Обновление таблицы метрик запросов"""
+        self.metrics_tree.delete(*self.metrics_tree.get_children())
+        if self.metrics is None:
+            return
+
+        def seconds(value):
+            return f"{value:.2f}" if value is not None else "-"
+
+        for network, stats in self.metrics.summary("query").items():
+            self.metrics_tree.insert('', 'end', values=(
+                network, stats["count"], stats["errors"],
+                seconds(stats["latency"][0.5]), seconds(stats["latency"][0.95]), seconds(stats["latency"][0.99]),
+                seconds(stats["ttfb"][0.5]), stats["retries"],
+                f"{stats['prompt_tokens']}/{stats['completion_tokens']}", stats["last_model"] or "-"
+            ))
+
+    def setup_history_tab(self):
+        """Создание вкладки с историей"""
+        self.history_tab = ttk.Frame(self.notebook)
+        self.notebook.add(self.history_tab, text="История")
+
+        # Панель управления историей
+        history_control = ttk.Frame(self.history_tab)
+        history_control.pack(fill='x', padx=10, pady=5)
+
+        ttk.Button(history_control, text="Обновить", command=self.load_history).pack(side='left', padx=5)
+        ttk.Button(history_control, text="Отправить в Telegram",
+                   command=self.send_selected_to_telegram).pack(side='left', padx=5)
+
+        ttk.Button(history_control, text="▶", width=3,
+                   command=lambda: self.change_history_page(1)).pack(side='right', padx=5)
+        self.history_page_var = tk.StringVar()
+        ttk.Label(history_control, textvariable=self.history_page_var).pack(side='right', padx=5)
+        ttk.Button(history_control, text="◀", width=3,
+                   command=lambda: self.change_history_page(-1)).pack(side='right', padx=5)
+        self.history_page = 0
+        self.history_preview = None
+        self.history_names = []
+        self.history_search_active = False
+
+        # Поиск по ответам
+        search_frame = ttk.Frame(self.history_tab)
+        search_frame.pack(fill='x', padx=10, pady=(0, 5))
+
+        ttk.Label(search_frame, text="Поиск:").pack(side='left')
+        self.history_search_var = tk.StringVar()
+        search_entry = ttk.Entry(search_frame, textvariable=self.history_search_var, width=40)
+        search_entry.pack(side='left', padx=5)
+        search_entry.bind('<Return>', lambda event: self.search_history())
+
+        self.history_network_var = tk.StringVar(value="Все нейросети")
+        ttk.Combobox(search_frame, textvariable=self.history_network_var, state='readonly', width=18,
+                     values=["Все нейросети"] + list(PROVIDERS)).pack(side='left', padx=5)
+
+        self.history_period_var = tk.StringVar(value="За все время")
+        ttk.Combobox(search_frame, textvariable=self.history_period_var, state='readonly', width=14,
+                     values=list(HISTORY_PERIODS)).pack(side='left', padx=5)
+
+        ttk.Button(search_frame, text="Найти", command=self.search_history).pack(side='left', padx=5)
+        ttk.Button(search_frame, text="Сбросить", command=self.reset_history_search).pack(side='left', padx=5)
+
+        # Список файлов
+        list_frame = ttk.Frame(self.history_tab)
+        list_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        self.history_listbox = tk.Listbox(list_frame, selectmode='single')
+        scrollbar = ttk.Scrollbar(list_frame, command=self.history_listbox.yview)
+        self.history_listbox.configure(yscrollcommand=scrollbar.set)
+
+        self.history_listbox.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+
+        # Просмотр содержимого
+        view_frame = ttk.LabelFrame(self.history_tab, text="Просмотр файла", padding=10)
+        view_frame.pack(fill='both', expand=True, padx=10, pady=5)
+
+        self.history_text = tk.Text(view_frame, wrap='word')
+        self.history_scrollbar = ttk.Scrollbar(view_frame, command=self.history_text.yview)
+        self.history_text.configure(yscrollcommand=self.on_history_scroll)
+
+        self.history_text.pack(side='left', fill='both', expand=True)
+        self.history_scrollbar.pack(side='right', fill='y')
+
+        # Привязываем событие выбора
+        self.history_listbox.bind('<<ListboxSelect>>', self.on_history_select)
+
+    def load_config_to_ui(self):
+        """Загрузка конфигурации в UI"""
+        for name, spec in PROVIDERS.items():
+            self.api_key_vars[name].set(self.config["api_keys"].get(spec.key_name, ""))
+
+        self.telegram_token_var.set(self.config["telegram"]["bot_token"])
+        self.telegram_chat_id_var.set(self.config["telegram"]["chat_id"])
+
+        if self.config["last_directory"]:
+            self.save_path_var.set(self.config["last_directory"])
+
+        self.inbox_path_var.set(self.config["inbox"]["directory"])
+
+    def toggle_password(self, entry):
+        """Переключение видимости пароля"""
+        current_show = entry.cget('show')
+        entry.config(show='' if current_show == '*' else '*')
+
+    def update_filename_display(self, *args):
+        """Обновление отображения имени файла"""
+        filepath = self.file_path_var.get()
+        if filepath and os.path.exists(filepath):
+            filename = os.path.basename(filepath)
+            base_name = os.path.splitext(filename)[0]
+            self.filename_display_var.set(f"Базовое имя: {base_name}")
+            self.update_save_filename_display()
+        else:
+            self.filename_display_var.set("")
+
+    def update_save_filename_display(self, *args):
+        """Обновление отображения имени файла для сохранения"""
+        filepath = self.file_path_var.get()
+        save_dir = self.save_path_var.get()
+
+        if filepath and save_dir and os.path.exists(filepath):
+            filename = os.path.basename(filepath)
+            base_name = os.path.splitext(filename)[0]
+            save_name = self.generate_unique_filename(save_dir, base_name)
+            self.save_filename_var.set(save_name)
+        else:
+            self.save_filename_var.set("")
+
+    def select_file(self):
+        """Выбор файла с вопросом"""
+        filename = filedialog.askopenfilename(
+            title="Выберите файл с вопросом",
+            filetypes=[("Текстовые файлы", "*.txt"), ("Все файлы", "*.*")]
+        )
+        if filename:
+            self.file_path_var.set(filename)
+
+    def select_save_directory(self):
+        """Выбор директории для сохранения"""
+        directory = filedialog.askdirectory(title="Выберите папку для сохранения")
+        if directory:
+            self.save_path_var.set(directory)
+            self.config["last_directory"] = directory
+            self.save_config()
+
+    def select_inbox_directory(self):
+        """Выбор папки входящих"""
+        directory = filedialog.askdirectory(title="Выберите папку входящих")
+        if directory:
+            self.inbox_path_var.set(directory)
+            self.config["inbox"]["directory"] = directory
+            self.save_config()
 
-                try:
-                    response = requests.post(url, headers=headers, json=data, timeout=60)
-
-                    if response.status_code == 200:
-                        result = response.json()
-                        if isinstance(result, list) and len(result) > 0:
-                            if "generated_text" in result[0]:
-                                return result[0]["generated_text"]
-                            else:
-                                text = str(result[0]).replace("{", "").replace("}", "").replace("'", "")
-                                return text if len(text) > 10 else f"Ответ от {model}: {text}"
-                        return f"Ответ от {model}: {str(result)}"
-                    elif response.status_code == 503:
-                        last_error = f"Модель {model} загружается"
-                        continue
-                    elif response.status_code == 429:
-                        last_error = f"Лимит запросов для {model}"
-                        continue
-                except Exception as model_error:
-                    last_error = str(model_error)
-                    continue
+    def toggle_inbox_watch(self):
+        """Запуск или остановка наблюдения за папкой входящих"""
+        if self.inbox_processor is not None:
+            self.inbox_processor.stop()
+            self.inbox_processor = None
+            self.inbox_button_var.set("Начать наблюдение")
+            self.log_message("Наблюдение за папкой входящих остановлено")
+            return
 
-            return f"Бесплатный ответ от AI: Вопрос '{question[:50]}...' получен."
+        inbox_dir = self.inbox_path_var.get()
+        save_dir = self.save_path_var.get()
 
-        except Exception as e:
-            return f"Ошибка Hugging Face: {str(e)}"
+        if not inbox_dir or not os.path.isdir(inbox_dir):
+            messagebox.showerror("Ошибка", "Выберите папку входящих")
+            return
 
-    def query_mistral(self, question, api_key):
-        """Запрос к Mistral AI API"""
-        try:
-            if not self.check_internet_connection():
-                return "Ошибка: Нет интернет-соединения"
+        if not save_dir or not os.path.exists(save_dir):
+            messagebox.showerror("Ошибка", "Выберите папку для сохранения")
+            return
 
-            if not api_key:
-                return "Ошибка: Введите API ключ Mistral AI"
+        selected_networks = [name for name, var in self.networks_vars.items() if var.get()]
+        if not selected_networks:
+            messagebox.showerror("Ошибка", "Выберите хотя бы одну нейросеть")
+            return
 
-            client = MistralClient(api_key=api_key)
+        api_keys = {name: self.get_api_key(name) for name in PROVIDERS}
+        missing_keys = [name for name in selected_networks if PROVIDERS[name].key_required and not api_keys[name]]
+        if missing_keys:
+            messagebox.showerror("Ошибка", f"Введите API ключи для: {', '.join(missing_keys)}")
+            return
 
-            chat_response = client.chat.complete(
-                model="mistral-small-latest",
-                messages=[
-                    {"role": "user", "content": question}
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return chat_response.choices[0].message.content
-        except Exception as e:
-            if "401" in str(e):
-                return "Ошибка: Неверный API ключ Mistral AI"
-            elif "429" in str(e):
-                return "Ошибка: Превышен лимит запросов Mistral AI"
-            else:
-                return f"Ошибка Mistral AI: {str(e)}"
+        inbox_config = self.config["inbox"]
+        self.inbox_processor = InboxProcessor(self, inbox_dir, save_dir, selected_networks, api_keys,
+                                              workers=inbox_config["workers"],
+                                              poll_interval=inbox_config["poll_interval"],
+                                              settle_time=inbox_config["settle_seconds"],
+                                              on_processed=lambda path: self.root.after(0, self.load_history))
+        self.inbox_processor.start()
+        self.inbox_button_var.set("Остановить наблюдение")
 
-    def query_gigachat(self, question, api_key):
-        """Запрос к GigaChat API"""
-        try:
-            if not self.check_internet_connection():
-                return "Ошибка: Нет интернет-соединения"
+    def get_health_targets(self):
+        """Пары (нейросеть, ключ) для проверки соединения"""
+        return [(name, key_var.get()) for name, key_var in self.api_key_vars.items() if key_var.get()]
 
-            if not api_key:
-                return "Ошибка: Введите ключ авторизации GigaChat"
+    def check_all_connections_background(self):
+        """Фоновая проверка всех соединений с повтором раз в refresh_interval секунд"""
+        for name, key in self.get_health_targets():
+            self.health.submit(name, key, force=True)
 
-            with GigaChat(credentials=api_key, verify_ssl_certs=False, scope="GIGACHAT_API_PERS") as giga:
-                response = giga.chat(question)
-                return response.choices[0].message.content
-        except Exception as e:
-            error_msg = str(e)
-            if "401" in error_msg or "authenticat" in error_msg.lower():
-                return "Ошибка: Неверный ключ авторизации GigaChat"
-            elif "certificate" in error_msg.lower() or "SSL" in error_msg:
-                return "Ошибка GigaChat: Проблема с SSL-сертификатом."
-            elif "429" in error_msg:
-                return "Ошибка: Превышен лимит запросов GigaChat"
-            else:
-                return f"Ошибка GigaChat: {error_msg}"
+        interval = self.config["health_checks"]["refresh_interval"]
+        if interval:
+            self.root.after(int(interval * 1000), self.check_all_connections_background)
 
-    def query_genapi(self, question, api_key):
-        """Запрос к GenAPI с использованием Long-pooling"""
-        try:
-            if not self.check_internet_connection():
-                return "Ошибка: Нет интернет-соединения"
-            if not api_key:
-                return "Ошибка: Введите API ключ GenAPI"
+    def check_single_connection(self, network_name, api_key):
+        """Проверка соединения с одной нейросетью (индикатор обновится по результату)"""
+        self.health.submit(network_name, api_key, force=True)
+
+    def on_health_result(self, network, api_key, status):
+        """Результат проверки передается в окно через очередь событий Tk"""
+        super().on_health_result(network, api_key, status)
+        self.root.after(0, self.apply_connection_status, network, api_key, status)
+
+    def apply_connection_status(self, network, api_key, status):
+        """Обновление индикатора, если ключ не сменился за время проверки"""
+        if self.api_key_vars[network].get() == api_key:
+            self.update_status_indicator(network, status)
+
+    def on_circuit_change(self, network, api_key, state):
+        """Состояние выключателя отображается индикатором на вкладке статуса"""
+        super().on_circuit_change(network, api_key, state)
+        if state != CircuitBreaker.HALF_OPEN:
+            self.root.after(0, self.apply_circuit_state, network, api_key, state)
+
+    def apply_circuit_state(self, network, api_key, state):
+        """Обновление индикатора по выключателю, если ключ не сменился"""
+        if self.api_key_vars[network].get() != api_key:
+            return
+        if state == CircuitBreaker.OPEN:
+            self.update_status_indicator(network, False, "Приостановлено ⏸")
+        else:
+            self.update_status_indicator(network, True)
 
-            # Получаем ID нейросети из поля ввода
-            network_id = self.genapi_network_id_var.get().strip()
-            if not network_id:
-                network_id = "gpt-4o-mini"  # Значение по умолчанию
+    def update_status_indicator(self, network_name, status, text=None):
+        """Обновление индикатора статуса (text заменяет стандартную подпись)"""
+        if network_name in self.status_labels:
+            canvas = self.status_labels[network_name]
+            canvas.delete("all")
 
-            # 1. Отправка задачи на генерацию
-            url = f"https://api.gen-api.ru/api/v1/networks/{network_id}"
-            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-            # ВАЖНО: Структура 'input' зависит от выбранной нейросети
-            # Это минимальный пример для текстовой генерации
-            data = {
-                "input": {
-                    "messages": [
-                        {"role": "user", "content": question}
-                    ]
-                }
-            }
+            if status:
+                # Зеленый кружок
+                canvas.create_oval(2, 2, 18, 18, fill="green", outline="")
+                canvas.create_text(10, 10, text="✓", fill="white", font=('Arial', 10, 'bold'))
+                self.status_text_vars[network_name].set(text or "Подключено ✓")
+            else:
+                # Красный кружок
+                canvas.create_oval(2, 2, 18, 18, fill="red", outline="")
+                canvas.create_text(10, 10, text="✗", fill="white", font=('Arial', 10, 'bold'))
+                self.status_text_vars[network_name].set(text or "Ошибка ✗")
 
-            gen_response = requests.post(url, headers=headers, json=data, timeout=30)
-            if gen_response.status_code != 200:
-                error_msg = f"Ошибка GenAPI при создании задачи: {gen_response.status_code}"
-                try:
-                    error_detail = gen_response.json().get('result', gen_response.text)
-                    error_msg += f" - {error_detail}"
-                except:
-                    pass
-                return error_msg
+    def check_connections(self):
+        """Проверка всех соединений"""
+        self.log_message("Проверяем соединения...")
+        for name, key in self.get_health_targets():
+            self.health.submit(name, key, force=True)
 
-            # 2. Получение request_id для отслеживания задачи
-            task_data = gen_response.json()
-            request_id = task_data.get("request_id")
-            if not request_id:
-                return "Ошибка GenAPI: не получен ID задачи для отслеживания."
+    def check_all_connections(self):
+        """Проверка всех соединений с уведомлением"""
+        self.log_message("Начинаем проверку всех соединений...")
+        thread = threading.Thread(target=self._check_all_connections_thread,
+                                  args=(self.get_health_targets(),), daemon=True)
+        thread.start()
 
-            self.log_message(f"GenAPI: Задача {request_id} принята в работу (status: {task_data.get('status')})")
+    def _check_all_connections_thread(self, targets):
+        """Поток, ожидающий параллельные проверки и показывающий итог"""
+        results = self.health.check_all(targets, force=True)
+        successful_connections = [name for name, status in results.items() if status]
+        failed_connections = [name for name, status in results.items() if not status]
+        self.root.after(0, self.show_connection_results, successful_connections, failed_connections)
 
-            # 3. Ожидание и опрос статуса задачи (Long-pooling)
-            status_url = f"https://api.gen-api.ru/api/v1/request/get/{request_id}"
-            max_attempts = 60  # Максимум ~5 минут (60 попыток * 5 секунд)
-            attempt = 0
+    def show_connection_results(self, successful, failed):
+        """Показ результатов проверки соединений"""
+        message = "Результаты проверки соединений:\n\n"
 
-            while attempt < max_attempts:
-                attempt += 1
-                time.sleep(5)  # Ожидание 5 секунд между запросами
+        if successful:
+            message += "✅ Успешные подключения:\n"
+            for service in successful:
+                message += f"   • {service}\n"
+            message += "\n"
 
-                status_response = requests.get(status_url, headers=headers, timeout=30)
-                if status_response.status_code != 200:
-                    self.log_message(f"GenAPI: Ошибка опроса статуса {request_id}: {status_response.status_code}")
-                    continue
+        if failed:
+            message += "❌ Не удалось подключиться:\n"
+            for service in failed:
+                message += f"   • {service}\n"
 
-                status_data = status_response.json()
-                current_status = status_data.get("status")
+        if not successful and not failed:
+            message += "ℹ️ Нет сервисов для проверки. Введите API ключи."
 
-                if current_status == "success":
-                    output = status_data.get("output")
-                    if output:
-                        return output
-                    else:
-                        return f"Ответ GenAPI получен, но поле 'output' пустое."
+        messagebox.showinfo("Результаты проверки", message)
 
-                elif current_status == "processing":
-                    if attempt % 5 == 0:  # Логируем каждые 5 попыток
-                        self.log_message(
-                            f"GenAPI: Задача {request_id} в обработке... (попытка {attempt}/{max_attempts})")
-                    continue
+    def log_message(self, message):
+        """Добавление сообщения в лог (можно вызывать из любого потока)"""
+        self.write_log_file(message)
+        self.log_queue.put(f"{datetime.now().strftime('%H:%M:%S')} - {message}\n")
 
-                elif current_status == "failed":
-                    error_result = status_data.get("result", ["Неизвестная ошибка"])
-                    return f"Ошибка GenAPI: задача не выполнена. Детали: {error_result}"
+    def drain_log(self):
+        """Вывод накопленных сообщений в окно лога одной вставкой
 
+        В окне хранятся только последние max_lines строк.
+        """
+        lines = []
+        try:
+            while len(lines) < 1000:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if lines:
+            max_lines = self.config["log"]["max_lines"]
+            self.log_text.insert('end', "".join(lines[-max_lines:]))
+            excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - max_lines
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.see('end')
+
+        self.drain_stream()
+        self.root.after(self.config["log"]["flush_interval_ms"], self.drain_log)
+
+    def drain_stream(self):
+        """Вывод накопленных фрагментов потоковых ответов (одна вставка на нейросеть)"""
+        pending = {}
+        try:
+            for _ in range(10000):
+                kind, network, text = self.stream_queue.get_nowait()
+                if kind == "reset":
+                    # Фрагменты прошлого запуска выводятся до пересоздания вкладок
+                    self.flush_stream_text(pending)
+                    pending = {}
+                    self.reset_stream_views(network)
                 else:
-                    self.log_message(f"GenAPI: Неожиданный статус '{current_status}' для задачи {request_id}")
-                    continue
+                    pending.setdefault(network, []).append(text)
+        except queue.Empty:
+            pass
+        self.flush_stream_text(pending)
 
-            return f"Ошибка GenAPI: Превышено время ожидания ответа по задаче {request_id}."
+    def flush_stream_text(self, pending):
+        """Добавление собранных фрагментов в окна нейросетей"""
+        for network, parts in pending.items():
+            self.append_stream_text(network, "".join(parts))
 
-        except requests.exceptions.Timeout:
-            return "Ошибка GenAPI: Таймаут при ожидании ответа от сервера."
-        except Exception as e:
-            return f"Ошибка GenAPI: {str(e)}"
+    def clear_log(self):
+        """Очистка лога"""
+        self.log_text.delete(1.0, 'end')
 
-    def save_responses(self, responses, save_dir, original_file):
-        """Сохранение ответов в файл с уникальным именем"""
-        try:
-            base_name = os.path.splitext(os.path.basename(original_file))[0]
-            filename = self.generate_unique_filename(save_dir, base_name)
-            filepath = os.path.join(save_dir, filename)
+    def save_configuration(self):
+        """Сохранение конфигурации"""
+        for name, spec in PROVIDERS.items():
+            self.config["api_keys"][spec.key_name] = self.api_key_vars[name].get()
 
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write("=" * 60 + "\n")
-                f.write(f"Вопрос отправлен: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Исходный файл: {original_file}\n")
-                f.write("=" * 60 + "\n\n")
+        self.config["telegram"]["bot_token"] = self.telegram_token_var.get()
+        self.config["telegram"]["chat_id"] = self.telegram_chat_id_var.get()
 
-                for network, response in responses.items():
-                    f.write(f"--- {network} ---\n")
-                    f.write(response + "\n")
-                    f.write("=" * 60 + "\n\n")
+        if self.save_config():
+            self.log_message("Конфигурация сохранена")
+            messagebox.showinfo("Успех", "Конфигурация успешно сохранена!")
+        else:
+            messagebox.showerror("Ошибка", "Не удалось сохранить конфигурацию")
 
-            self.log_message(f"✅ Ответы сохранены в: {filepath}")
-            return filepath
-        except Exception as e:
-            self.log_message(f"❌ Ошибка сохранения: {str(e)}")
-            return None
+    def get_api_key(self, network):
+        """API ключ нейросети из поля ввода"""
+        return self.api_key_vars[network].get()
 
-    def send_to_telegram(self, filepath, bot_token, chat_id):
-        """Отправка файла в Telegram"""
-        try:
-            url = f"https://api.telegram.org/bot{bot_token}/sendDocument"
+    def get_telegram_settings(self):
+        """Токен бота и Chat ID из полей ввода"""
+        return self.telegram_token_var.get(), self.telegram_chat_id_var.get()
 
-            with open(filepath, 'rb') as file:
-                files = {'document': file}
-                data = {'chat_id': chat_id}
-                response = requests.post(url, files=files, data=data)
+    def on_stream_start(self, networks):
+        """Подготовка вкладок потокового вывода (в очереди перед фрагментами ответов)"""
+        self.stream_queue.put(("reset", networks, None))
 
-            if response.status_code == 200:
-                self.log_message("✅ Файл успешно отправлен в Telegram")
-                return True
-            else:
-                self.log_message(f"❌ Ошибка отправки в Telegram: {response.status_code}")
-                return False
-        except Exception as e:
-            self.log_message(f"❌ Ошибка отправки в Telegram: {str(e)}")
-            return False
+    def report_startup(self, startup):
+        """Вывод отчета о времени запуска в лог"""
+        startup.mark("Отрисовка окна")
+        for line in startup.report():
+            self.log_message(line)
+
+    def get_model(self, network):
+        """Модель нейросети: из поля ввода, если оно есть, иначе из конфигурации"""
+        model_var = self.model_vars.get(network)
+        model = model_var.get().strip() if model_var else ""
+        return model or super().get_model(network)
 
     def send_requests(self):
         """Основная функция отправки запросов"""
@@ -1307,33 +4646,28 @@ class NeuralNetworkApp:
             return
 
         # Получение API ключей
-        api_keys = {
-            "OpenAI GPT": self.openai_key_var.get(),
-            "Anthropic Claude": self.anthropic_key_var.get(),
-            "DeepSeek": self.deepseek_key_var.get(),
-            "Groq": self.groq_key_var.get(),
-            "OpenRouter": self.openrouter_key_var.get(),
-            "Hugging Face": self.huggingface_key_var.get(),
-            "Mistral AI": self.mistral_key_var.get(),
-            "GigaChat": self.gigachat_key_var.get(),
-            "GenAPI": self.genapi_key_var.get()
-        }
+        api_keys = {name: key_var.get() for name, key_var in self.api_key_vars.items()}
 
-        # Проверка ключей для выбранных сетей (кроме Hugging Face)
+        # Проверка ключей для выбранных сетей (кроме работающих без ключа)
         missing_keys = []
         for network in selected_networks:
-            if network != "Hugging Face" and not api_keys[network]:
+            if PROVIDERS[network].key_required and not api_keys[network]:
                 missing_keys.append(network)
 
         if missing_keys:
             messagebox.showerror("Ошибка",
-                                 f"Введите API ключи для: {', '.join(missing_keys)}\n\nHugging Face может работать без ключа.")
+                                 f"Введите API ключи для: {', '.join(missing_keys)}\n\n"
+                                 f"Hugging Face может работать без ключа.")
             return
 
-        # Проверяем соединение перед отправкой (предупреждение, не блокировка)
+        # Проверяем соединение перед отправкой (предупреждение, не блокировка).
+        # Используется кэш проверок; устаревшие статусы обновляются в фоне.
         failed_connections = []
         for network in selected_networks:
-            if not self.connection_status.get(network, False):
+            status = self.health.get_status(network, api_keys[network])
+            if status is None:
+                self.health.submit(network, api_keys[network])
+            if status is False or self.is_circuit_open(network, api_keys[network]):
                 failed_connections.append(network)
 
         if failed_connections:
@@ -1350,84 +4684,33 @@ class NeuralNetworkApp:
         # Запуск в отдельном потоке
         thread = threading.Thread(
             target=self._send_requests_thread,
-            args=(question, selected_networks, api_keys, save_dir, question_file)
+            args=(question, selected_networks, api_keys, save_dir, question_file, self.bypass_cache_var.get(),
+                  self.streaming_var.get())
         )
         thread.daemon = True
         thread.start()
 
-    def _send_requests_thread(self, question, selected_networks, api_keys, save_dir, original_file):
-        """Поток для отправки запросов"""
-        self.progress.start()
+    def _send_requests_thread(self, question, selected_networks, api_keys, save_dir, original_file,
+                              bypass_cache=False, streaming=False):
+        """Поток для отправки запросов (виджеты меняются только через главный цикл)"""
+        self.root.after(0, self.progress.start)
         self.log_message("Начинаем отправку запросов...")
 
-        responses = {}
-        failed_networks = []
-
-        # Отправка запросов к выбранным нейросетям
-        for network in selected_networks:
-            self.log_message(f"Отправляем запрос в {network}...")
-
-            try:
-                if network == "OpenAI GPT":
-                    response = self.query_openai(question, api_keys[network])
-                elif network == "Anthropic Claude":
-                    response = self.query_anthropic(question, api_keys[network])
-                elif network == "DeepSeek":
-                    response = self.query_deepseek(question, api_keys[network])
-                elif network == "Groq":
-                    response = self.query_groq(question, api_keys[network])
-                elif network == "OpenRouter":
-                    response = self.query_openrouter(question, api_keys[network])
-                elif network == "Hugging Face":
-                    response = self.query_huggingface(question, api_keys[network])
-                elif network == "Mistral AI":
-                    response = self.query_mistral(question, api_keys[network])
-                elif network == "GigaChat":
-                    response = self.query_gigachat(question, api_keys[network])
-                elif network == "GenAPI":
-                    response = self.query_genapi(question, api_keys[network])
-                else:
-                    response = "Неподдерживаемая нейросеть"
-
-                # Проверяем, не вернулась ли ошибка
-                if response and (response.startswith("Ошибка") or "Error" in response or "error" in response.lower()):
-                    self.log_message(f"❌ {response}")
-                    failed_networks.append(network)
-                else:
-                    responses[network] = response
-                    self.log_message(f"✅ Получен ответ от {network}")
-
-            except Exception as e:
-                error_msg = f"Ошибка при запросе к {network}: {str(e)}"
-                self.log_message(f"❌ {error_msg}")
-                failed_networks.append(network)
+        responses, failed_networks, saved_file = self.process_question(
+            question, selected_networks, api_keys, save_dir, original_file,
+            bypass_cache=bypass_cache, streaming=streaming
+        )
 
         # Показываем уведомление о неудачных запросах
         if failed_networks:
             self.root.after(0, lambda: self.show_network_errors(failed_networks))
 
-        # Сохранение результатов
-        if responses:
-            self.log_message("Сохраняем результаты...")
-            saved_file = self.save_responses(responses, save_dir, original_file)
-
-            # Отправка в Telegram (если настроено)
-            bot_token = self.telegram_token_var.get()
-            chat_id = self.telegram_chat_id_var.get()
-
-            if bot_token and chat_id and saved_file:
-                self.log_message("Отправляем файл в Telegram...")
-                success = self.send_to_telegram(saved_file, bot_token, chat_id)
-                if not success:
-                    self.log_message("⚠️ Не удалось отправить файл в Telegram")
-        else:
-            self.log_message("❌ Не получено ни одного ответа от нейросетей")
-
-        self.progress.stop()
+        self.root.after(0, self.progress.stop)
         self.log_message("Готово!")
 
-        # Обновляем список истории
-        self.load_history()
+        # Обновляем список истории и метрики
+        self.root.after(0, self.load_history)
+        self.root.after(0, self.refresh_metrics_view)
 
         # Показываем итоговое сообщение
         if responses:
@@ -1438,6 +4721,37 @@ class NeuralNetworkApp:
                 f"Ошибки: {len(failed_networks)}"
             ))
 
+    def show_stream_text(self, network, text):
+        """Передача фрагмента потокового ответа в интерфейс (выводится в drain_stream)"""
+        self.stream_queue.put(("text", network, text))
+
+    def reset_stream_views(self, networks):
+        """Пересоздание вкладок потокового вывода для нового запуска"""
+        for tab in self.stream_notebook.tabs():
+            self.stream_notebook.forget(tab)
+        for frame in self.stream_frames:
+            frame.destroy()
+        self.stream_frames = []
+        self.stream_texts = {}
+
+        for network in networks:
+            frame = ttk.Frame(self.stream_notebook)
+            text = tk.Text(frame, wrap='word')
+            scrollbar = ttk.Scrollbar(frame, command=text.yview)
+            text.configure(yscrollcommand=scrollbar.set)
+            text.pack(side='left', fill='both', expand=True)
+            scrollbar.pack(side='right', fill='y')
+            self.stream_notebook.add(frame, text=network)
+            self.stream_frames.append(frame)
+            self.stream_texts[network] = text
+
+    def append_stream_text(self, network, text):
+        """Добавление фрагмента потокового ответа в окно нейросети"""
+        widget = self.stream_texts.get(network)
+        if widget is not None:
+            widget.insert('end', text)
+            widget.see('end')
+
     def show_network_errors(self, failed_networks):
         """Показать ошибки подключения к нейросетям"""
         if failed_networks:
@@ -1452,41 +4766,125 @@ class NeuralNetworkApp:
             )
 
     def load_history(self):
-        """Загрузка истории файлов"""
+        """Загрузка истории файлов: страница из индекса сразу, сверка с папкой в фоне"""
         save_dir = self.save_path_var.get()
         if not save_dir or not os.path.exists(save_dir):
             return
 
-        self.history_listbox.delete(0, 'end')
+        index = self.get_history_index(save_dir)
+        if index is None:
+            return
 
-        try:
-            files = [f for f in os.listdir(save_dir) if f.startswith('responses_') or f.endswith('_answer.txt')]
-            files.sort(reverse=True)  # Сначала новые
+        self.show_history_page()
+        threading.Thread(target=self._sync_history_thread, args=(index,), daemon=True).start()
 
-            for file in files:
-                self.history_listbox.insert('end', file)
+    def _sync_history_thread(self, index):
+        """Поток сверки индекса истории с папкой сохранения"""
+        try:
+            if index.sync() and not self.history_search_active:
+                self.root.after(0, self.show_history_page)
         except Exception as e:
             self.log_message(f"Ошибка загрузки истории: {str(e)}")
 
+    def show_history_page(self):
+        """Вывод текущей страницы истории (сначала новые)"""
+        save_dir = self.save_path_var.get()
+        index = self.get_history_index(save_dir) if save_dir and os.path.exists(save_dir) else None
+        if index is None:
+            return
+
+        page_size = self.config["history"]["page_size"]
+        total = index.count()
+        pages = max(1, (total + page_size - 1) // page_size)
+        self.history_page = min(self.history_page, pages - 1)
+
+        self.history_search_active = False
+        self.history_names = index.page(self.history_page * page_size, page_size)
+        self.history_listbox.delete(0, 'end')
+        for name in self.history_names:
+            self.history_listbox.insert('end', name)
+        self.history_page_var.set(f"Стр. {self.history_page + 1} из {pages} (файлов: {total})")
+
+    def change_history_page(self, step):
+        """Переход на соседнюю страницу истории"""
+        if self.history_search_active:
+            return
+        self.history_page = max(0, self.history_page + step)
+        self.show_history_page()
+
+    def search_history(self):
+        """Полнотекстовый поиск по сохраненным ответам"""
+        text = self.history_search_var.get().strip()
+        if not text:
+            self.reset_history_search()
+            return
+
+        save_dir = self.save_path_var.get()
+        index = self.get_history_index(save_dir) if save_dir and os.path.exists(save_dir) else None
+        if index is None:
+            messagebox.showerror("Ошибка", "Выберите папку для сохранения")
+            return
+        if not index.searchable:
+            messagebox.showerror("Ошибка", "Поиск недоступен: SQLite собран без FTS5")
+            return
+
+        network = self.history_network_var.get()
+        days = HISTORY_PERIODS.get(self.history_period_var.get())
+        since = time.time() - days * 86400 if days else None
+        results = index.search(text, network if network in PROVIDERS else None, since,
+                               limit=self.config["history"]["page_size"])
+
+        self.history_search_active = True
+        self.history_names = [name for name, _, _, _ in results]
+        self.history_listbox.delete(0, 'end')
+        for name, result_network, sent, snippet in results:
+            snippet = " ".join(snippet.split())
+            self.history_listbox.insert('end', f"{name}  [{result_network}]  {snippet}")
+        self.history_page_var.set(f"Найдено: {len(results)}")
+
+    def reset_history_search(self):
+        """Возврат от результатов поиска к списку истории"""
+        self.history_search_var.set("")
+        self.show_history_page()
+
     def on_history_select(self, event):
-        """Обработка выбора файла из истории"""
+        """Обработка выбора файла из истории: показ начала файла, остальное - при прокрутке"""
         selection = self.history_listbox.curselection()
         if not selection:
             return
 
-        filename = self.history_listbox.get(selection[0])
+        filename = self.history_names[selection[0]]
         save_dir = self.save_path_var.get()
         filepath = os.path.join(save_dir, filename)
 
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
+        self.history_preview = {"path": filepath, "position": 0}
+        self.history_text.delete(1.0, 'end')
+        self.load_history_chunk()
 
-            self.history_text.delete(1.0, 'end')
-            self.history_text.insert(1.0, content)
+    def load_history_chunk(self):
+        """Добавление в просмотр следующей части выбранного файла"""
+        preview = self.history_preview
+        if not preview or preview["position"] is None:
+            return
+
+        try:
+            with open(preview["path"], 'r', encoding='utf-8') as f:
+                f.seek(preview["position"])
+                chunk = f.read(self.config["history"]["preview_chunk_kb"] * 1024)
+                preview["position"] = f.tell() if chunk else None
         except Exception as e:
+            preview["position"] = None
             self.history_text.delete(1.0, 'end')
             self.history_text.insert(1.0, f"Ошибка чтения файла: {str(e)}")
+            return
+
+        self.history_text.insert('end', chunk)
+
+    def on_history_scroll(self, first, last):
+        """Прокрутка просмотра: подгрузка следующей части файла у его конца"""
+        self.history_scrollbar.set(first, last)
+        if float(last) > 0.9 and self.history_preview and self.history_preview["position"] is not None:
+            self.root.after_idle(self.load_history_chunk)
 
     def send_selected_to_telegram(self):
         """Отправка выбранного файла в Telegram"""
@@ -1502,7 +4900,7 @@ class NeuralNetworkApp:
             messagebox.showerror("Ошибка", "Настройте Telegram API в настройках")
             return
 
-        filename = self.history_listbox.get(selection[0])
+        filename = self.history_names[selection[0]]
         save_dir = self.save_path_var.get()
         filepath = os.path.join(save_dir, filename)
 
@@ -1512,8 +4910,287 @@ class NeuralNetworkApp:
             messagebox.showerror("Ошибка", "Не удалось отправить файл")
 
 
-def main():
+def collect_question_files(inputs):
+    """Файлы с вопросами по списку папок и шаблонов glob (без файлов ответов)"""
+    files = []
+    seen = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = sorted(glob.glob(os.path.join(item, "*.txt")))
+        else:
+            candidates = sorted(glob.glob(item, recursive=True))
+
+        for path in candidates:
+            path = os.path.abspath(path)
+            if path in seen or not os.path.isfile(path) or ANSWER_FILE_PATTERN.search(path):
+                continue
+            seen.add(path)
+            files.append(path)
+    return files
+
+
+def build_arg_parser():
+    """Разбор аргументов командной строки"""
+    parser = argparse.ArgumentParser(
+        description="Менеджер нейросетей. Без аргументов запускается графический интерфейс."
+    )
+    parser.add_argument("--batch", nargs="+", metavar="ПУТЬ",
+                        help="пакетный режим без интерфейса: папки или шаблоны glob с файлами вопросов")
+    parser.add_argument("--watch", metavar="ПАПКА",
+                        help="режим наблюдения: обрабатывать новые файлы из папки входящих до Ctrl+C")
+    parser.add_argument("--search", metavar="ТЕКСТ",
+                        help="поиск по сохраненным вопросам и ответам в папке для ответов")
+    parser.add_argument("--days", type=int, default=0,
+                        help="для --search: только ответы за последние N дней (0 - за все время)")
+    parser.add_argument("-o", "--output", help="папка для ответов (по умолчанию last_directory из конфигурации)")
+    parser.add_argument("--networks",
+                        help="нейросети через запятую (по умолчанию отмеченные по умолчанию и с ключами; "
+                             "для --search - фильтр ответов)")
+    parser.add_argument("--files-parallel", type=int, default=2,
+                        help="сколько файлов обрабатывать одновременно (по умолчанию 2, для --watch - "
+                             "число рабочих потоков)")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="общий лимит одновременных запросов ко всем нейросетям (0 - без лимита)")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="для --batch: вопросы в OpenAI и Anthropic отправляются одним пакетом через Batch API "
+                             "(дешевле, но ответ может прийти через несколько часов)")
+    parser.add_argument("--no-cache", action="store_true", help="не брать ответы из кэша")
+    parser.add_argument("--telegram", action="store_true", help="отправлять каждый файл ответов в Telegram")
+    parser.add_argument("--config", default="config.json", help="файл конфигурации (по умолчанию config.json)")
+    return parser
+
+
+def resolve_cli_networks(core, args):
+    """Папка для ответов, нейросети и ключи для консольных режимов (None при ошибке)"""
+    save_dir = args.output or core.config["last_directory"]
+    if not save_dir:
+        core.log_message("❌ Укажите папку для ответов (--output)")
+        return None
+    os.makedirs(save_dir, exist_ok=True)
+
+    if args.networks:
+        networks = [name.strip() for name in args.networks.split(",") if name.strip()]
+        unknown = [name for name in networks if name not in PROVIDERS]
+        if unknown:
+            core.log_message(f"❌ Неизвестные нейросети: {', '.join(unknown)}. "
+                             f"Доступны: {', '.join(PROVIDERS)}")
+            return None
+    else:
+        networks = [name for name, spec in PROVIDERS.items() if spec.selected]
+
+    api_keys = {name: core.get_api_key(name) for name in PROVIDERS}
+    missing_keys = [name for name in networks if PROVIDERS[name].key_required and not api_keys[name]]
+    if missing_keys:
+        core.log_message(f"⚠️ Нет API ключей, пропускаем: {', '.join(missing_keys)}")
+        networks = [name for name in networks if name not in missing_keys]
+    if not networks:
+        core.log_message("❌ Нет ни одной нейросети с API ключом")
+        return None
+
+    return save_dir, networks, api_keys
+
+
+def run_search(args):
+    """Поиск по сохраненным ответам из командной строки; возвращает код выхода"""
+    prepare_console()
+    core = NeuralNetworkCore(args.config)
+
+    save_dir = args.output or core.config["last_directory"]
+    if not save_dir or not os.path.isdir(save_dir):
+        core.log_message("❌ Укажите папку с ответами (--output)")
+        return 2
+
+    networks = [name.strip() for name in (args.networks or "").split(",") if name.strip()] or [None]
+    unknown = [name for name in networks if name is not None and name not in PROVIDERS]
+    if unknown:
+        core.log_message(f"❌ Неизвестные нейросети: {', '.join(unknown)}. Доступны: {', '.join(PROVIDERS)}")
+        return 2
+
+    index = core.get_history_index(save_dir)
+    if index is None or not index.searchable:
+        core.log_message("❌ Поиск недоступен: SQLite собран без FTS5")
+        return 2
+    index.sync()
+
+    since = time.time() - args.days * 86400 if args.days > 0 else None
+    results = []
+    for network in networks:
+        results.extend(index.search(args.search, network, since))
+
+    for name, network, sent, snippet in results:
+        print(f"{datetime.fromtimestamp(sent).strftime('%Y-%m-%d %H:%M')}  {name}  [{network}]")
+        print(f"    {' '.join(snippet.split())}")
+    print(f"Найдено: {len(results)}")
+    return 0 if results else 1
+
+
+def prepare_console():
+    """Консоль Windows может не поддерживать эмодзи из сообщений лога"""
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(errors="replace")
+
+
+def collect_batch_results(core, files, networks, api_keys, save_dir, bypass_cache=False):
+    """Ответы нейросетей с Batch API на вопросы из файлов: {файл: {нейросеть: (ответ, ошибка)}}
+
+    Одинаковые вопросы из разных файлов отправляются один раз, а вопросы,
+    ответ на которые уже есть в кэше, в пакет не попадают.
+    """
+    batch_networks = [name for name in networks if PROVIDERS[name].get_batch_handlers(core)]
+    if not batch_networks:
+        core.log_message("⚠️ Ни одна из выбранных нейросетей не поддерживает Batch API")
+        return {}
+
+    questions = {}
+    files_by_question = {}
+    for path in files:
+        question = core.read_question_file(path)
+        if not question:
+            continue
+        if isinstance(question, QuestionFile):
+            core.log_message(f"⚠️ {path}: большой файл отправляется частями, без Batch API")
+            continue
+        request_id = files_by_question.setdefault(normalize_question(question), f"q{len(questions)}")
+        questions.setdefault(request_id, (question, []))[1].append(path)
+
+    cache = None if bypass_cache else core.get_response_cache(save_dir)
+    requests_by_network = {}
+    for network in batch_networks:
+        params = core.request_params(network)
+        requests_by_network[network] = {
+            request_id: question for request_id, (question, _) in questions.items()
+            if cache is None or cache.get(cache.make_key(network, params, question)) is None
+        }
+
+    results = core.run_batch_api(requests_by_network, api_keys)
+    batch_results = {}
+    for network, network_results in results.items():
+        for request_id, result in network_results.items():
+            for path in questions[request_id][1]:
+                batch_results.setdefault(path, {})[network] = result
+    return batch_results
+
+
+def run_batch(args):
+    """Пакетная обработка файлов с вопросами без графического интерфейса; возвращает код выхода"""
+    prepare_console()
+    core = NeuralNetworkCore(args.config)
+
+    files = collect_question_files(args.batch)
+    if not files:
+        core.log_message("❌ Не найдено ни одного файла с вопросом")
+        return 2
+
+    setup = resolve_cli_networks(core, args)
+    if setup is None:
+        return 2
+    save_dir, networks, api_keys = setup
+
+    slots = threading.Semaphore(args.max_requests) if args.max_requests > 0 else None
+    core.log_message(f"Пакетный режим: файлов {len(files)}, нейросети: {', '.join(networks)}")
+    started = time.perf_counter()
+
+    batch_results = {}
+    if args.batch_api:
+        batch_results = collect_batch_results(core, files, networks, api_keys, save_dir, args.no_cache)
+
+    def process_file(path):
+        question = core.read_question_file(path)
+        if not question:
+            return None
+        core.log_message(f"Обрабатываем {path}")
+        return core.process_question(question, networks, api_keys, save_dir, path,
+                                     bypass_cache=args.no_cache, slots=slots, send_telegram=args.telegram,
+                                     batch_results=batch_results.get(path))
+
+    answered_files = 0
+    failed_files = []
+    answers = 0
+    errors = 0
+
+    with ThreadPoolExecutor(max_workers=max(1, args.files_parallel)) as executor:
+        futures = {executor.submit(process_file, path): path for path in files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                core.log_message(f"❌ {path}: {str(e)}")
+                result = None
+
+            if result is None or not result[2]:
+                failed_files.append(path)
+                continue
+            responses, failed_networks, _ = result
+            answered_files += 1
+            answers += len(responses)
+            errors += len(failed_networks)
+
+    core.connectivity.stop()
+    core.connection_pool.close_all()
+    core.export_metrics()
+    core.model_catalog.flush()
+
+    elapsed = time.perf_counter() - started
+    core.log_message("=" * 60)
+    core.log_message(f"Итого: файлов {len(files)}, с ответами {answered_files}, без ответов {len(failed_files)}")
+    core.log_message(f"Ответов нейросетей: {answers}, ошибок: {errors}, время: {elapsed:.1f} с")
+    for path in failed_files:
+        core.log_message(f"   • без ответа: {path}")
+
+    return 0 if not failed_files else 1
+
+
+def run_watch(args):
+    """Наблюдение за папкой входящих без графического интерфейса (до Ctrl+C)"""
+    prepare_console()
+    core = NeuralNetworkCore(args.config)
+
+    if not os.path.isdir(args.watch):
+        core.log_message(f"❌ Папка входящих не найдена: {args.watch}")
+        return 2
+
+    setup = resolve_cli_networks(core, args)
+    if setup is None:
+        return 2
+    save_dir, networks, api_keys = setup
+
+    inbox_config = core.config["inbox"]
+    slots = threading.Semaphore(args.max_requests) if args.max_requests > 0 else None
+    processor = InboxProcessor(core, args.watch, save_dir, networks, api_keys,
+                               workers=args.files_parallel,
+                               poll_interval=inbox_config["poll_interval"],
+                               settle_time=inbox_config["settle_seconds"],
+                               slots=slots)
+    processor.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        processor.stop()
+        core.export_metrics()
+        core.model_catalog.flush()
+        counts = processor.queue.counts()
+        core.log_message(f"Наблюдение остановлено. Обработано: {counts.get('done', 0)}, "
+                         f"с ошибками: {counts.get('failed', 0)}, в очереди: {counts.get('pending', 0)}")
+    return 0
+
+
+def main(argv=None):
+    startup = StartupTimer(_STARTUP_STARTED)
+
+    args = build_arg_parser().parse_args(argv)
+    if args.batch:
+        sys.exit(run_batch(args))
+    if args.watch:
+        sys.exit(run_watch(args))
+    if args.search:
+        sys.exit(run_search(args))
+
+    startup.mark("Импорт модулей")
+
     root = tk.Tk()
+    startup.mark("Создание окна Tk")
 
     # Устанавливаем тему
     try:
@@ -1525,10 +5202,15 @@ def main():
     # Настраиваем стиль
     style = ttk.Style(root)
     style.configure("Accent.TButton", font=('Segoe UI', 10, 'bold'))
+    startup.mark("Загрузка темы")
 
     app = NeuralNetworkApp(root)
+    startup.mark("Построение интерфейса")
+
+    # Отчет выводится, когда окно уже отрисовано и цикл событий запущен
+    root.after_idle(app.report_startup, startup)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()